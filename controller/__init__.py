@@ -5,13 +5,26 @@
 import os
 import sys
 from pathlib import Path
-from typing import NoReturn, Union
+from typing import TYPE_CHECKING, Any, NoReturn, Union
 
 from colorama import Fore as colors  # type: ignore
 from loguru import logger as log
-from python_on_whales.components.compose.models import ComposeConfigService
 
-ComposeServices = dict[str, ComposeConfigService]
+if TYPE_CHECKING:
+    from python_on_whales.components.compose.models import ComposeConfigService
+
+    ComposeServices = dict[str, ComposeConfigService]
+
+
+def __getattr__(name: str) -> Any:
+    # python_on_whales models are slow to be imported and not needed by
+    # lightweight entry points (like the shell completion)
+    if name == "ComposeServices":
+        from python_on_whales.components.compose.models import ComposeConfigService
+
+        return dict[str, ComposeConfigService]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __version__ = "3.1"
 
@@ -23,11 +36,14 @@
 PROJECT_DIR = Path("projects")
 DATA_DIR = Path("data")
 BACKUP_DIR = DATA_DIR.joinpath("backup")
+CACHE_DIR = DATA_DIR.joinpath("cache")
 TEMPLATE_DIR = Path("templates")
 
 LOGS_FOLDER = DATA_DIR.joinpath("logs").resolve()
 LOG_RETENTION = os.getenv("LOG_RETENTION", "180")
 LOG_FORMAT = os.getenv("RAPYDO_LOG_FORMAT", "simple")
+# cli or api, see controller/deploy/engine.py
+DOCKER_BACKEND = os.getenv("RAPYDO_DOCKER_BACKEND", "cli")
 TABLE_FORMAT = "simple"  # plain, simple, pretty, presto
 
 LOGS_FILE = None
@@ -79,6 +95,17 @@
 CONTAINERS_YAML_DIRNAME = "confs"
 COMPOSE_FILE = Path("docker-compose.yml")
 COMPOSE_FILE_VERSION = "3.9"
+# Merge and interpolate compose files without executing docker compose config
+NATIVE_COMPOSE = os.getenv("RAPYDO_NATIVE_COMPOSE", "1") == "1"
+# Validity (in seconds) of cached host facts, like versions of installed programs
+HOST_FACTS_TTL = int(os.getenv("RAPYDO_HOST_FACTS_TTL", "86400"))
+# Replicas reached at once when a command is broadcasted by backup and restore
+# Replicas are reached one at a time, unless a higher parallelism is configured
+BROADCAST_PARALLELISM = int(os.getenv("RAPYDO_BROADCAST_PARALLELISM", "1"))
+# Seconds SSH connections to remote engines are kept open after the last use
+SSH_PERSIST = int(os.getenv("RAPYDO_SSH_PERSIST", "600"))
+# Docker socket of the remote engines, by default as reported by their docker context
+SSH_DOCKER_SOCKET = os.getenv("RAPYDO_SSH_DOCKER_SOCKET", "")
 
 REGISTRY = "registry"
 
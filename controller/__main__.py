@@ -1,5 +1,28 @@
 def main() -> None:
     # All imports moved here to prevent to slow down the import of main
+    import os
+
+    # Shell completion is answered from the datafile, when possible
+    shell = os.environ.get("_RAPYDO_COMPLETE")
+    if shell:
+        from controller.completion import complete
+
+        if complete(shell):
+            return
+
+    import sys
+
+    # Commands are executed by the daemon, if running
+    from controller.daemon import forward
+
+    exit_code = forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+    run()
+
+
+def run() -> None:
     import warnings
 
     from controller import TESTING, log, print_and_exit
@@ -17,8 +40,10 @@ def main() -> None:
     try:
         init()
         Application.load_projectrc()
-        controller = Application()
-        controller.app()
+        # The project initialized by rapydo daemon is reused by the forked commands
+        if not Application.persistent or not Application.controller:
+            Application()
+        Application.app()
     except DockerException as e:  # pragma: no cover
         log.critical("Uncatched exception: {}", type(e))
         print_and_exit(str(e))
@@ -20,7 +20,6 @@
 from packaging.version import Version
 from python_on_whales import docker
 from python_on_whales.utils import DockerException
-from zxcvbn import zxcvbn  # type: ignore
 
 from controller import (
     COMPOSE_ENVIRONMENT_FILE,
@@ -41,16 +40,29 @@
     log,
     print_and_exit,
 )
-from controller.commands import load_commands
+from controller.commands import LazyCommandsGroup, get_manifest, load_commands
 from controller.packages import Packages
 from controller.project import ANGULAR, NO_FRONTEND, Project
 from controller.templating import Templating
-from controller.utilities import configuration, git, services, system
+from controller.utilities import (
+    cache,
+    configuration,
+    git,
+    probes,
+    profiler,
+    services,
+    system,
+)
 from controller.utilities.tables import print_table
 
 ROOT_UID = 0
 BASE_UID = 1000
 
+COMPOSE_CACHE = "compose-config"
+SPECS_CACHE = "project-specs"
+ENV_CACHE = "validated-env"
+INTERNET_CHECK_URL = "https://www.google.com"
+
 
 CommandParameter = Union[int, str, bool, None, Path, Iterable[str], enum.Enum]
 
@@ -64,6 +76,21 @@ class ProjectRCType(TypedDict, total=False):
     project_configuration: configuration.Configuration
 
 
+# Configuration computed by controller_init, overwritten by the options callback
+# and restored when an initialized project is reused
+INITIALIZED_CONFIGURATION = [
+    "project",
+    "ABS_PROJECT_PATH",
+    "frontend",
+    "project_title",
+    "project_description",
+    "project_keywords",
+    "version",
+    "rapydo_version",
+    "specs",
+]
+
+
 class Configuration:
     projectrc: ProjectRCType = {}
     host_configuration: configuration.Configuration = {}
@@ -99,6 +126,9 @@ class Configuration:
     install: bool = False
     print_version: bool = False
     create: bool = False
+    no_cache: bool = False
+    # Commands executed by rapydo batch, sharing a single initialization
+    batch: bool = False
 
     # It will be replaced with PROJECT_DIR/project
     ABS_PROJECT_PATH: Path = PROJECT_DIR
@@ -108,13 +138,8 @@ class Configuration:
 
     @staticmethod
     def set_action(action: Optional[str], params: dict[str, Any]) -> None:
-        Configuration.action = action
-        Configuration.initialize = Configuration.action == "init"
-        Configuration.update = Configuration.action == "update"
-        Configuration.check = Configuration.action == "check"
-        Configuration.install = Configuration.action == "install"
-        Configuration.print_version = Configuration.action == "version"
-        Configuration.create = Configuration.action == "create"
+        Configuration.batch = action == "batch"
+        Configuration.set_command(action)
 
         params.pop("version")
         # This will start to fail when this parameter will be dropped
@@ -156,10 +181,26 @@ def set_action(action: Optional[str], params: dict[str, Any]) -> None:
             Configuration.parameters.append("--no-frontend")
         if params.pop("no_commons"):
             Configuration.parameters.append("--no-commons")
+        if params.pop("no_cache"):
+            Configuration.parameters.append("--no-cache")
+
+        # Profiling options are not propagated
+        params.pop("profile")
+        params.pop("profile_output")
 
         if params:
             log.warning("Found unknown parameters: {}", params)
 
+    @staticmethod
+    def set_command(action: Optional[str]) -> None:
+        Configuration.action = action
+        Configuration.initialize = Configuration.action == "init"
+        Configuration.update = Configuration.action == "update"
+        Configuration.check = Configuration.action == "check"
+        Configuration.install = Configuration.action == "install"
+        Configuration.print_version = Configuration.action == "version"
+        Configuration.create = Configuration.action == "create"
+
 
 def projectrc_values(
     ctx: typer.Context, param: typer.CallbackParam, value: str
@@ -264,6 +305,24 @@ def controller_cli_options(
         callback=projectrc_values,
         show_default=False,
     ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Ignore cached configuration and compute it again",
+        show_default=False,
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Print a timing breakdown of the execution",
+        show_default=False,
+    ),
+    profile_output: Optional[Path] = typer.Option(
+        None,
+        "--profile-output",
+        help="Save the timing breakdown in Chrome trace format (implies --profile)",
+        show_default=False,
+    ),
     version: bool = typer.Option(
         False,
         "--version",
@@ -309,6 +368,11 @@ def controller_cli_options(
     Configuration.load_backend = not no_backend
     Configuration.load_frontend = not no_frontend
     Configuration.load_commons = not no_commons
+    Configuration.no_cache = no_cache
+
+    if profile or profile_output:
+        profiler.enable(profile_output)
+        ctx.call_on_close(profiler.report)
 
 
 # Temporary fix to ease migration to typer
@@ -341,10 +405,14 @@ class Application:
     # Register callback with CLI options and basic initialization/checks
     app = typer.Typer(
         callback=controller_cli_options,
+        cls=LazyCommandsGroup,
         context_settings={"help_option_names": ["--help", "-h"]},
     )
     # controller app
     controller: Optional["Application"] = None
+    # Set by rapydo daemon: the initialized project is kept in memory
+    # and reused by the forked commands
+    persistent = False
     project_scaffold = Project()
     data: CommandsData
     gits: dict[str, GitRepo] = {}
@@ -361,6 +429,13 @@ def __init__(self) -> None:
         self.base_files: list[Path] = []
         self.services = None
         self.enabled_services: list[str] = []
+        # Set when the project is initialized by a batch (or by rapydo daemon),
+        # to be reused by next commands with the same options
+        self.initialized = False
+        self.initialization_key: list[Any] = []
+        self.initialized_configuration: dict[str, Any] = {}
+        # Value of FORCE_COMPOSE_ENGINE when the environment was made
+        self.env_compose_engine = False
 
         if not PROJECT_DIR.is_dir():
             project_dir = None
@@ -424,17 +499,40 @@ def get_controller() -> "Application":
             raise AttributeError("Application.controller not initialized")
         return Application.controller
 
+    @profiler.timed
     def controller_init(self, services: Optional[Iterable[str]] = None) -> None:
         if Configuration.create:
             Application.check_installed_software()
             return None
 
+        if (
+            self.initialized
+            and self.initialization_key == self.get_initialization_key()
+            and not (
+                Configuration.print_version
+                or Configuration.install
+                or Configuration.initialize
+                or Configuration.update
+                or Configuration.check
+            )
+        ):
+            log.debug("Project already initialized")
+            for key, value in self.initialized_configuration.items():
+                setattr(Configuration, key, value)
+            # The environment depends on the engine (e.g. forced by run)
+            if self.env_compose_engine != Configuration.FORCE_COMPOSE_ENGINE:
+                self.make_env()
+            self.init_services(services)
+            return None
+
         main_folder_error = Application.project_scaffold.check_main_folder()
 
         if main_folder_error:
             print_and_exit(main_folder_error)
 
+        probes.reset()
         if not Configuration.print_version:
+            Application.start_probes()
             Application.check_installed_software()
 
         # if project is None, it is retrieve by project folder
@@ -443,6 +541,20 @@ def controller_init(self, services: Optional[Iterable[str]] = None) -> None:
         )
         Configuration.ABS_PROJECT_PATH = PROJECT_DIR.joinpath(Configuration.project)
 
+        # make_env is not executed by these commands
+        if not (
+            Configuration.print_version
+            or Configuration.install
+            or Configuration.initialize
+            or Configuration.update
+        ):
+            probes.submit(
+                f"network {Application.get_default_network()}",
+                docker.network.inspect,
+                Application.get_default_network(),
+                depends_on=["docker"],
+            )
+
         if Configuration.print_version:
             self.read_specs(read_extended=True)
             return None
@@ -474,6 +586,9 @@ def controller_init(self, services: Optional[Iterable[str]] = None) -> None:
         # read project configuration
         self.read_specs(read_extended=True)
 
+        if Application.is_fail2ban_enabled():
+            probes.submit("iptables", Application.get_iptables_version)
+
         # from read_specs
         Application.project_scaffold.load_frontend_scaffold(Configuration.frontend)
         Application.verify_rapydo_version()
@@ -500,7 +615,21 @@ def controller_init(self, services: Optional[Iterable[str]] = None) -> None:
             return None
 
         self.make_env()
+        self.initialized = Configuration.batch or Application.persistent
+        self.initialization_key = self.get_initialization_key()
+        self.initialized_configuration = {
+            key: getattr(Configuration, key) for key in INITIALIZED_CONFIGURATION
+        }
+
+        self.init_services(services)
+        return None
 
+    @staticmethod
+    def get_initialization_key() -> list[Any]:
+        # Options affecting the initialization, the command excluded
+        return [Configuration.swarm_mode, list(Configuration.parameters)]
+
+    def init_services(self, services: Optional[Iterable[str]]) -> None:
         # Compose services and variables
         base_services, compose_config = self.get_compose_configuration(services)
 
@@ -536,6 +665,7 @@ def load_projectrc() -> None:
         )
 
     @staticmethod
+    @profiler.timed
     def check_installed_software() -> None:
         log.debug(
             "python version: {}.{}.{}",
@@ -549,10 +679,13 @@ def check_installed_software() -> None:
         # 18.09.2 fixed the CVE-2019-5736 vulnerability
         # 20.10.0 introduced copy --chmod and improved logging
         Packages.check_program(
-            "docker", min_version="20.10.0", min_recommended_version="20.10.0"
+            "docker",
+            min_version="20.10.0",
+            min_recommended_version="20.10.0",
+            found_version=probes.get("docker", Application.get_docker_version),
         )
 
-        if docker.compose.is_installed():
+        if probes.get("compose", Application.is_compose_installed):
             # too slow to verify the version on every commands... near half a seconds
             # Sometimes a couple of seconds!
             # v = docker.compose.version()
@@ -571,32 +704,82 @@ def check_installed_software() -> None:
         # in case of missing git GitPython will fail and this check will never executed
         # Packages.check_program("git")
 
+    @staticmethod
+    def start_probes() -> None:
+        """
+        Start in background the independent checks executed by controller_init
+        """
+        probes.submit("docker", Application.get_docker_version)
+        probes.submit(
+            "compose", Application.is_compose_installed, depends_on=["docker"]
+        )
+
+        if (
+            Configuration.initialize
+            or Configuration.update
+            or Configuration.check
+            or Configuration.install
+        ):
+            probes.submit("internet", requests.get, INTERNET_CHECK_URL, timeout=2)
+
+    # Host facts are cached, to not execute the same programs at every command
+
+    @staticmethod
+    def get_docker_version() -> Optional[str]:
+        return cache.get_host_fact(
+            "docker",
+            ["docker"],
+            Packages.get_bin_version,
+            "docker",
+            refresh=Configuration.no_cache,
+        )
+
+    @staticmethod
+    def is_compose_installed() -> bool:
+        # False is cached as well, but installing compose changes the plugin
+        plugin = cache.get_compose_plugin()
+        return cache.get_host_fact(
+            "compose",
+            ["docker", str(plugin or "docker-compose")],
+            docker.compose.is_installed,
+            refresh=Configuration.no_cache,
+        )
+
+    @staticmethod
+    def get_iptables_version() -> Optional[str]:
+        return cache.get_host_fact(
+            "iptables",
+            ["iptables"],
+            Packages.get_bin_version,
+            "iptables",
+            clean_output=False,
+            refresh=Configuration.no_cache,
+        )
+
+    @staticmethod
+    def get_default_network() -> str:
+        if Configuration.FORCE_COMPOSE_ENGINE or not Configuration.swarm_mode:
+            return f"{Configuration.project}_compose_default"
+        return f"{Configuration.project}_swarm_default"
+
+    @staticmethod
+    def is_fail2ban_enabled() -> bool:
+        # Same precedence used by make_env: specs < shell environment < --env
+        value = (
+            Configuration.specs.get("variables", {})
+            .get("env", {})
+            .get("ACTIVATE_FAIL2BAN")
+        )
+        value = os.environ.get("ACTIVATE_FAIL2BAN", value)
+        value = Configuration.environment.get("ACTIVATE_FAIL2BAN", value)
+        return str(value) == "1"
+
+    @profiler.timed
     def read_specs(self, read_extended: bool = True) -> None:
         """Read project configuration"""
 
         try:
-            confs = configuration.read_configuration(
-                default_file_path=CONFS_DIR,
-                base_project_path=Configuration.ABS_PROJECT_PATH,
-                projects_path=PROJECT_DIR,
-                submodules_path=SUBMODULES_DIR,
-                read_extended=read_extended,
-                production=Configuration.production,
-            )
-
-            # confs 3 is the core config, extra fields are allowd
-            configuration.validate_configuration(confs[3], core=True)
-            # confs 0 is the merged conf core + custom, extra fields are allowd
-            configuration.validate_configuration(confs[0], core=False)
-            log.info("Project configuration is valid")
-            Configuration.specs = configuration.mix_configuration(
-                confs[0], Configuration.host_configuration
-            )
-            configuration.validate_configuration(Configuration.specs, core=False)
-            log.info("Host configuration is valid")
-            self.extended_project = confs[1]
-            self.extended_project_path = confs[2]
-
+            self.load_specs(read_extended)
         except AttributeError as e:  # pragma: no cover
             print_and_exit(str(e))
 
@@ -630,6 +813,89 @@ def read_specs(self, read_extended: bool = True) -> None:
         Configuration.rapydo_version = str(Configuration.rapydo_version)
 
     @staticmethod
+    def get_specs_fingerprint(read_extended: bool) -> str:
+        # Any project could be extended, all the configurations are included
+        files = [
+            CONFS_DIR.joinpath(configuration.PROJECTS_DEFAULTS_FILE),
+            CONFS_DIR.joinpath(configuration.PROJECTS_PROD_DEFAULTS_FILE),
+            *sorted(PROJECT_DIR.glob(f"*/{configuration.PROJECT_CONF_FILENAME}")),
+            PROJECTRC,
+        ]
+        return cache.get_fingerprint(
+            __version__,
+            str(Configuration.ABS_PROJECT_PATH),
+            read_extended,
+            Configuration.production,
+            Configuration.host_configuration,
+            cache.get_files_hashes(files),
+        )
+
+    def load_specs(self, read_extended: bool) -> None:
+        """
+        Read, merge and validate the configuration, or reuse the configuration
+        already validated by a previous execution if no input file is changed
+        """
+
+        fingerprint = Application.get_specs_fingerprint(read_extended)
+
+        if not Configuration.no_cache:
+            cached = cache.load(SPECS_CACHE, fingerprint)
+            if cached:
+                Configuration.specs = cached["specs"]
+                self.extended_project = cached["extended_project"]
+                extended_path = cached["extended_project_path"]
+                self.extended_project_path = (
+                    Path(extended_path) if extended_path else None
+                )
+                log.info("Project configuration is valid")
+                log.info("Host configuration is valid")
+                return None
+
+        confs = configuration.read_configuration(
+            default_file_path=CONFS_DIR,
+            base_project_path=Configuration.ABS_PROJECT_PATH,
+            projects_path=PROJECT_DIR,
+            submodules_path=SUBMODULES_DIR,
+            read_extended=read_extended,
+            production=Configuration.production,
+        )
+
+        # confs 3 is the core config, extra fields are allowd
+        configuration.validate_configuration(confs[3], core=True)
+        # confs 0 is the merged conf core + custom, extra fields are allowd
+        configuration.validate_configuration(confs[0], core=False)
+        log.info("Project configuration is valid")
+        Configuration.specs = configuration.mix_configuration(
+            confs[0], Configuration.host_configuration
+        )
+        configuration.validate_configuration(Configuration.specs, core=False)
+        log.info("Host configuration is valid")
+        self.extended_project = confs[1]
+        self.extended_project_path = confs[2]
+
+        # Projects extended from submodules are not included in the fingerprint
+        if self.extended_project_path and (
+            PROJECT_DIR not in self.extended_project_path.parents
+        ):
+            return None
+
+        cache.save(
+            SPECS_CACHE,
+            fingerprint,
+            {
+                "specs": Configuration.specs,
+                "extended_project": self.extended_project,
+                "extended_project_path": (
+                    str(self.extended_project_path)
+                    if self.extended_project_path
+                    else None
+                ),
+            },
+        )
+        return None
+
+    @staticmethod
+    @profiler.timed
     def preliminary_version_check() -> None:
         specs = configuration.load_yaml_file(
             file=Configuration.ABS_PROJECT_PATH.joinpath(
@@ -642,6 +908,7 @@ def preliminary_version_check() -> None:
         )
 
     @staticmethod
+    @profiler.timed
     def verify_rapydo_version(rapydo_version: str = "") -> bool:
         """
         Verify if the installed controller matches the current project requirement
@@ -676,20 +943,19 @@ def verify_rapydo_version(rapydo_version: str = "") -> bool:
             print_and_exit(msg)
 
     @staticmethod
+    @profiler.timed
     def check_internet_connection() -> None:
         """Check if connected to internet"""
 
         try:
-            requests.get("https://www.google.com", timeout=2)
+            probes.get("internet", requests.get, INTERNET_CHECK_URL, timeout=2)
             if Configuration.check:
                 log.info("Internet connection is available")
         except requests.ConnectionError:  # pragma: no cover
             print_and_exit("Internet connection is unavailable")
 
     @staticmethod
-    def working_clone(
-        name: str, repo: configuration.Submodule, from_path: Optional[Path] = None
-    ) -> Optional[GitRepo]:
+    def is_submodule_enabled(repo: configuration.Submodule) -> bool:
         # substitute values starting with '$$'
         myvars = {
             ANGULAR: Configuration.frontend == ANGULAR,
@@ -699,7 +965,15 @@ def working_clone(
         if condition.startswith("$$"):
             # Is this repo enabled?
             if not myvars.get(condition.lstrip("$"), None):
-                return None
+                return False
+        return True
+
+    @staticmethod
+    def working_clone(
+        name: str, repo: configuration.Submodule, from_path: Optional[Path] = None
+    ) -> Optional[GitRepo]:
+        if not Application.is_submodule_enabled(repo):
+            return None
 
         default_version = (
             Configuration.rapydo_version
@@ -736,6 +1010,7 @@ def working_clone(
         )
 
     @staticmethod
+    @profiler.timed
     def git_submodules(from_path: Optional[Path] = None) -> None:
         """Check and/or clone git projects"""
 
@@ -751,11 +1026,20 @@ def git_submodules(from_path: Optional[Path] = None) -> None:
 
         Application.gits["main"] = main_repo
 
+        # Missing submodules are cloned concurrently, while all the checks
+        # are then executed serially by working_clone
+        if Configuration.initialize and from_path is None:
+            for name, submodule in submodules.items():
+                url = submodule.get("online_url")
+                if url and Application.is_submodule_enabled(submodule):
+                    git.prefetch_clone(url, Path(name))
+
         for name, submodule in submodules.items():
             repo = Application.working_clone(name, submodule, from_path=from_path)
             if repo:
                 Application.gits[name] = repo
 
+    @profiler.timed
     def get_compose_configuration(
         self, enabled_services: Optional[Iterable[str]] = None
     ) -> tuple[ComposeServices, ComposeServices]:
@@ -818,6 +1102,39 @@ def add(p: Path, f: str) -> None:
         self.files, self.base_files = configuration.read_composer_yamls(compose_files)
         # to build the config with files and variables
 
+        base_services, compose_config = self.load_compose_configuration()
+
+        self.active_services = services.find_active(compose_config)
+
+        self.enabled_services = services.get_services(
+            Configuration.services_list or enabled_services,
+            default=self.active_services,
+        )
+
+        for service in self.enabled_services:
+            if service not in self.active_services:
+                print_and_exit("No such service: {}", service)
+
+        log.debug("Enabled services: {}", ", ".join(self.enabled_services))
+
+        self.create_datafile(list(compose_config.keys()), self.active_services)
+
+        return base_services, compose_config
+
+    @profiler.timed
+    def load_compose_configuration(self) -> tuple[ComposeServices, ComposeServices]:
+        fingerprint = cache.get_compose_fingerprint(
+            self.files, COMPOSE_ENVIRONMENT_FILE
+        )
+
+        if not Configuration.no_cache:
+            cached = cache.load(COMPOSE_CACHE, fingerprint)
+            if cached:
+                return (
+                    cache.load_services(cached["base_services"]),
+                    cache.load_services(cached["compose_config"]),
+                )
+
         from controller.deploy.docker import Docker
 
         docker = Docker(
@@ -838,21 +1155,15 @@ def add(p: Path, f: str) -> None:
             log.error("Got invalid compose config")
             compose_config = {}
 
-        self.active_services = services.find_active(compose_config)
-
-        self.enabled_services = services.get_services(
-            Configuration.services_list or enabled_services,
-            default=self.active_services,
+        cache.save(
+            COMPOSE_CACHE,
+            fingerprint,
+            {
+                "base_services": cache.dump_services(base_services),
+                "compose_config": cache.dump_services(compose_config),
+            },
         )
 
-        for service in self.enabled_services:
-            if service not in self.active_services:
-                print_and_exit("No such service: {}", service)
-
-        log.debug("Enabled services: {}", ", ".join(self.enabled_services))
-
-        self.create_datafile(list(compose_config.keys()), self.active_services)
-
         return base_services, compose_config
 
     def create_projectrc(self) -> None:
@@ -879,6 +1190,7 @@ def create_projectrc(self) -> None:
         else:
             log.info("Created default {} file", PROJECTRC)
 
+    @profiler.timed
     def make_env(self) -> None:
         try:
             COMPOSE_ENVIRONMENT_FILE.unlink()
@@ -956,8 +1268,12 @@ def make_env(self) -> None:
 
         if Configuration.swarm_mode:
             if not Application.env.get("SWARM_MANAGER_ADDRESS"):
-                Application.env["SWARM_MANAGER_ADDRESS"] = system.get_local_ip(
-                    Configuration.production
+                Application.env["SWARM_MANAGER_ADDRESS"] = cache.get_host_fact(
+                    "local-ip",
+                    [],
+                    system.get_local_ip,
+                    Configuration.production,
+                    refresh=Configuration.no_cache,
                 )
 
             if not Application.env.get("REGISTRY_HOST"):
@@ -970,6 +1286,7 @@ def make_env(self) -> None:
             #     manager_addr = Application.env["SWARM_MANAGER_ADDRESS"]
             #     Application.env["SYSLOG_ADDRESS"] = f"tcp://{manager_addr}:514"
 
+        self.env_compose_engine = Configuration.FORCE_COMPOSE_ENGINE
         if Configuration.FORCE_COMPOSE_ENGINE or not Configuration.swarm_mode:
             DEPLOY_ENGINE = "compose"
         else:
@@ -980,8 +1297,9 @@ def make_env(self) -> None:
         # Unfortunately this will only work after the creation of the network
         # i.e. will be fallen back to 127.0.0.1 the first time
         try:
-            docker_network = docker.network.inspect(
-                f"{Configuration.project}_{DEPLOY_ENGINE}_default"
+            network = f"{Configuration.project}_{DEPLOY_ENGINE}_default"
+            docker_network = probes.get(
+                f"network {network}", docker.network.inspect, network
             )
             if docker_network.ipam.config:
                 DOCKER_SUBNET = docker_network.ipam.config[0]["Subnet"]
@@ -994,7 +1312,7 @@ def make_env(self) -> None:
 
         FAIL2BAN_IPTABLES = "legacy"
         if str(Application.env["ACTIVATE_FAIL2BAN"]) == "1":
-            iptables_version = Packages.get_bin_version("iptables", clean_output=False)
+            iptables_version = probes.get("iptables", Application.get_iptables_version)
             nf_tables = iptables_version and "nf_tables" in iptables_version
             if nf_tables:
                 FAIL2BAN_IPTABLES = "nf_tables"
@@ -1018,7 +1336,11 @@ def make_env(self) -> None:
         PYTHON_PATH = f"/usr/local/lib/python{py_version}/dist-packages"
         Application.env["PYTHON_PATH"] = PYTHON_PATH
 
-        configuration.validate_env(Application.env)
+        # The validation is skipped if the same environment was already validated
+        env_fingerprint = cache.get_fingerprint(__version__, Application.env)
+        if Configuration.no_cache or not cache.load(ENV_CACHE, env_fingerprint):
+            configuration.validate_env(Application.env)
+            cache.save(ENV_CACHE, env_fingerprint, {"valid": True})
         log.info("Environment configuration is valid")
 
         with open(COMPOSE_ENVIRONMENT_FILE, "w+") as whandle:
@@ -1043,11 +1365,38 @@ def create_datafile(services: list[str], active_services: list[str]) -> None:
             "submodules": [k for k, v in Application.gits.items() if v is not None],
             "services": active_services,
             "allservices": services,
+            # Used by the shell completion, see controller.completion
+            "commands": {
+                name: {
+                    "help": command["help"],
+                    "short_help": command["short_help"],
+                    "hidden": command["hidden"],
+                    "params": command["params"],
+                }
+                for name, command in get_manifest().items()
+            },
+            "options": Application.get_global_options(),
         }
 
         with open(DATAFILE, "w+") as outfile:
             json.dump(data, outfile)
 
+    @staticmethod
+    def get_global_options() -> dict[str, bool]:
+        """
+        Global options, each one associated with True if followed by a value
+        """
+        ctx = click.get_current_context(silent=True)
+        if not ctx:
+            return {}
+
+        options: dict[str, bool] = {"--help": False}
+        for param in ctx.find_root().command.params:
+            if isinstance(param, click.Option):
+                for option in [*param.opts, *param.secondary_opts]:
+                    options[option] = not param.is_flag
+        return options
+
     @staticmethod
     def parse_datafile(key: str) -> list[str]:
         try:
@@ -1085,6 +1434,7 @@ def autocomplete_submodule(
         return [x for x in values if x.startswith(incomplete)]
 
     @staticmethod
+    @profiler.timed
     def check_placeholders_and_passwords(
         compose_services: ComposeServices, active_services: list[str]
     ) -> None:
@@ -1157,6 +1507,7 @@ def check_placeholders_and_passwords(
         MIN_PASSWORD_SCORE = int(
             Application.env.get("MIN_PASSWORD_SCORE", 2)  # type: ignore
         )
+        active_passwords: dict[str, str] = {}
         for variable, raw_services in passwords_services.items():
             if variable in services.vars_to_services_mapping:
                 serv = {services.vars_to_services_mapping[variable]}
@@ -1165,18 +1516,20 @@ def check_placeholders_and_passwords(
 
             active_serv = [s for s in serv if s in all_services]
             if active_serv:
-                password = passwords.get(variable)
-                result = zxcvbn(password)
-                score = result["score"]
-                if score < MIN_PASSWORD_SCORE:
-                    if score == MIN_PASSWORD_SCORE - 1:
-                        log.warning("The password used in {} is weak", variable)
-                    elif score == MIN_PASSWORD_SCORE - 2:
-                        log.error("The password used in {} is very weak", variable)
-                    else:
-                        log.critical(
-                            "The password used in {} is extremely weak", variable
-                        )
+                active_passwords[variable] = passwords[variable]
+
+        scores = services.get_password_scores(
+            active_passwords.values(), refresh=Configuration.no_cache
+        )
+        for variable, password in active_passwords.items():
+            score = scores[password]
+            if score < MIN_PASSWORD_SCORE:
+                if score == MIN_PASSWORD_SCORE - 1:
+                    log.warning("The password used in {} is weak", variable)
+                elif score == MIN_PASSWORD_SCORE - 2:
+                    log.error("The password used in {} is very weak", variable)
+                else:
+                    log.critical("The password used in {} is extremely weak", variable)
 
         if placeholders:
             log.critical("The following variables are missing in your configuration:")
@@ -2,17 +2,77 @@
 All core commands implemented in RAPyDo
 """
 
+import ast
+from collections.abc import Iterator, Mapping
 from importlib.util import module_from_spec, spec_from_file_location
 from pathlib import Path
 from types import ModuleType
-from typing import Optional
+from typing import Any, Optional
 
-from controller import PROJECT_DIR
+import click
+from typer.core import TyperGroup
+from typer.main import get_command_from_info, get_command_name
 
-BACKUP_MODULES: dict[str, ModuleType] = {}
-RESTORE_MODULES: dict[str, ModuleType] = {}
-PASSWORD_MODULES: dict[str, ModuleType] = {}
-TUNING_MODULES: dict[str, ModuleType] = {}
+from controller import PROJECT_DIR, __version__, log
+
+COMMANDS_FOLDER = Path(__file__).resolve().parent
+COMMANDS_CACHE = "commands-manifest"
+# To be increased when the content of the manifest is changed
+MANIFEST_FORMAT = 3
+
+
+class PluginModules(Mapping[str, ModuleType]):
+    """
+    Modules of a family of plugins (e.g. backup_modules), only loaded at first access
+    """
+
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+        self.project: Optional[str] = None
+        self.modules: Optional[dict[str, ModuleType]] = None
+
+    def reset(self, project: Optional[str]) -> None:
+        self.project = project
+        self.modules = None
+
+    def load(self) -> dict[str, ModuleType]:
+        if self.modules is None:
+            self.modules = load_module(COMMANDS_FOLDER.joinpath(self.folder))
+            if self.project:
+                custom_commands = PROJECT_DIR.joinpath(self.project, "commands")
+                self.modules.update(load_module(custom_commands.joinpath(self.folder)))
+        return self.modules
+
+    def __getitem__(self, key: str) -> ModuleType:
+        return self.load()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.load())
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+
+BACKUP_MODULES = PluginModules("backup_modules")
+RESTORE_MODULES = PluginModules("restore_modules")
+PASSWORD_MODULES = PluginModules("password_modules")
+TUNING_MODULES = PluginModules("tuning_modules")
+
+# Folders containing commands, in order of priority (the last wins)
+COMMANDS_FOLDERS: list[Path] = []
+# command name => file and help, built by parsing the commands without importing
+MANIFEST: dict[str, dict[str, Any]] = {}
+
+
+def load_file(path: Path) -> Optional[ModuleType]:
+    spec = spec_from_file_location(path.stem, path)
+    if spec and spec.loader:
+        module = module_from_spec(spec)
+        # "_LoaderProtocol" has no attribute "exec_module"
+        # https://issueexplorer.com/issue/python/typeshed/6163
+        spec.loader.exec_module(module)
+        return module
+    return None  # pragma: no cover
 
 
 def load_module(path: Path) -> dict[str, ModuleType]:
@@ -23,12 +83,8 @@ def load_module(path: Path) -> dict[str, ModuleType]:
     loaded_modules: dict[str, ModuleType] = {}
     if path.is_dir():
         for c in path.glob("[!_|.]*.py"):
-            spec = spec_from_file_location(c.stem, c)
-            if spec and spec.loader:
-                command = module_from_spec(spec)
-                # "_LoaderProtocol" has no attribute "exec_module"
-                # https://issueexplorer.com/issue/python/typeshed/6163
-                spec.loader.exec_module(command)
+            command = load_file(c)
+            if command:
                 loaded_modules[c.stem] = command
 
     return loaded_modules
@@ -36,36 +92,237 @@ def load_module(path: Path) -> dict[str, ModuleType]:
 
 def load_commands(project: Optional[str]) -> None:
     # re-initialization needed for tests
-    BACKUP_MODULES.clear()
-    RESTORE_MODULES.clear()
-    PASSWORD_MODULES.clear()
-    TUNING_MODULES.clear()
-
-    commands_folder = Path(__file__).resolve().parent
-    BACKUP_MODULES.update(load_module(commands_folder.joinpath("backup_modules")))
-    RESTORE_MODULES.update(load_module(commands_folder.joinpath("restore_modules")))
-    PASSWORD_MODULES.update(load_module(commands_folder.joinpath("password_modules")))
-    TUNING_MODULES.update(load_module(commands_folder.joinpath("tuning_modules")))
-
-    # Do custom commands exist?
-    if project:
-        custom_commands = PROJECT_DIR.joinpath(project, "commands")
-        load_module(custom_commands)
-
-        BACKUP_MODULES.update(load_module(custom_commands.joinpath("backup_modules")))
-        RESTORE_MODULES.update(load_module(custom_commands.joinpath("restore_modules")))
-        PASSWORD_MODULES.update(
-            load_module(custom_commands.joinpath("password_modules"))
-        )
-        TUNING_MODULES.update(load_module(custom_commands.joinpath("tuning_modules")))
-
-    load_module(commands_folder)
+    BACKUP_MODULES.reset(project)
+    RESTORE_MODULES.reset(project)
+    PASSWORD_MODULES.reset(project)
+    TUNING_MODULES.reset(project)
+    MANIFEST.clear()
+    COMMANDS_FOLDERS.clear()
 
     # Do not import outside, otherwise it will lead to a circular import:
     # cannot import name 'Configuration' from partially initialized module
-    from controller.app import Configuration
+    from controller.app import Application, Configuration
+
+    # Commands are registered when the modules are loaded by the LazyCommandsGroup
+    Application.app.registered_commands.clear()
+
+    # Custom commands are loaded first, to prevent overrides of core commands
+    if project:
+        COMMANDS_FOLDERS.append(PROJECT_DIR.joinpath(project, "commands"))
+
+    COMMANDS_FOLDERS.append(COMMANDS_FOLDER)
 
     if Configuration.swarm_mode:
-        load_module(commands_folder.joinpath("swarm"))
+        COMMANDS_FOLDERS.append(COMMANDS_FOLDER.joinpath("swarm"))
     else:
-        load_module(commands_folder.joinpath("compose"))
+        COMMANDS_FOLDERS.append(COMMANDS_FOLDER.joinpath("compose"))
+
+
+def get_decorator_keywords(decorator: ast.expr) -> Optional[dict[str, Any]]:
+    """
+    Return the keywords of an @Application.app.command decorator, None otherwise
+    """
+    call = decorator if isinstance(decorator, ast.Call) else None
+    func = call.func if call else decorator
+    if not isinstance(func, ast.Attribute) or func.attr != "command":
+        return None
+    if not isinstance(func.value, ast.Attribute) or func.value.attr != "app":
+        return None
+
+    keywords: dict[str, Any] = {}
+    if not call:
+        return keywords
+    if call.args:
+        keywords["name"] = ast.literal_eval(call.args[0])
+    for keyword in call.keywords:
+        if keyword.arg:
+            keywords[keyword.arg] = ast.literal_eval(keyword.value)
+    return keywords
+
+
+def get_annotation_name(annotation: Optional[ast.expr]) -> str:
+    # e.g. bool, list[str] => list, Optional[str] => Optional
+    if isinstance(annotation, ast.Subscript):
+        annotation = annotation.value
+    if isinstance(annotation, ast.Name):
+        return annotation.id
+    if isinstance(annotation, ast.Attribute):
+        return annotation.attr
+    return ""
+
+
+def parse_params(node: ast.FunctionDef) -> list[dict[str, Any]]:
+    """
+    Arguments and options of a command, as needed by the shell completion
+    """
+    params: list[dict[str, Any]] = []
+    args = node.args.args[len(node.args.args) - len(node.args.defaults) :]
+    for arg, default in zip(args, node.args.defaults):
+        if not isinstance(default, ast.Call):
+            continue
+        if not isinstance(default.func, ast.Attribute):
+            continue
+        if default.func.attr not in ("Argument", "Option"):
+            continue
+
+        annotation = get_annotation_name(arg.annotation)
+        complete = None
+        for keyword in default.keywords:
+            if keyword.arg == "shell_complete" and isinstance(
+                keyword.value, ast.Attribute
+            ):
+                complete = keyword.value.attr
+
+        param: dict[str, Any] = {
+            "name": arg.arg,
+            "kind": default.func.attr.lower(),
+            "multiple": annotation in ("list", "List"),
+            "flag": annotation == "bool",
+            "complete": complete,
+        }
+
+        if param["kind"] == "option":
+            # The first positional argument is the default value
+            flags = [
+                a.value
+                for a in default.args[1:]
+                if isinstance(a, ast.Constant) and isinstance(a.value, str)
+            ]
+            param["flags"] = flags or [f"--{arg.arg.replace('_', '-')}"]
+
+        params.append(param)
+    return params
+
+
+def is_interactive(tree: ast.Module) -> bool:
+    """
+    True if the module sets INTERACTIVE = True, i.e. its commands are attached to
+    the terminal (tty or prompts) and are never executed by rapydo daemon
+    """
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Constant):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name) and target.id == "INTERACTIVE":
+                return node.value.value is True
+    return False
+
+
+def parse_commands(path: Path) -> dict[str, dict[str, Any]]:
+    """
+    Find the commands defined in a module, without executing it
+    """
+    commands: dict[str, dict[str, Any]] = {}
+    tree = ast.parse(path.read_text(), filename=str(path))
+    interactive = is_interactive(tree)
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        for decorator in node.decorator_list:
+            try:
+                keywords = get_decorator_keywords(decorator)
+            except ValueError:
+                # Not a literal, the command will be loaded to show its help
+                keywords = {"help": None, "dynamic": True}
+            if keywords is None:
+                continue
+            name = keywords.get("name") or get_command_name(node.name)
+            commands[name] = {
+                "path": str(path),
+                "help": keywords.get("help", ast.get_docstring(node)),
+                "short_help": keywords.get("short_help"),
+                "hidden": keywords.get("hidden", False),
+                "deprecated": keywords.get("deprecated", False),
+                "dynamic": keywords.get("dynamic", False),
+                "interactive": interactive,
+                "params": parse_params(node),
+            }
+    return commands
+
+
+def get_manifest() -> dict[str, dict[str, Any]]:
+    if MANIFEST:
+        return MANIFEST
+
+    # temporary added here to prevent circular imports
+    from controller.utilities import cache
+
+    files = [
+        f for folder in COMMANDS_FOLDERS for f in sorted(folder.glob("[!_|.]*.py"))
+    ]
+    stats = [(str(f), f.stat().st_mtime_ns, f.stat().st_size) for f in files]
+    fingerprint = cache.get_fingerprint(__version__, MANIFEST_FORMAT, stats)
+
+    cached = cache.load(COMMANDS_CACHE, fingerprint)
+    if cached:
+        MANIFEST.update(cached)
+        return MANIFEST
+
+    for f in files:
+        try:
+            MANIFEST.update(parse_commands(f))
+        except SyntaxError as e:  # pragma: no cover
+            log.warning("Can't parse {}: {}", f, e)
+
+    cache.save(COMMANDS_CACHE, fingerprint, MANIFEST)
+    return MANIFEST
+
+
+class LazyCommandsGroup(TyperGroup):
+    """
+    Commands are listed from the manifest, while command modules
+    (and their dependencies) are only imported when invoked
+    """
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted(set(self.commands).union(get_manifest()))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.commands:
+            return self.commands[cmd_name]
+
+        command = get_manifest().get(cmd_name)
+        if not command:
+            return None
+
+        if command["dynamic"]:
+            return self.load_command(cmd_name)
+
+        # A lightweight placeholder, only used to list commands with their help
+        return click.Command(
+            cmd_name,
+            help=command["help"],
+            short_help=command["short_help"],
+            hidden=command["hidden"],
+            deprecated=command["deprecated"],
+        )
+
+    def resolve_command(
+        self, ctx: click.Context, args: list[str]
+    ) -> tuple[Optional[str], Optional[click.Command], list[str]]:
+        if args and args[0] not in self.commands and args[0] in get_manifest():
+            self.load_command(args[0])
+        return super().resolve_command(ctx, args)
+
+    def load_command(self, cmd_name: str) -> Optional[click.Command]:
+        # Do not import outside, otherwise it will lead to a circular import
+        from controller.app import Application
+
+        load_file(Path(get_manifest()[cmd_name]["path"]))
+
+        for command_info in reversed(Application.app.registered_commands):
+            callback_name = (
+                command_info.callback.__name__ if command_info.callback else ""
+            )
+            if (command_info.name or get_command_name(callback_name)) != cmd_name:
+                continue
+
+            command = get_command_from_info(
+                command_info,
+                pretty_exceptions_short=Application.app.pretty_exceptions_short,
+                rich_markup_mode=self.rich_markup_mode,
+            )
+            self.add_command(command, cmd_name)
+            return command
+
+        return None  # pragma: no cover
@@ -8,7 +8,7 @@
 
 import typer
 
-from controller import BACKUP_DIR, log, print_and_exit
+from controller import BACKUP_DIR, BROADCAST_PARALLELISM, log, print_and_exit
 from controller.app import Application
 from controller.commands import BACKUP_MODULES
 from controller.deploy.builds import verify_available_images
@@ -41,7 +41,12 @@ def get_date_pattern() -> str:
 def reload(docker: Docker, services: list[str]) -> None:
     for service in services:
         containers = docker.get_containers(service)
-        docker.exec_command(containers, user="root", command="/usr/local/bin/reload")
+        docker.exec_command(
+            containers,
+            user="root",
+            command="/usr/local/bin/reload",
+            parallel=BROADCAST_PARALLELISM,
+        )
 
 
 @Application.app.command(help="Execute a backup of one service")
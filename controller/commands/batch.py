@@ -0,0 +1,144 @@
+"""
+Execute a sequence of commands with a single initialization of the controller
+"""
+
+import copy
+import shlex
+import sys
+from pathlib import Path
+from typing import Any, Optional, cast
+
+import click
+import typer
+
+from controller import log, print_and_exit
+from controller.app import Application, Configuration
+from controller.deploy.docker import Docker
+from controller.deploy.swarm import Swarm
+
+# Commands that change the configuration of the project (or the project itself),
+# the controller is initialized again before executing the next command
+INVALIDATING_COMMANDS = ["add", "init", "install", "password", "update", "upgrade"]
+# Commands that can't be executed in a batch
+EXCLUDED_COMMANDS = ["batch", "create", "daemon"]
+
+
+def save_configuration() -> dict[str, Any]:
+    """
+    Values of Configuration, changed by commands (e.g. FORCE_COMPOSE_ENGINE by run)
+    """
+    return {
+        key: copy.deepcopy(value)
+        for key, value in vars(Configuration).items()
+        if not key.startswith("__") and not isinstance(value, staticmethod)
+    }
+
+
+def restore_configuration(values: dict[str, Any]) -> None:
+    for key, value in values.items():
+        setattr(Configuration, key, value)
+
+
+def read_commands(commands: list[str], file: Optional[Path]) -> list[list[str]]:
+    """
+    Parse the commands, given as arguments or one per line in the file.
+    Empty lines and comments are ignored, the rapydo prefix is optional
+    """
+    lines = list(commands)
+    if file:
+        if str(file) == "-":
+            lines.extend(sys.stdin.read().splitlines())
+        elif file.is_file():
+            lines.extend(file.read_text().splitlines())
+        else:
+            print_and_exit("File not found: {}", file)
+
+    steps: list[list[str]] = []
+    for line in lines:
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            print_and_exit("Invalid command {}: {}", line, str(e))
+
+        if args and args[0] == "rapydo":
+            args = args[1:]
+
+        if not args:
+            continue
+
+        if args[0].startswith("-"):
+            print_and_exit(
+                "Invalid command {}: options of rapydo can only be set on the batch",
+                line,
+            )
+
+        if args[0] in EXCLUDED_COMMANDS:
+            print_and_exit("Command {} can't be executed in a batch", args[0])
+
+        steps.append(args)
+
+    return steps
+
+
+@Application.app.command(
+    help="Execute a sequence of commands with a single initialization"
+)
+def batch(
+    ctx: typer.Context,
+    commands: list[str] = typer.Argument(
+        None,
+        help='Commands to be executed, e.g. "reload proxy"',
+        show_default=False,
+    ),
+    file: Optional[Path] = typer.Option(
+        None,
+        "--file",
+        "-f",
+        help="Read the commands from a file, one per line (- to read from stdin)",
+        show_default=False,
+    ),
+) -> None:
+    Application.print_command(
+        Application.serialize_parameter("--file", file),
+        Application.serialize_parameter("", commands),
+    )
+
+    steps = read_commands(commands or [], file)
+    if not steps:
+        print_and_exit("No command to be executed")
+
+    root = ctx.find_root()
+    group = cast(click.Group, root.command)
+
+    # Verify all the commands before executing the first one
+    resolved = [group.resolve_command(root, args) for args in steps]
+
+    controller = Application.get_controller()
+    Swarm.verified_engines.clear()
+    Docker.clients.clear()
+
+    for args, (name, command, command_args) in zip(steps, resolved):
+        if not name or not command:  # pragma: no cover
+            print_and_exit("Command not found: {}", args[0])
+
+        log.info("Executing: rapydo {}", " ".join(args))
+        configuration = save_configuration()
+        Configuration.set_command(name)
+
+        try:
+            with command.make_context(name, command_args, parent=root) as step_ctx:
+                command.invoke(step_ctx)
+        except click.exceptions.Exit as e:
+            if e.exit_code:
+                raise
+        finally:
+            restore_configuration(configuration)
+
+        if name in INVALIDATING_COMMANDS:
+            log.debug("Configuration changed by {}", name)
+            Application.load_projectrc()
+            controller.initialized = False
+            Swarm.verified_engines.clear()
+            Docker.clients.clear()
+
+    log.info("All commands executed")
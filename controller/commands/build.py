@@ -130,6 +130,7 @@ def build(
         docker.client.image.push(local_images, quiet=False)
         # remove local tags
         docker.client.image.remove(local_images, prune=True)  # type: ignore
+        docker.swarm.invalidate_deploy()
 
         log.info("Custom images built and pushed into the local registry")
     else:
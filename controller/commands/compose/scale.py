@@ -5,13 +5,32 @@
 from controller.app import Application, Configuration
 from controller.deploy.builds import verify_available_images
 from controller.deploy.docker import Docker
+from controller.deploy.events import DEFAULT_TIMEOUT, wait_services
 
 
 @Application.app.command(help="Scale the number of containers for a service")
 def scale(
-    scaling: str = typer.Argument(..., help="scale SERVICE to NUM_REPLICA")
+    scaling: str = typer.Argument(..., help="scale SERVICE to NUM_REPLICA"),
+    wait: bool = typer.Option(
+        False,
+        "--wait",
+        help="Wait service convergence",
+        show_default=False,
+    ),
+    timeout: int = typer.Option(
+        DEFAULT_TIMEOUT,
+        "--timeout",
+        help="Maximum time (in seconds) to wait for the service with --wait",
+        min=1,
+    ),
 ) -> None:
-    Application.print_command(Application.serialize_parameter("", scaling))
+    Application.print_command(
+        Application.serialize_parameter("--wait", wait, IF=wait),
+        Application.serialize_parameter(
+            "--timeout", timeout, IF=wait and timeout != DEFAULT_TIMEOUT
+        ),
+        Application.serialize_parameter("", scaling),
+    )
 
     Application.get_controller().controller_init()
 
@@ -34,3 +53,6 @@ def scale(
 
     docker = Docker()
     docker.compose.start_containers([service], scales={service: int(nreplicas)})
+
+    if wait and not wait_services(docker, [service], timeout):
+        print_and_exit("Services not converged in {} seconds", str(timeout))
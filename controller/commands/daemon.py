@@ -0,0 +1,22 @@
+"""
+Serve the rapydo commands from a long-lived process
+"""
+
+from controller import daemon as controller_daemon
+from controller import print_and_exit
+from controller.app import Application
+
+
+@Application.app.command(help="Serve the rapydo commands from a long-lived process")
+def daemon() -> None:
+    Application.print_command()
+
+    # The project is initialized by the daemon and reused by the commands
+    main_folder_error = Application.project_scaffold.check_main_folder()
+    if main_folder_error:
+        print_and_exit(main_folder_error)
+
+    try:
+        controller_daemon.serve()
+    except OSError as e:
+        print_and_exit(str(e))
@@ -10,6 +10,9 @@
 from controller import log, print_and_exit
 from controller.app import Application
 
+# Attached to the terminal, never executed by rapydo daemon
+INTERACTIVE = True
+
 
 class ServiceTypes(str, Enum):
     # New values
@@ -8,13 +8,13 @@
 from typing import Optional, cast
 
 import typer
-from zxcvbn import zxcvbn  # type: ignore
 
 from controller import PLACEHOLDER, PROJECTRC, REGISTRY, log, print_and_exit
 from controller.app import Application, Configuration
 from controller.commands import PASSWORD_MODULES
 from controller.deploy.docker import Docker
 from controller.templating import Templating, get_strong_password
+from controller.utilities import services
 from controller.utilities.tables import print_table
 
 UPDATE_LABEL = "updated on"
@@ -232,6 +232,16 @@ def password(
         last_updates = parse_projectrc()
         now = datetime.now()
 
+        scores = services.get_password_scores(
+            [
+                str(Application.env.get(variable))
+                for module in PASSWORD_MODULES.values()
+                for variable in module.PASSWORD_VARIABLES
+                if Application.env.get(variable) != PLACEHOLDER
+            ],
+            refresh=Configuration.no_cache,
+        )
+
         table: list[list[str]] = []
         for s in PASSWORD_MODULES:
             # This should never happens and can't be (easily) tested
@@ -258,8 +268,7 @@ def password(
                 if password == PLACEHOLDER:
                     score = None
                 else:
-                    result = zxcvbn(password)
-                    score = result["score"]
+                    score = scores[str(password)]
 
                 if variable not in last_updates:
                     expired = True
@@ -362,8 +371,8 @@ def password(
                     REGISTRY, detach=True, publish=[(port, port)]
                 )
             elif Configuration.swarm_mode:
-                docker.compose.dump_config(Application.data.services)
-                docker.swarm.deploy()
+                compose_hash = docker.compose.dump_config(Application.data.services)
+                docker.swarm.deploy(compose_hash)
 
             else:
                 docker.compose.start_containers(Application.data.services)
@@ -78,6 +78,7 @@ def pull(
         docker.client.image.push(local_images, quiet=quiet)
         # remove local tags
         docker.client.image.remove(local_images, prune=True)  # type: ignore
+        docker.swarm.invalidate_deploy()
 
     if include_all:
         target = "Images"
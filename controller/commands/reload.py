@@ -8,6 +8,7 @@
 from controller import log, print_and_exit
 from controller.app import Application, Configuration
 from controller.deploy.docker import Docker
+from controller.deploy.events import DEFAULT_TIMEOUT, wait_services
 
 
 @Application.app.command(help="Reload services")
@@ -17,8 +18,33 @@ def reload(
         help="Services to be reloaded",
         shell_complete=Application.autocomplete_service,
     ),
+    parallel: int = typer.Option(
+        1,
+        "--parallel",
+        help="Number of replicas reloaded at once",
+        min=1,
+    ),
+    wait: bool = typer.Option(
+        False,
+        "--wait",
+        help="Wait for the reloaded services to be running and healthy",
+        show_default=False,
+    ),
+    timeout: int = typer.Option(
+        DEFAULT_TIMEOUT,
+        "--timeout",
+        help="Maximum time (in seconds) to wait for the services with --wait",
+        min=1,
+    ),
 ) -> None:
-    Application.print_command(Application.serialize_parameter("", services))
+    Application.print_command(
+        Application.serialize_parameter("--parallel", parallel, IF=parallel > 1),
+        Application.serialize_parameter("--wait", wait, IF=wait),
+        Application.serialize_parameter(
+            "--timeout", timeout, IF=wait and timeout != DEFAULT_TIMEOUT
+        ),
+        Application.serialize_parameter("", services),
+    )
 
     Application.get_controller().controller_init(services)
 
@@ -28,7 +54,7 @@ def reload(
     if "frontend" in services and len(services) > 1:
         print_and_exit("Can't reload frontend and other services at once")
 
-    reloaded = 0
+    reloaded: list[str] = []
     for service in Application.data.services:
         # Special case: frontend in production mode
         if Configuration.production and service == "frontend":
@@ -43,7 +69,7 @@ def reload(
                 Application.get_controller().controller_init([service])
                 docker = Docker()
                 docker.compose.start_containers([service], force=True)
-                reloaded += 1
+                reloaded.append(service)
             continue
 
         if service not in running_services:
@@ -86,10 +112,18 @@ def reload(
                 continue
             raise
 
-        docker.exec_command(containers, user="root", command="/usr/local/bin/reload")
-        reloaded += 1
+        docker.exec_command(
+            containers,
+            user="root",
+            command="/usr/local/bin/reload",
+            parallel=parallel,
+        )
+        reloaded.append(service)
 
-    if reloaded == 0:
+    if not reloaded:
         log.info("No service reloaded")
     else:
         log.info("Services reloaded")
+
+        if wait and not wait_services(docker, reloaded, timeout):
+            print_and_exit("Services not converged in {} seconds", str(timeout))
@@ -8,7 +8,7 @@
 
 import typer
 
-from controller import BACKUP_DIR, log, print_and_exit
+from controller import BACKUP_DIR, BROADCAST_PARALLELISM, log, print_and_exit
 from controller.app import Application
 from controller.commands import RESTORE_MODULES
 from controller.deploy.builds import verify_available_images
@@ -25,7 +25,12 @@
 def reload(docker: Docker, services: list[str]) -> None:
     for service in services:
         containers = docker.get_containers(service)
-        docker.exec_command(containers, user="root", command="/usr/local/bin/reload")
+        docker.exec_command(
+            containers,
+            user="root",
+            command="/usr/local/bin/reload",
+            parallel=BROADCAST_PARALLELISM,
+        )
 
 
 @Application.app.command(help="Restore a backup of one service")
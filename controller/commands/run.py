@@ -14,6 +14,9 @@
 from controller.deploy.docker import Docker
 from controller.templating import password
 
+# Attached to the terminal, never executed by rapydo daemon
+INTERACTIVE = True
+
 
 def get_publish_ports(
     service: str, change_first_port: Optional[int]
@@ -11,6 +11,9 @@
 from controller.deploy.docker import Docker
 from controller.utilities import services
 
+# Attached to the terminal, never executed by rapydo daemon
+INTERACTIVE = True
+
 
 @Application.app.command(help="Open a shell or execute a command onto a container")
 def shell(
@@ -53,12 +56,28 @@ def shell(
         help="Execute the command on all the replicas",
         show_default=False,
     ),
+    parallel: int = typer.Option(
+        1,
+        "--parallel",
+        help="Number of replicas reached at once when broadcasting the command",
+        min=1,
+    ),
+    continue_on_error: bool = typer.Option(
+        False,
+        "--continue-on-error",
+        help="Continue on the other replicas when the broadcasted command fails",
+        show_default=False,
+    ),
 ) -> None:
     Application.print_command(
         Application.serialize_parameter("--user", user, IF=user),
         Application.serialize_parameter(
             "--default", default_command, IF=default_command
         ),
+        Application.serialize_parameter("--parallel", parallel, IF=parallel > 1),
+        Application.serialize_parameter(
+            "--continue-on-error", continue_on_error, IF=continue_on_error
+        ),
         Application.serialize_parameter("", service),
         Application.serialize_parameter("", command),
     )
@@ -68,6 +87,8 @@ def shell(
 
     if replica > 1 and broadcast:
         print_and_exit("--replica and --broadcast options are not compatible")
+    if (parallel > 1 or continue_on_error) and not broadcast:
+        print_and_exit("--parallel and --continue-on-error options require --broadcast")
     Application.get_controller().controller_init()
 
     docker = Docker()
@@ -84,7 +105,13 @@ def shell(
         if not containers:
             print_and_exit("No running container found for {} service", service)
 
-        docker.exec_command(containers, user=user, command=command)
+        docker.exec_command(
+            containers,
+            user=user,
+            command=command,
+            parallel=parallel,
+            fail_fast=not continue_on_error,
+        )
     else:
         container = docker.get_container(service, slot=replica)
 
@@ -2,29 +2,20 @@
 Start services for the current configuration
 """
 
-import time
-
 import typer
-from python_on_whales.exceptions import DockerException
 
-from controller import log
+from controller import log, print_and_exit
 from controller.app import Application, Configuration
 from controller.deploy.builds import verify_available_images
 from controller.deploy.docker import Docker
+from controller.deploy.events import DEFAULT_TIMEOUT, wait_services, wait_stack_deploy
 
 
-def wait_stack_deploy(docker: Docker) -> None:
-    MAX = 60
-    for i in range(0, MAX):
-        try:
-            if docker.get_running_services():
-                break
-
-            log.info("Stack is still starting, waiting... [{}/{}]", i + 1, MAX)
-            time.sleep(1)
-        # Can happens when the stack is near to be deployed
-        except DockerException:  # pragma: no cover
-            pass
+def get_dependencies() -> dict[str, list[str]]:
+    return {
+        name: list(service.depends_on.keys())
+        for name, service in Application.data.compose_config.items()
+    }
 
 
 @Application.app.command(help="Start services for the current configuration")
@@ -42,11 +33,65 @@ def start(
         help="Force containers restart",
         show_default=False,
     ),
+    wait: bool = typer.Option(
+        False,
+        "--wait",
+        help="Wait for all the services to be running and healthy",
+        show_default=False,
+    ),
+    timeout: int = typer.Option(
+        DEFAULT_TIMEOUT,
+        "--timeout",
+        help="Maximum time (in seconds) to wait for the services with --wait",
+        min=1,
+    ),
+    waves: bool = typer.Option(
+        False,
+        "--waves",
+        help="Start the services in waves, following their dependencies and "
+        "waiting for their healthchecks (compose mode only)",
+        show_default=False,
+    ),
+    rolling: bool = typer.Option(
+        False,
+        "--rolling",
+        help="With --force, restart the services in batches following their "
+        "dependencies and waiting for the new tasks to be healthy (swarm mode only)",
+        show_default=False,
+    ),
+    batch_size: int = typer.Option(
+        1,
+        "--batch-size",
+        help="Number of services restarted together with --rolling",
+        min=1,
+    ),
 ) -> None:
-    Application.print_command(Application.serialize_parameter("", services))
+    Application.print_command(
+        Application.serialize_parameter("--wait", wait, IF=wait),
+        Application.serialize_parameter("--waves", waves, IF=waves),
+        Application.serialize_parameter("--rolling", rolling, IF=rolling),
+        Application.serialize_parameter(
+            "--batch-size", batch_size, IF=rolling and batch_size != 1
+        ),
+        Application.serialize_parameter(
+            "--timeout",
+            timeout,
+            IF=(wait or waves or rolling) and timeout != DEFAULT_TIMEOUT,
+        ),
+        Application.serialize_parameter("", services),
+    )
 
     Application.get_controller().controller_init(services)
 
+    if waves and Configuration.swarm_mode:
+        print_and_exit("--waves option is only supported in compose mode")
+
+    if rolling and not Configuration.swarm_mode:
+        print_and_exit("--rolling option is only supported in swarm mode")
+
+    if rolling and not force:
+        print_and_exit("--rolling option requires --force")
+
     docker = Docker()
     if Configuration.swarm_mode:
         docker.registry.ping()
@@ -58,16 +103,31 @@ def start(
     )
 
     if Configuration.swarm_mode:
-        docker.compose.dump_config(Application.data.services)
-        docker.swarm.deploy()
+        compose_hash = docker.compose.dump_config(Application.data.services)
+        docker.swarm.deploy(compose_hash)
 
-        if force:
+        if rolling:
+            docker.swarm.rolling_restart(
+                Application.data.services,
+                get_dependencies(),
+                batch_size=batch_size,
+                timeout=timeout,
+            )
+        elif force:
             for service in Application.data.services:
                 docker.client.service.update(
                     f"{Configuration.project}_{service}", detach=True, force=True
                 )
-        wait_stack_deploy(docker)
+        if not wait:
+            wait_stack_deploy(docker)
+    elif waves:
+        docker.compose.start_waves(
+            Application.data.services, get_dependencies(), force=force, timeout=timeout
+        )
     else:
         docker.compose.start_containers(Application.data.services, force=force)
 
+    if wait and not wait_services(docker, Application.data.services, timeout):
+        print_and_exit("Services not converged in {} seconds", str(timeout))
+
     log.info("Stack started")
@@ -4,6 +4,7 @@
 
 import typer
 
+from controller import log
 from controller.app import Application
 from controller.deploy.docker import Docker
 
@@ -15,10 +16,27 @@ def status(
         help="Services to be inspected",
         shell_complete=Application.autocomplete_service,
     ),
+    watch: bool = typer.Option(
+        False,
+        "--watch",
+        "-w",
+        help="Keep the status updated in place, until interrupted with Ctrl+C",
+        show_default=False,
+    ),
 ) -> None:
-    Application.print_command(Application.serialize_parameter("", services))
+    Application.print_command(
+        Application.serialize_parameter("--watch", watch, IF=watch),
+        Application.serialize_parameter("", services),
+    )
 
     Application.get_controller().controller_init(services)
 
     docker = Docker()
-    docker.status(Application.data.services)
+    if not watch:
+        docker.status(Application.data.services)
+        return
+
+    try:
+        docker.watch(Application.data.services)
+    except KeyboardInterrupt:
+        log.info("Stopped watching the status")
@@ -1,8 +1,11 @@
+from typing import Optional
+
 import typer
 
-from controller import log, print_and_exit
+from controller import log
 from controller.app import Application
 from controller.deploy.docker import Docker
+from controller.deploy.logs import LogLevels, get_grep_pattern, get_time_option
 
 
 @Application.app.command(help="Watch log tails of services")
@@ -25,26 +28,67 @@ def logs(
         "-t",
         help="Number of lines to show",
     ),
+    since: Optional[str] = typer.Option(
+        None,
+        "--since",
+        help="Show logs since timestamp (e.g. 2024-01-02T13:23:37) "
+        "or relative (e.g. 42m for 42 minutes)",
+        show_default=False,
+    ),
+    until: Optional[str] = typer.Option(
+        None,
+        "--until",
+        help="Show logs before timestamp (e.g. 2024-01-02T13:23:37) "
+        "or relative (e.g. 42m for 42 minutes)",
+        show_default=False,
+    ),
+    grep: Optional[str] = typer.Option(
+        None,
+        "--grep",
+        help="Only show lines matching the regular expression",
+        show_default=False,
+    ),
+    level: Optional[LogLevels] = typer.Option(
+        None,
+        "--level",
+        help="Only show lines logged with this level or higher",
+        case_sensitive=False,
+        show_default=False,
+    ),
+    json_output: bool = typer.Option(
+        False,
+        "--json",
+        help="Show lines as JSON objects",
+        show_default=False,
+    ),
 ) -> None:
     Application.print_command(
         Application.serialize_parameter("--follow", follow, IF=follow),
-        Application.serialize_parameter("--tail", tail),
+        Application.serialize_parameter("--tail", tail, IF=tail),
+        Application.serialize_parameter("--since", since, IF=since),
+        Application.serialize_parameter("--until", until, IF=until),
+        Application.serialize_parameter("--grep", grep, IF=grep),
+        Application.serialize_parameter("--level", level, IF=level),
+        Application.serialize_parameter("--json", json_output, IF=json_output),
         Application.serialize_parameter("", services),
     )
-    Application.get_controller().controller_init(services)
+    since_time = get_time_option("--since", since)
+    until_time = get_time_option("--until", until)
+    pattern = get_grep_pattern(grep)
 
-    if follow and len(Application.data.services) > 1:
-        print_and_exit("Follow flag is not supported on multiple services")
-
-    for service in Application.data.services:
-        if service == "frontend":
-            timestamps = True
-        else:
-            timestamps = False
+    Application.get_controller().controller_init(services)
 
-        docker = Docker()
-        try:
-            docker.swarm.logs(service, follow, tail, timestamps)
-        except KeyboardInterrupt:  # pragma: no cover
-            log.info("Stopped by keyboard")
-        print("")
+    docker = Docker()
+    try:
+        docker.swarm.logs(
+            Application.data.services,
+            follow=follow,
+            tail=tail,
+            since=since_time,
+            until=until_time,
+            grep=pattern,
+            level=level,
+            json_output=json_output,
+        )
+    except KeyboardInterrupt:  # pragma: no cover
+        log.info("Stopped by keyboard")
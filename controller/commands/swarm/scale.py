@@ -9,6 +9,7 @@
 from controller.app import Application, Configuration
 from controller.deploy.builds import verify_available_images
 from controller.deploy.docker import Docker
+from controller.deploy.events import DEFAULT_TIMEOUT, wait_services
 
 # RabbitMQ:
 # https://www.erlang-solutions.com/blog/scaling-rabbitmq-on-a-coreos-cluster-through-docker/
@@ -35,9 +36,18 @@ def scale(
         help="Wait service convergence",
         show_default=False,
     ),
+    timeout: int = typer.Option(
+        DEFAULT_TIMEOUT,
+        "--timeout",
+        help="Maximum time (in seconds) to wait for the service with --wait",
+        min=1,
+    ),
 ) -> None:
     Application.print_command(
         Application.serialize_parameter("--wait", wait, IF=wait),
+        Application.serialize_parameter(
+            "--timeout", timeout, IF=wait and timeout != DEFAULT_TIMEOUT
+        ),
         Application.serialize_parameter("", scaling),
     )
     Application.get_controller().controller_init()
@@ -78,9 +88,12 @@ def scale(
     )
 
     try:
-        docker.client.service.scale(scales, detach=not wait)
+        docker.client.service.scale(scales, detach=True)
     # Can happens in case of scale before start
     except NoSuchService:
         print_and_exit(
             "No such service: {}, have you started your stack?", service_name
         )
+
+    if wait and not wait_services(docker, [service], timeout):
+        print_and_exit("Services not converged in {} seconds", str(timeout))
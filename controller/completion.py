@@ -0,0 +1,214 @@
+"""
+Fast path for the shell completion, answered from the datafile without loading
+the application (typer, python_on_whales, pydantic models and commands modules).
+
+Completions not covered by the datafile (or requested outside a project)
+are completed as usual by the application
+"""
+
+import json
+import os
+import shlex
+from typing import Any, Optional
+
+from controller import DATAFILE
+
+# shell_complete callbacks => datafile key with the values
+COMPLETIONS = {
+    "autocomplete_service": "services",
+    "autocomplete_allservice": "allservices",
+    "autocomplete_submodule": "submodules",
+}
+
+# value and optional help
+Completion = tuple[str, Optional[str]]
+
+
+def read_datafile() -> dict[str, Any]:
+    try:
+        with open(DATAFILE) as json_file:
+            datafile = json.load(json_file)
+    except (OSError, ValueError):
+        return {}
+    return datafile if isinstance(datafile, dict) else {}
+
+
+def split_args(value: str) -> Optional[list[str]]:
+    try:
+        return shlex.split(value)
+    except ValueError:
+        # e.g. unclosed quotes
+        return None
+
+
+def get_completion_args(shell: str) -> Optional[tuple[list[str], str]]:
+    """
+    Arguments and incomplete value, as sent by the scripts installed by typer
+    """
+    if shell == "complete_bash":
+        cwords = split_args(os.environ.get("COMP_WORDS", ""))
+        if cwords is None:
+            return None
+        cword = int(os.environ.get("COMP_CWORD", "0"))
+        incomplete = cwords[cword] if cword < len(cwords) else ""
+        return cwords[1:cword], incomplete
+
+    if shell in ("complete_zsh", "complete_fish"):
+        completion_args = os.environ.get("_TYPER_COMPLETE_ARGS", "")
+        cwords = split_args(completion_args)
+        if cwords is None:
+            return None
+        args = cwords[1:]
+        if args and not completion_args.endswith(" "):
+            return args[:-1], args[-1]
+        return args, ""
+
+    return None
+
+
+def get_help(command: dict[str, Any]) -> Optional[str]:
+    help_text = command.get("short_help") or command.get("help") or ""
+    return help_text.strip().split("\n")[0] or None
+
+
+def complete_param(
+    datafile: dict[str, Any], param: dict[str, Any], incomplete: str
+) -> Optional[list[Completion]]:
+    key = COMPLETIONS.get(param.get("complete") or "")
+    if not key:
+        return None
+    return [(v, None) for v in datafile.get(key, []) if v.startswith(incomplete)]
+
+
+def get_completions(
+    datafile: dict[str, Any], args: list[str], incomplete: str
+) -> Optional[list[Completion]]:
+    commands: dict[str, dict[str, Any]] = datafile.get("commands", {})
+    # option => True if followed by a value
+    global_options: dict[str, bool] = datafile.get("options", {})
+    if not commands or not global_options:
+        return None
+
+    # Skip global options to find the command
+    command_name = None
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if not arg.startswith("-"):
+            command_name = arg
+            break
+        option = arg.split("=")[0]
+        if option not in global_options:
+            return None
+        if global_options[option] and "=" not in arg:
+            index += 1
+        index += 1
+
+    if command_name is None:
+        if incomplete.startswith("-") or (args and global_options.get(args[-1])):
+            return None
+        return [
+            (name, get_help(command))
+            for name, command in sorted(commands.items())
+            if name.startswith(incomplete) and not command.get("hidden")
+        ]
+
+    command = commands.get(command_name)
+    if not command:
+        return None
+
+    params: list[dict[str, Any]] = command.get("params", [])
+    options = {f: p for p in params if p["kind"] == "option" for f in p["flags"]}
+    arguments = [p for p in params if p["kind"] == "argument"]
+    command_args = args[index + 1 :]
+
+    if command_args and command_args[-1] in options:
+        previous = options[command_args[-1]]
+        if not previous["flag"]:
+            return complete_param(datafile, previous, incomplete)
+
+    if incomplete.startswith("-"):
+        flags = sorted([*options, "--help"])
+        return [(f, None) for f in flags if f.startswith(incomplete)]
+
+    # Count the positional values already provided
+    position = 0
+    skip_value = False
+    for arg in command_args:
+        if skip_value:
+            skip_value = False
+        elif arg.startswith("-"):
+            param = options.get(arg)
+            skip_value = bool(param and not param["flag"])
+        else:
+            position += 1
+
+    for argument in arguments:
+        if argument["multiple"] or position == 0:
+            return complete_param(datafile, argument, incomplete)
+        position -= 1
+
+    # All arguments are already provided
+    return []
+
+
+def format_completions(shell: str, completions: list[Completion]) -> str:
+    """
+    Output expected by the completion scripts, as produced by typer
+    """
+    if shell == "complete_zsh":
+
+        def escape(s: str) -> str:
+            return (
+                s.replace('"', '""')
+                .replace("'", "''")
+                .replace("$", "\\$")
+                .replace("`", "\\`")
+            )
+
+        if not completions:
+            return "_files"
+        values = "\n".join(
+            (
+                f'"{escape(value)}":"{escape(help_text)}"'
+                if help_text
+                else f'"{escape(value)}"'
+            )
+            for value, help_text in completions
+        )
+        return f"_arguments '*: :(({values}))'"
+
+    if shell == "complete_fish":
+        return "\n".join(
+            f"{value}\t{' '.join(help_text.split())}" if help_text else value
+            for value, help_text in completions
+        )
+
+    return "\n".join(value for value, _ in completions)
+
+
+def complete(shell: str) -> bool:
+    """
+    Print the completions requested by the shell, if they can be answered
+    from the datafile. Return False to fallback to the application
+    """
+    completion_args = get_completion_args(shell)
+    if completion_args is None:
+        return False
+
+    completions = get_completions(read_datafile(), *completion_args)
+    if completions is None:
+        return False
+
+    if shell == "complete_fish":
+        fish_action = os.environ.get("_TYPER_COMPLETE_FISH_ACTION", "")
+        if fish_action == "is-args":
+            # Exit code 0 enables the completion of arguments, 1 the files
+            raise SystemExit(0 if completions else 1)
+        if fish_action != "get-args":
+            return False
+
+    output = format_completions(shell, completions)
+    if output:
+        print(output)
+    return True
@@ -0,0 +1,416 @@
+"""
+Long-lived daemon serving the controller commands over a Unix socket (rapydo daemon)
+
+The daemon is a fork server: the stack (typer, python_on_whales, pydantic models,
+docker and git wrappers) is imported once and the project is initialized once by the
+daemon itself (configuration, compose services, environment, git repositories).
+The state is kept in memory and inherited by the process forked to execute each
+command, attached to stdin, stdout and stderr of the client (passed over the socket).
+Commands with the same global options of the daemon skip the initialization, others
+initialize the project in the forked process, without affecting the daemon.
+The state is dropped and the project initialized again when the project files
+change, as detected by the daemon every WATCH_INTERVAL seconds or by a forked process.
+
+The CLI forwards the commands to the daemon when its socket is found in the data
+folder, falling back to the in-process execution when the daemon is not reachable
+or refuses the request (e.g. when invoked from a different folder).
+Interactive commands (INTERACTIVE in their module) are refused: the forked process
+is not part of the foreground process group of the terminal of the client.
+Set RAPYDO_DAEMON=0 to never forward the commands
+"""
+
+import contextlib
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, NoReturn, Optional
+
+from controller import CONFS_DIR, DATA_DIR, PROJECT_DIR, PROJECTRC, log
+
+SOCKET_FILE = DATA_DIR.joinpath("daemon.sock")
+DAEMON_COMMAND = "daemon"
+
+# Executed by the daemon to initialize the project (the output is discarded)
+INIT_ARGS = ["list", "env"]
+# Interval between two checks of the project files
+WATCH_INTERVAL = 2.0
+# Maximum time allowed to a client to send its request
+REQUEST_TIMEOUT = 5.0
+
+# Modules imported once by the daemon and shared by all the commands
+PRELOADED_MODULES = [
+    "controller.app",
+    "controller.deploy.builds",
+    "controller.deploy.compose_v2",
+    "controller.deploy.docker",
+    "controller.deploy.swarm",
+    "controller.templating",
+    "controller.utilities.services",
+    "python_on_whales",
+    "requests",
+    "zxcvbn",
+]
+
+# Length of the request, sent along with the stdin, stdout and stderr descriptors
+HEADER = struct.Struct("!Q")
+# pid of the process executing the command, or REFUSED
+PID = struct.Struct("!q")
+EXIT_CODE = struct.Struct("!i")
+REFUSED = -1
+
+FORWARDED_SIGNALS = [signal.SIGINT, signal.SIGTERM, signal.SIGHUP]
+
+# Stats of the project files when the project was initialized by the daemon
+INITIALIZED_STATS: list[Any] = []
+
+
+def is_supported() -> bool:
+    # Descriptors passing and fork are only available on Unix
+    return hasattr(socket, "send_fds") and hasattr(os, "fork")
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by the peer")
+        data += chunk
+    return data
+
+
+def get_files_stats(files: Iterable[Path]) -> list[Any]:
+    """
+    Modification time and size of the files, a cheap way to detect changes
+    """
+    stats: list[Any] = []
+    for path in files:
+        try:
+            stat = path.stat()
+        except OSError:
+            stats.append([str(path), None])
+            continue
+        stats.append([str(path), stat.st_mtime_ns, stat.st_size])
+    return stats
+
+
+def get_sources_stats() -> list[Any]:
+    # An upgrade of the controller requires to restart the daemon
+    sources = Path(__file__).resolve().parent
+    return get_files_stats(sorted([*sources.rglob("*.py"), *CONFS_DIR.rglob("*.y*ml")]))
+
+
+def get_project_stats() -> list[Any]:
+    return get_files_stats(
+        sorted(
+            [
+                PROJECTRC,
+                *PROJECT_DIR.glob("*/project_configuration.yaml"),
+                *PROJECT_DIR.glob("*/confs/*.y*ml"),
+            ]
+        )
+    )
+
+
+def forward(args: list[str]) -> Optional[int]:
+    """
+    Execute the command on the daemon and return its exit code.
+    Return None if the command is not executed by the daemon
+    """
+    if os.getenv("RAPYDO_DAEMON", "1") == "0" or not is_supported():
+        return None
+
+    if not SOCKET_FILE.exists():
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(SOCKET_FILE))
+        request = {"args": args, "cwd": os.getcwd(), "env": dict(os.environ)}
+        payload = json.dumps(request).encode()
+        socket.send_fds(client, [HEADER.pack(len(payload))], [0, 1, 2])
+        client.sendall(payload)
+        (pid,) = PID.unpack(recv_exactly(client, PID.size))
+    except OSError:
+        # Not running (stale socket) or not reachable
+        client.close()
+        return None
+
+    if pid == REFUSED:
+        client.close()
+        return None
+
+    # The command is executed out of the terminal, signals are to be forwarded
+    def forward_signal(signum: int, frame: Any) -> None:
+        try:
+            os.kill(pid, signum)
+        except OSError:  # pragma: no cover
+            pass
+
+    handlers = {s: signal.signal(s, forward_signal) for s in FORWARDED_SIGNALS}
+    try:
+        (exit_code,) = EXIT_CODE.unpack(recv_exactly(client, EXIT_CODE.size))
+    except OSError:  # pragma: no cover
+        # The process was killed before reporting its exit code
+        exit_code = 1
+    finally:
+        client.close()
+        for s, handler in handlers.items():
+            signal.signal(s, handler)
+
+    return int(exit_code)
+
+
+def run_command() -> int:
+    # Same entry point of the in-process execution
+    from controller.__main__ import run
+
+    try:
+        run()
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    return 0
+
+
+def execute(
+    server: socket.socket,
+    conn: socket.socket,
+    fds: list[int],
+    args: list[str],
+    cwd: str,
+    env: dict[str, str],
+) -> NoReturn:
+    """
+    Executed by the forked process: replace the standard descriptors with the
+    ones of the client and execute the command as if invoked from the client
+    """
+    from controller.utilities import probes
+
+    exit_code = 1
+    try:
+        server.close()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+        sys.argv = ["rapydo", *args]
+
+        # Threads of the daemon (and their pending probes) are not inherited
+        probes.reset_executor()
+        # Changed after the last check of the daemon
+        if get_project_stats() != INITIALIZED_STATS:
+            invalidate()
+
+        conn.sendall(PID.pack(os.getpid()))
+
+        exit_code = run_command()
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):  # pragma: no cover
+                pass
+        try:
+            conn.sendall(EXIT_CODE.pack(exit_code))
+        except OSError:  # pragma: no cover
+            pass
+        os._exit(exit_code)
+
+
+def invalidate() -> None:
+    from controller.app import Application
+
+    # A new controller is created by the next command
+    Application.controller = None
+
+
+def release() -> None:
+    """
+    Connections and processes opened by the initialization are not to be shared
+    with the forked processes, they are opened again when needed
+    """
+    from controller.app import Application
+    from controller.deploy.engine import API_ENGINES
+
+    for engine in API_ENGINES.values():
+        engine.close()
+    for repo in Application.gits.values():
+        if repo:
+            repo.close()
+
+
+def initialize() -> None:
+    """
+    Initialize the project in the daemon, the state is inherited by the forked
+    processes. If the initialization fails, each command will initialize the project
+    """
+    global INITIALIZED_STATS
+    from controller.app import Application
+
+    log.info("Initializing the project")
+    invalidate()
+    Application.persistent = True
+    # Collected before the initialization, to detect changes made in the meantime
+    INITIALIZED_STATS = get_project_stats()
+
+    argv = sys.argv
+    sys.argv = ["rapydo", *INIT_ARGS]
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            exit_code = run_command()
+    finally:
+        sys.argv = argv
+        release()
+
+    if exit_code != 0 or not Application.controller:
+        log.warning("Can't initialize the project, it will be done by each command")
+
+
+def get_command(args: list[str]) -> Optional[str]:
+    """
+    Name of the command, found by the click parser after the global options
+    """
+    import click
+    from typer.main import get_command as get_click_command
+
+    from controller.app import Application
+
+    group = get_click_command(Application.app)
+    ctx = click.Context(group, info_name="rapydo", resilient_parsing=True)
+    try:
+        _, command_args, _ = group.make_parser(ctx).parse_args(list(args))
+    except click.ClickException:
+        return None
+    return command_args[0] if command_args else None
+
+
+def is_forwardable(args: list[str]) -> bool:
+    from controller.commands import get_manifest
+
+    name = get_command(args)
+    # The daemon itself is never forwarded
+    if name == DAEMON_COMMAND:
+        return False
+    command = get_manifest().get(name or "")
+    return not (command and command["interactive"])
+
+
+def handle(server: socket.socket, conn: socket.socket) -> None:
+    conn.settimeout(REQUEST_TIMEOUT)
+    header, fds, _, _ = socket.recv_fds(conn, HEADER.size, 3)
+    try:
+        if len(header) != HEADER.size or len(fds) != 3:
+            raise ConnectionError("Invalid request")
+
+        request = json.loads(recv_exactly(conn, HEADER.unpack(header)[0]))
+
+        # The daemon only serves the project it was started from
+        if Path(request["cwd"]).resolve() != Path.cwd().resolve():
+            log.debug("Refused command from {}", request["cwd"])
+            conn.sendall(PID.pack(REFUSED))
+            return
+
+        if not is_forwardable(request["args"]):
+            log.debug("Refused interactive command {}", " ".join(request["args"]))
+            conn.sendall(PID.pack(REFUSED))
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            execute(server, conn, fds, request["args"], request["cwd"], request["env"])
+
+        log.info("Executing rapydo {} (pid {})", " ".join(request["args"]), pid)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def serve() -> None:
+    if not is_supported():  # pragma: no cover
+        raise OSError("The daemon is not supported on this platform")
+
+    # Connections are refused on stale sockets, left behind by killed daemons
+    if SOCKET_FILE.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(SOCKET_FILE))
+            raise OSError(f"A daemon is already listening on {SOCKET_FILE}")
+        except ConnectionRefusedError:
+            SOCKET_FILE.unlink()
+        finally:
+            probe.close()
+
+    for module in PRELOADED_MODULES:
+        try:
+            __import__(module)
+        except ImportError as e:  # pragma: no cover
+            log.debug("Can't preload {}: {}", module, e)
+
+    SOCKET_FILE.parent.mkdir(parents=True, exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Only the owner is allowed to connect
+    umask = os.umask(0o077)
+    try:
+        server.bind(str(SOCKET_FILE))
+    finally:
+        os.umask(umask)
+    server.listen()
+    server.settimeout(WATCH_INTERVAL)
+
+    # Forked processes are automatically reaped
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    # Stopped as on Ctrl+C, to remove the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    sources_stats = get_sources_stats()
+    project_stats: Optional[list[Any]] = None
+    log.info("Daemon listening on {}", SOCKET_FILE)
+    try:
+        while True:
+            current_stats = get_project_stats()
+            if current_stats != project_stats:
+                if project_stats is not None:
+                    log.info("Project files changed")
+                project_stats = current_stats
+                initialize()
+
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+
+            with conn:
+                if get_sources_stats() != sources_stats:
+                    conn.sendall(PID.pack(REFUSED))
+                    log.warning("Controller changed, restart the daemon")
+                    break
+                try:
+                    handle(server, conn)
+                except (OSError, ValueError, KeyError) as e:
+                    log.warning("Invalid request: {}", e)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        SOCKET_FILE.unlink(missing_ok=True)
+        log.info("Daemon stopped")
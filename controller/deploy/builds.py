@@ -6,8 +6,6 @@
 from pathlib import Path
 from typing import Optional, TypedDict
 
-from python_on_whales.exceptions import NoSuchImage
-
 from controller import RED, ComposeServices, log, print_and_exit
 from controller.app import Application, Configuration
 from controller.deploy.docker import Docker
@@ -51,10 +49,10 @@ def name_priority(name1: str, name2: str) -> str:
 
 def get_image_creation(image_name: str) -> datetime:
     docker = Docker()
-    try:
-        return docker.client.image.inspect(image_name).created
-    except NoSuchImage:
+    created = docker.engine.get_image_creation(image_name)
+    if created is None:
         return datetime.fromtimestamp(0)
+    return created
 
 
 def find_templates_build(
@@ -179,7 +177,7 @@ def verify_available_images(
             if Configuration.swarm_mode and not is_run_command:
                 image_exists = docker.registry.verify_image(image)
             else:
-                image_exists = docker.client.image.exists(image)
+                image_exists = docker.engine.image_exists(image)
 
             if not image_exists:
                 if is_run_command:
@@ -206,7 +204,7 @@ def verify_available_images(
             if Configuration.swarm_mode and not is_run_command:
                 image_exists = docker.registry.verify_image(image)
             else:
-                image_exists = docker.client.image.exists(image)
+                image_exists = docker.engine.image_exists(image)
             if not image_exists:
                 action = "build" if data["path"] else "pull"
                 print_and_exit(
@@ -1,14 +1,24 @@
+import hashlib
+import os
+import re
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
 from typing import Any, Optional, Union
 
 import yaml
+from glom import glom
 from python_on_whales.components.compose.models import ComposeConfig
-from python_on_whales.utils import DockerException
+from python_on_whales.utils import DockerException, run
+from rich.live import Live
+from rich.table import Table
 
 from controller import (
+    COMPOSE_ENVIRONMENT_FILE,
     COMPOSE_FILE,
     COMPOSE_FILE_VERSION,
+    NATIVE_COMPOSE,
     RED,
     REGISTRY,
     log,
@@ -16,15 +26,30 @@
 )
 from controller.app import Configuration
 from controller.deploy.docker import Docker
+from controller.deploy.engine import ACTIVE_STATES, COMPOSE_PROJECT_LABEL, ContainerInfo
+from controller.deploy.events import (
+    DEFAULT_TIMEOUT,
+    WAKE_UP_INTERVAL,
+    WATCH_INTERVAL,
+    WATCHED_ACTIONS,
+    EventsStream,
+    wait_convergence,
+)
+from controller.deploy.logs import LogLevels, LogsMultiplexer, LogsWriter
+from controller.utilities import cache, compose
+from controller.utilities import services as services_utils
 from controller.utilities import system
-from controller.utilities.tables import print_table
+from controller.utilities.compose import UnsupportedComposeSyntax
+from controller.utilities.tables import get_table, print_table
 
 Port = Union[str, int]
 PortMapping = tuple[Port, Port]
 PortRangeMapping = tuple[Port, Port, str]
 
-# Starting from v2.0.0 _ is replaced by -
-COMPOSE_SEP = "-"
+STATUS_HEADERS = ["ID", "NAME", "STATUS", "CREATED", "IMAGE", "PORTS"]
+TIMELINE_HEADERS = ["SERVICE", "WAVE", "STARTED", "READY", "STARTUP TIME"]
+
+CONFIG_JSON_CACHE = "compose-config-json"
 
 
 class Compose:
@@ -33,12 +58,63 @@ def __init__(self, docker: Docker) -> None:
         self.docker = self.docker_wrapper.client
 
     def get_config(self) -> ComposeConfig:
+        if NATIVE_COMPOSE:
+            try:
+                return ComposeConfig(**self.get_native_config())
+            except UnsupportedComposeSyntax as e:
+                log.debug("Falling back to docker compose config: {}", e)
+
         # return type is Union[ComposeConfig, dict[str, Any]] based on return_json
         return self.docker.compose.config(return_json=False)  # type: ignore
 
+    def get_native_config(self) -> dict[str, Any]:
+        client_config = self.docker.client_config
+        env_file = client_config.compose_env_file
+        return compose.get_config(
+            [Path(f) for f in client_config.compose_files],
+            compose.get_environment(Path(env_file) if env_file else None),
+            client_config.compose_project_name,
+        )
+
     def get_config_json(self) -> dict[str, Any]:
+        client_config = self.docker.client_config
+        env_file = client_config.compose_env_file
+        fingerprint = cache.get_compose_fingerprint(
+            [Path(f) for f in client_config.compose_files],
+            Path(env_file) if env_file else COMPOSE_ENVIRONMENT_FILE,
+        )
+
+        if not Configuration.no_cache:
+            cached = cache.load(CONFIG_JSON_CACHE, fingerprint)
+            if cached:
+                return cached
+
         # return type is Union[ComposeConfig, dict[str, Any]] based on return_json
-        return self.docker.compose.config(return_json=True)  # type: ignore
+        config: dict[str, Any] = self.docker.compose.config(return_json=True)  # type: ignore
+        cache.save(CONFIG_JSON_CACHE, fingerprint, config)
+        return config
+
+    @staticmethod
+    def get_config_hash(content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def write_config(content: str) -> bool:
+        """
+        Write the compose file, unless already containing the same content
+        (the modification time is preserved). True if the file is written
+        """
+        try:
+            if COMPOSE_FILE.read_text() == content:
+                return False
+        except OSError:
+            pass
+
+        # Write and rename, to never leave a partial compose file behind
+        tmp_file = COMPOSE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(content)
+        tmp_file.replace(COMPOSE_FILE)
+        return True
 
     @staticmethod
     def create_local_path(path: Path, label: str) -> None:
@@ -64,7 +140,12 @@ def dump_config(
         services: list[str],
         set_registry: bool = True,
         v1_compatibility: bool = False,
-    ) -> None:
+    ) -> str:
+        """
+        Dump the configuration of the given services on the compose file, only
+        rewritten if changed. Return the hash of the content of the compose file,
+        used to detect deploys with the same configuration
+        """
         compose_config = self.get_config_json()
 
         clean_config: dict[str, Any] = {
@@ -172,10 +253,13 @@ def dump_config(
 
             clean_config["volumes"][vol] = volume_config
 
-        with open(COMPOSE_FILE, "w") as fh:
-            fh.write(yaml.dump(clean_config, default_flow_style=False))
+        content = yaml.dump(clean_config, default_flow_style=False)
+        if self.write_config(content):
+            log.debug("Compose configuration dumped on {}", COMPOSE_FILE)
+        else:
+            log.debug("Compose configuration unchanged on {}", COMPOSE_FILE)
 
-        log.debug("Compose configuration dumped on {}", COMPOSE_FILE)
+        return self.get_config_hash(content)
 
     def start_containers(
         self,
@@ -204,11 +288,69 @@ def start_containers(
             force_recreate=force,
             scales=scales,
         )
+        self.docker_wrapper.invalidate_snapshots()
         if scales:
             log.info("Services scaled: {}", services_list)
         else:
             log.info("Services started: {}", services_list)
 
+    def start_waves(
+        self,
+        services: list[str],
+        dependencies: dict[str, list[str]],
+        force: bool = False,
+        timeout: int = DEFAULT_TIMEOUT,
+    ) -> None:
+        """
+        Start the services in waves following their dependencies: services of
+        a wave are started together once all the services of the previous waves
+        are running and healthy. A readiness timeline is reported at the end.
+        Dependencies of the services are started too, as done by compose up
+        """
+        # Waves are started with --no-deps, dependencies have to be included
+        required = services_utils.walk_services(list(services), dependencies)
+        if missing := [s for s in required if s not in services]:
+            log.info("Also starting dependencies: {}", ", ".join(sorted(missing)))
+        waves = services_utils.get_startup_waves(required, dependencies)
+
+        start_time = time.monotonic()
+        timeline: list[list[str]] = []
+        for index, wave in enumerate(waves, start=1):
+            log.info("Starting wave {}/{}: {}...", index, len(waves), ", ".join(wave))
+            started = time.monotonic() - start_time
+
+            # dependencies are already started by the previous waves
+            cmd = [*self.docker.client_config.docker_compose_cmd, "up", "--detach"]
+            cmd.append("--no-deps")
+            if force:
+                cmd.append("--force-recreate")
+            run([*cmd, *wave], capture_stdout=False, capture_stderr=False)
+            self.docker_wrapper.invalidate_snapshots()
+
+            convergence, _ = wait_convergence(self.docker_wrapper, wave, timeout)
+
+            for service in wave:
+                if service in convergence:
+                    ready = f"{started + convergence[service]:.1f}s"
+                    duration = f"[green]{convergence[service]:.1f}s[/green]"
+                else:
+                    ready = "N/A"
+                    duration = "[red]not ready[/red]"
+                timeline.append(
+                    [service, str(index), f"{started:.1f}s", ready, duration]
+                )
+
+            if len(convergence) < len(wave):
+                print_table(TIMELINE_HEADERS, timeline, table_title="Startup timeline")
+                print_and_exit(
+                    "Services not ready in {} seconds: {}",
+                    str(timeout),
+                    ", ".join(s for s in wave if s not in convergence),
+                )
+
+        print_table(TIMELINE_HEADERS, timeline, table_title="Startup timeline")
+        log.info("Services started: {}", ", ".join(services))
+
     def create_volatile_container(
         self,
         service: str,
@@ -272,75 +414,33 @@ def create_volatile_container(
             return False
 
     def get_running_services(self) -> set[str]:
-        prefix = f"{Configuration.project}{COMPOSE_SEP}"
         containers = set()
-        try:
-            for container in self.docker.compose.ps():
-                name = container.name
-                if not name.startswith(prefix):
-                    continue
-
-                status = container.state.status
-                if status != "running" and status != "starting" and status != "ready":
-                    continue
-
-                # to be replaced with removeprefix
-                name = name[len(prefix) :]
-                # Remove the _instancenumber (i.e. _1 or _n in case of scaled services)
-                name = name[0 : name.index(COMPOSE_SEP)]
-                containers.add(name)
-            return containers
-        # An exception is raised when no service is running.
-        # The same happens with:
-        # `docker compose ps`
-        # that fails with a "not found" and it seems to be a bug of compose-cli.
-        # In case it is a feature a specific exception would be helpful here
-        except DockerException:
-            return containers
+        for container in self.docker_wrapper.get_project_containers():
+            status = container.status
+            if status != "running" and status != "starting" and status != "ready":
+                continue
+
+            if container.service:
+                containers.add(container.service)
+        return containers
 
     def get_services_status(self, prefix: str) -> dict[str, str]:
-        prefix += COMPOSE_SEP
         services_status: dict[str, str] = dict()
-        try:
-            for container in self.docker.compose.ps():
-                name = container.name
-                if not name.startswith(prefix):
-                    continue
-
-                status = container.state.status or "N/A"
-
-                # to be replaced with removeprefix
-                name = name[len(prefix) :]
-                # Remove the _instancenumber (i.e. _1 or _n in case of scaled services)
-                name = name[0 : name.index(COMPOSE_SEP)]
-                services_status[name] = status
-            return services_status
-        # An exception is raised when no service is running.
-        # The same happens with:
-        # `docker compose ps`
-        # that fails with a "not found" and it seems to be a bug of compose-cli.
-        # In case it is a feature a specific exception would be helpful here
-        except DockerException:
-            return services_status
-
-    def status(self, services: list[str]) -> None:
-        print("")
+        for container in self.docker_wrapper.get_project_containers(project=prefix):
+            if container.service:
+                services_status[container.service] = container.status
+        return services_status
 
-        prefix = f"{Configuration.project}{COMPOSE_SEP}"
+    @staticmethod
+    def get_status_rows(
+        containers: list[ContainerInfo], services: list[str]
+    ) -> list[list[str]]:
         table: list[list[str]] = []
-        for container in self.docker.compose.ps():
-            name = container.name
-            if not name.startswith(prefix):
+        for container in containers:
+            if container.service not in services:
                 continue
-            # to be replaced with removeprefix
-            name = name[len(prefix) :]
-            if COMPOSE_SEP in name:
-                name = name[0 : name.index(COMPOSE_SEP)]
 
-            if name not in services:
-                continue
-
-            status = container.state.status or "N/A"
+            status = container.status
             if status == "shutdown" or status == "complete":
                 OPEN_COLOR = "[bold blue]"
                 CLOSE_COLOR = "[/bold blue]"
@@ -357,67 +457,108 @@ def status(self, services: list[str]) -> None:
                 OPEN_COLOR = ""
                 CLOSE_COLOR = ""
 
-            ports_list = []
-            if container.network_settings.ports:
-                for (
-                    container_port,
-                    host_port,
-                ) in container.network_settings.ports.items():
-                    if host_port:
-                        container_port = container_port.split("/")[0]
-                        ports_list.append(
-                            f"{container_port}->{host_port[0]['HostPort']}"
-                        )
+            ports_list = [f"{c_port}->{h_port}" for c_port, h_port in container.ports]
 
-            container_image = container.config.image or "N/A"
             table.append(
                 [
                     container.id[0:12],
                     f"{OPEN_COLOR}{container.name}{CLOSE_COLOR}",
                     status,
                     container.created.strftime("%d-%m-%Y %H:%M:%S"),
-                    container_image,
+                    container.image,
                     ",".join(ports_list),
                 ],
             )
+        return table
+
+    def status(self, services: list[str]) -> None:
+        print("")
+
+        containers = self.docker_wrapper.get_project_containers()
+        table = self.get_status_rows(containers, services)
 
         if not table:
             log.info("No container is running")
         else:
-            print_table(
-                ["ID", "NAME", "STATUS", "CREATED", "IMAGE", "PORTS"],
-                table,
-                table_title="List of containers",
+            print_table(STATUS_HEADERS, table, table_title="List of containers")
+
+    def watch(self, services: list[str]) -> None:
+        """
+        Status of the containers updated in place by the events of the engine:
+        only the containers reported by the events are inspected again.
+        If the events are no longer received, all the containers are listed
+        again every WAKE_UP_INTERVAL seconds
+        """
+        project = Configuration.project
+
+        def list_containers() -> dict[str, ContainerInfo]:
+            self.docker_wrapper.invalidate_snapshots()
+            return {
+                c.id: c
+                for c in self.docker_wrapper.get_project_containers()
+                if c.service
+            }
+
+        containers = list_containers()
+
+        def render() -> Table:
+            rows = self.get_status_rows(
+                sorted(containers.values(), key=lambda c: c.name), services
             )
+            return get_table(STATUS_HEADERS, rows, table_title="List of containers")
+
+        with EventsStream(self.docker_wrapper, ["container"]) as events:
+            with Live(render(), auto_refresh=False) as live:
+                while True:
+                    if not events.alive:
+                        time.sleep(WAKE_UP_INTERVAL)
+                        containers = list_containers()
+                        live.update(render(), refresh=True)
+                        continue
+
+                    changed = False
+                    for event in events.wait(WATCH_INTERVAL):
+                        action = str(event.get("Action") or "").split(":")[0]
+                        attributes: dict[str, str] = (
+                            glom(event, "Actor.Attributes", default={}) or {}
+                        )
+                        if action not in WATCHED_ACTIONS:
+                            continue
+                        if attributes.get(COMPOSE_PROJECT_LABEL) != project:
+                            continue
+
+                        container_id = str(event.get("id") or "")
+                        container = self.docker_wrapper.engine.get_container(
+                            container_id
+                        )
+                        if (
+                            container
+                            and container.status in ACTIVE_STATES
+                            and not container.oneoff
+                        ):
+                            containers[container_id] = container
+                        else:
+                            containers.pop(container_id, None)
+                        changed = True
+
+                    if changed:
+                        live.update(render(), refresh=True)
+
+    def logs(
+        self,
+        services: list[str],
+        follow: bool = False,
+        tail: int = 500,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        grep: Optional["re.Pattern[str]"] = None,
+        level: Optional[LogLevels] = None,
+        json_output: bool = False,
+    ) -> None:
+        # Frontend logs are timestamped, unless shown with other services
+        timestamps = services if services == ["frontend"] else []
+        writer = LogsWriter(services, timestamps, json_output, grep, level)
 
-    def logs(self, services: list[str], follow: bool = False, tail: int = 500) -> None:
-        if len(services) > 1:
-            timestamps = False
-            log_prefix = True
-        elif services[0] in "frontend":
-            timestamps = True
-            log_prefix = False
-        else:
-            timestamps = False
-            log_prefix = False
-
-        lines = self.docker.compose.logs(
-            services,
-            follow=follow,
-            tail=str(tail),
-            timestamps=timestamps,
-            no_log_prefix=not log_prefix,
-            stream=True,
-        )
-        for log_line in lines:
-            # 'stdout' or 'stderr'
-            # Both out and err are collapsed in stdout
-            # Maybe in the future would be useful to keep them separated?
-            # stdstream = log_line[0]
-
-            line = log_line[1]
-
-            if isinstance(line, bytes):
-                line = line.decode("UTF-8")
-
-            print(line.strip())
+        LogsMultiplexer(
+            self.docker_wrapper, writer, follow, tail, since=since, until=until
+        ).compose_logs(services)
@@ -1,18 +1,28 @@
 import re
 import shlex
 import sys
+import threading
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Union, cast
 
 from python_on_whales import DockerClient
-from python_on_whales.exceptions import NoSuchContainer, NoSuchService
 from python_on_whales.utils import DockerException
 
 from controller import COMPOSE_ENVIRONMENT_FILE, log
 from controller.app import Application, Configuration
+from controller.deploy import ssh
+from controller.deploy.engine import (
+    ACTIVE_STATES,
+    COMPOSE_PROJECT_LABEL,
+    ContainerInfo,
+    Engine,
+    create_engine,
+)
 from controller.utilities import system
+from controller.utilities.tables import print_table
 
 MAIN_NODE = "manager"
 # Starting from v2.0.0 _ is replaced by -
@@ -20,6 +30,11 @@
 
 
 class Docker:
+    # Clients shared by the commands of a batch, by compose files and host
+    clients: dict[
+        tuple[tuple[str, ...], Optional[str]], tuple[DockerClient, Engine]
+    ] = {}
+
     def __init__(
         self, compose_files: Optional[list[Path]] = None, verify_swarm: bool = True
     ) -> None:
@@ -29,17 +44,29 @@ def __init__(
             if hasattr(Application, "data"):
                 compose_files = Application.data.files
 
-        if compose_files:
-            self.client = DockerClient(
-                compose_files=cast(list[Union[str, Path]], compose_files),
-                compose_env_file=COMPOSE_ENVIRONMENT_FILE.resolve(),
-                host=self.get_engine(Configuration.remote_engine),
-            )
+        host = self.get_engine(Configuration.remote_engine)
+        client_key = (tuple(str(f) for f in compose_files or []), host)
 
+        if Configuration.batch and client_key in Docker.clients:
+            self.client, self.engine = Docker.clients[client_key]
         else:
-            self.client = DockerClient(
-                host=self.get_engine(Configuration.remote_engine),
-            )
+            if compose_files:
+                self.client = DockerClient(
+                    compose_files=cast(list[Union[str, Path]], compose_files),
+                    compose_env_file=COMPOSE_ENVIRONMENT_FILE.resolve(),
+                    host=host,
+                )
+
+            else:
+                self.client = DockerClient(host=host)
+
+            # Backend used to query the engine, see RAPYDO_DOCKER_BACKEND
+            self.engine = create_engine(self.client)
+
+            if Configuration.batch:
+                Docker.clients[client_key] = (self.client, self.engine)
+        # Containers of the compose projects, see get_project_containers
+        self.snapshots: dict[str, list[ContainerInfo]] = {}
 
         # temporary added here to prevent circular imports, to be moved upside
         from controller.deploy.registry import Registry
@@ -66,10 +93,10 @@ def connect_engine(self, node_id: str) -> DockerClient:
         if not node_id or node_id == MAIN_NODE or not Configuration.swarm_mode:
             return self.client
 
-        node = self.client.node.inspect(node_id)
+        node_address = self.engine.get_node_address(node_id)
 
         # Always use the default client if executing on localhost
-        if node.status.addr == system.get_local_ip(production=False):
+        if node_address == system.get_local_ip(production=False):
             return self.client
 
         # manager address should be localhost in dev mode, something else in prod mode
@@ -78,10 +105,10 @@ def connect_engine(self, node_id: str) -> DockerClient:
             or system.get_local_ip(Configuration.production)
         )
 
-        if node.status.addr == manager_address:
+        if node_address == manager_address:
             return self.client
 
-        return DockerClient(host=self.get_engine(node.status.addr))
+        return DockerClient(host=self.get_engine(node_address))
 
     @classmethod
     def get_engine(cls, engine: Optional[str]) -> Optional[str]:
@@ -95,7 +122,7 @@ def get_engine(cls, engine: Optional[str]) -> Optional[str]:
             user = system.get_username(system.get_current_uid())
             engine = f"{user}@{engine}"
 
-        return f"ssh://{engine}"
+        return ssh.get_docker_host(engine)
 
     @classmethod
     def get_service(cls, service: str) -> str:
@@ -115,42 +142,59 @@ def get_running_services(self) -> set[str]:
         else:
             return self.compose.get_running_services()
 
+    def get_project_containers(
+        self, project: Optional[str] = None, all: bool = False
+    ) -> list[ContainerInfo]:
+        """
+        Containers of a compose project (the current one by default), filtered
+        by the engine on the project label. The query is executed once and reused
+        by all the following lookups, until invalidated by a change made through
+        this wrapper (e.g. start or remove)
+        """
+        project = project or Configuration.project
+        if project not in self.snapshots:
+            self.snapshots[project] = self.engine.list_containers(
+                all=True, labels={COMPOSE_PROJECT_LABEL: project}
+            )
+        # Volatile containers (i.e. compose run) are excluded, as by compose ps
+        containers = [c for c in self.snapshots[project] if not c.oneoff]
+        if all:
+            return containers
+        return [c for c in containers if c.status in ACTIVE_STATES]
+
+    def invalidate_snapshots(self) -> None:
+        self.snapshots.clear()
+
     def get_containers(self, service: str) -> dict[int, tuple[str, str]]:
         containers: dict[int, tuple[str, str]] = {}
         service_name = self.get_service(service)
 
         if Configuration.swarm_mode:
-            try:
-                for task in self.client.service.ps(service_name):
-                    if task.status.state not in ("running", "starting", "ready"):
-                        continue
-                    # this is the case of services set with `mode: global`
-                    if task.slot is None:
-                        containers.setdefault(
-                            0,
-                            (
-                                f"{service_name}.{task.node_id}.{task.id}",
-                                task.node_id,
-                            ),
-                        )
-                        break
-
+            for task in self.engine.get_tasks(service_name):
+                if task.state not in ("running", "starting", "ready"):
+                    continue
+                # this is the case of services set with `mode: global`
+                if task.slot is None:
                     containers.setdefault(
-                        task.slot,
+                        0,
                         (
-                            f"{service_name}.{task.slot}.{task.id}",
+                            f"{service_name}.{task.node_id}.{task.id}",
                             task.node_id,
                         ),
                     )
-            except (NoSuchService, NoSuchContainer):
-                return containers
+                    break
+
+                containers.setdefault(
+                    task.slot,
+                    (
+                        f"{service_name}.{task.slot}.{task.id}",
+                        task.node_id,
+                    ),
+                )
         else:
-            prefix = f"{service_name}{COMPOSE_SEP}"
-            for c in self.client.container.list():
-                if not c.name.startswith(prefix):
-                    continue
-                slot = int(c.name.removeprefix(prefix))
-                containers.setdefault(slot, (c.name, MAIN_NODE))
+            for c in self.get_project_containers():
+                if c.service == service and c.slot is not None:
+                    containers.setdefault(c.slot, (c.name, MAIN_NODE))
         return containers
 
     def get_container_name(self, service_name: str, slot: int = 1) -> str:
@@ -163,20 +207,17 @@ def get_container(self, service: str, slot: int = 1) -> Optional[tuple[str, str]
             return tasks.get(slot) or tasks.get(0)
 
         service_name = self.get_service(service)
-        c = self.get_container_name(service_name, slot=slot)
-        log.debug("Container name: {}", c)
-        # Can't use container.exists because a check on the status is needed
-        try:
-            container = self.client.container.inspect(c)
-            status = container.state.status
-            if status not in ("running", "starting", "ready"):
+        log.debug("Container name: {}", self.get_container_name(service_name, slot))
+        for c in self.get_project_containers(all=True):
+            if c.service != service or c.slot != slot:
+                continue
+            if c.status not in ("running", "starting", "ready"):
                 log.warning(
-                    "Found a container for {}, but status is {}", service, status
+                    "Found a container for {}, but status is {}", service, c.status
                 )
                 return None
-            return (c, MAIN_NODE)
-        except NoSuchContainer:
-            return None
+            return (c.name, MAIN_NODE)
+        return None
 
     @staticmethod
     def split_command(command: Optional[str]) -> list[str]:
@@ -196,6 +237,10 @@ def exec_command(
         command: Optional[str] = None,
         # this basically force tty=False
         force_output_return: bool = False,
+        # replicas reached at once when broadcasting the command
+        parallel: int = 1,
+        # stop at the first failure, otherwise continue on the other replicas
+        fail_fast: bool = True,
     ) -> Optional[Union[str, Iterable[tuple[str, bytes]]]]:
         if isinstance(containers, str):
             containers = (
@@ -210,6 +255,16 @@ def exec_command(
 
         broadcast = len(containers_list) > 1
 
+        if broadcast and not force_output_return and (parallel > 1 or not fail_fast):
+            self.broadcast_command(
+                containers_list,
+                user=user,
+                command=command,
+                parallel=parallel,
+                fail_fast=fail_fast,
+            )
+            return None
+
         # Important security note: never log the command command because it can
         # contain sensitive data, for example when used from change password command
         tty = not force_output_return and sys.stdout.isatty()
@@ -219,7 +274,7 @@ def exec_command(
                 if client.client_config.host:
                     log.info(
                         "Executing command on {}:{}",
-                        client.client_config.host,
+                        ssh.get_engine(client.client_config.host),
                         container[0],
                     )
                 elif broadcast:
@@ -256,31 +311,14 @@ def exec_command(
                         print(line.strip())
 
             except DockerException as e:
-                m = re.search(r"It returned with code (\d+)\n", str(e))
-                if not m:
+                code = self.get_exit_code(e)
+                if code is None:
                     log.debug("Catched exception does not contains any valid exit code")
                     raise e
 
-                exit_code = m.group(1)
-
-                # Based on docker exit codes https://github.com/moby/moby/pull/14012
-                # which follows standard chroot exit codes
-                # https://tldp.org/LDP/abs/html/exitcodes.html
-                if exit_code == "126":
-                    # rapydo shell backend "invalid"
-                    motivation = "command cannot be invoked"
-                elif exit_code == "127":
-                    # rapydo shell backend "bash invalid"
-                    motivation = "command not found"
-                elif exit_code == "130":  # pragma: no cover
-                    # container ctrl+c will executing (i.e. rapydo shell backend)
-                    motivation = "Control-C"
-                elif exit_code == "137":  # pragma: no cover
-                    # container restart will executing (i.e. rapydo shell backend)
-                    motivation = "SIGKILL"
-                elif exit_code == "143":  # pragma: no cover
-                    motivation = "SIGTERM"
-                else:  # pragma: no cover
+                exit_code = str(code)
+                motivation = self.get_exit_motivation(code)
+                if motivation is None:  # pragma: no cover
                     motivation = "an unknown cause"
                     exit_code = "1"
                     log.debug(str(e))
@@ -294,18 +332,139 @@ def exec_command(
 
         return None
 
+    @staticmethod
+    def get_exit_code(e: DockerException) -> Optional[int]:
+        m = re.search(r"It returned with code (\d+)\n", str(e))
+        if not m:
+            return None
+        return int(m.group(1))
+
+    @staticmethod
+    def get_exit_motivation(exit_code: int) -> Optional[str]:
+        # Based on docker exit codes https://github.com/moby/moby/pull/14012
+        # which follows standard chroot exit codes
+        # https://tldp.org/LDP/abs/html/exitcodes.html
+        if exit_code == 126:
+            # rapydo shell backend "invalid"
+            return "command cannot be invoked"
+        if exit_code == 127:
+            # rapydo shell backend "bash invalid"
+            return "command not found"
+        if exit_code == 130:  # pragma: no cover
+            # container ctrl+c will executing (i.e. rapydo shell backend)
+            return "Control-C"
+        if exit_code == 137:  # pragma: no cover
+            # container restart will executing (i.e. rapydo shell backend)
+            return "SIGKILL"
+        if exit_code == 143:  # pragma: no cover
+            return "SIGTERM"
+        return None
+
+    def broadcast_command(
+        self,
+        containers: list[tuple[str, str]],
+        user: Optional[str],
+        command: Optional[str],
+        parallel: int,
+        fail_fast: bool,
+    ) -> None:
+        """
+        Execute the command on up to parallel replicas at once, with the output
+        prefixed by the container name, and report the exit code of each replica.
+        With fail_fast the replicas not started yet are skipped after a failure
+        """
+        width = max(len(container[0]) for container in containers)
+        print_lock = threading.Lock()
+        failed = threading.Event()
+
+        # None if skipped
+        def execute(container: tuple[str, str]) -> Optional[int]:
+            if fail_fast and failed.is_set():
+                return None
+
+            client = self.connect_engine(container[1])
+            log.info(
+                "Executing command on {}{}",
+                (
+                    f"{ssh.get_engine(client.client_config.host)}:"
+                    if client.client_config.host
+                    else ""
+                ),
+                container[0],
+            )
+            prefix = f"{container[0]:{width}} | "
+            try:
+                output = client.container.execute(
+                    container[0],
+                    user=user,
+                    command=self.split_command(command),
+                    interactive=False,
+                    tty=False,
+                    stream=True,
+                    detach=False,
+                )
+                for _, out_line in cast(Iterable[tuple[str, bytes]], output or []):
+                    line = out_line.decode("UTF-8", errors="replace")
+                    with print_lock:
+                        for row in line.strip().splitlines():
+                            print(f"{prefix}{row}", flush=True)
+            except DockerException as e:
+                exit_code = self.get_exit_code(e)
+                if exit_code is None:
+                    raise e
+                failed.set()
+                return exit_code
+            return 0
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, parallel), thread_name_prefix="exec"
+        ) as pool:
+            futures = [pool.submit(execute, container) for container in containers]
+            exit_codes = [future.result() for future in futures]
+
+        rows: list[list[str]] = []
+        for container, exit_code in zip(containers, exit_codes):
+            if exit_code is None:
+                result = "[yellow]skipped[/yellow]"
+            elif exit_code == 0:
+                result = "[green]0[/green]"
+            else:
+                result = f"[red]{exit_code}[/red]"
+                if motivation := self.get_exit_motivation(exit_code):
+                    result += f" ({motivation})"
+            rows.append([container[0], container[1], result])
+
+        print("")
+        print_table(["Container", "Node", "Exit code"], rows, table_title="Summary")
+
+        errors = [code for code in exit_codes if code]
+        if errors:
+            log.error(
+                "The command failed on {} of {} replicas",
+                len(errors),
+                len(containers),
+            )
+            sys.exit(errors[0])
+
     def status(self, services: list[str]) -> None:
         if Configuration.swarm_mode:
             return self.swarm.status(services)
         else:
             return self.compose.status(services)
 
+    def watch(self, services: list[str]) -> None:
+        if Configuration.swarm_mode:
+            return self.swarm.watch(services)
+        else:
+            return self.compose.watch(services)
+
     def remove(self, service: str) -> None:
         if Configuration.swarm_mode:
             service_name = Docker.get_service(service)
             self.client.service.scale({service_name: 0}, detach=False)
         else:
             self.client.compose.rm([service], stop=True, volumes=False)
+        self.invalidate_snapshots()
 
     def start(self, service: str) -> None:
         if Configuration.swarm_mode:
@@ -0,0 +1,508 @@
+"""
+Backends used by the Docker wrapper to query the Docker Engine
+
+CLIEngine executes the docker CLI (through python_on_whales) and collects
+multiple objects with a single bulk inspect, instead of an inspect per object.
+APIEngine talks to the Engine API directly over the Unix socket (or tcp),
+reusing persistent HTTP connections shared by all the Docker wrappers.
+
+The backend is selected with RAPYDO_DOCKER_BACKEND=cli|api (cli by default).
+Only read-only queries are implemented here, any other operation is still executed
+with python_on_whales. Hosts not reachable by the API (e.g. tls-enabled engines or
+ssh:// hosts not multiplexed by controller/deploy/ssh.py) always use the CLI backend
+"""
+
+import http.client
+import json
+import os
+import re
+import socket
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Optional, Union
+from urllib.parse import quote, urlencode, urlparse
+
+from python_on_whales import DockerClient
+from python_on_whales.exceptions import NoSuchContainer, NoSuchImage, NoSuchService
+from python_on_whales.utils import DockerException, run
+
+from controller import DOCKER_BACKEND, log, print_and_exit
+from controller.utilities import profiler
+
+CLI_BACKEND = "cli"
+API_BACKEND = "api"
+BACKENDS = [CLI_BACKEND, API_BACKEND]
+
+DEFAULT_HOST = "unix:///var/run/docker.sock"
+# Idle connections kept open by each API engine
+MAX_IDLE_CONNECTIONS = 4
+API_TIMEOUT = 60
+# Attempts to list the containers while some of them are being removed
+LIST_RETRIES = 3
+
+TIMESTAMP_REGEXP = re.compile(r"^(.*T\d\d:\d\d:\d\d)(\.\d+)?(Z|[+-]\d\d:\d\d)?$")
+
+# Labels set by docker compose on the containers
+COMPOSE_PROJECT_LABEL = "com.docker.compose.project"
+COMPOSE_SERVICE_LABEL = "com.docker.compose.service"
+COMPOSE_NUMBER_LABEL = "com.docker.compose.container-number"
+COMPOSE_ONEOFF_LABEL = "com.docker.compose.oneoff"
+# Label set by docker stack deploy on services and tasks
+STACK_NAMESPACE_LABEL = "com.docker.stack.namespace"
+
+# Containers listed by docker ps, i.e. without --all
+ACTIVE_STATES = ("running", "paused", "restarting")
+
+# Health reported in the status of listed containers, e.g. Up 3 minutes (healthy)
+HEALTH_REGEXP = re.compile(r"\((healthy|unhealthy|health: starting)\)")
+
+# Port mapping as container port -> host port
+PortMapping = tuple[str, str]
+
+
+def parse_timestamp(value: Optional[Union[str, int]]) -> datetime:
+    """
+    Parse timestamps returned by the Engine, both as epoch and RFC 3339 with
+    nanoseconds (not supported by datetime.fromisoformat before python 3.11)
+    """
+    if isinstance(value, int):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+
+    match = TIMESTAMP_REGEXP.match(value or "")
+    if not match:
+        return datetime.fromtimestamp(0, tz=timezone.utc)
+
+    base, fraction, tz = match.groups()
+    # microseconds, the maximum precision of datetime
+    fraction = (fraction or ".")[1:7].ljust(6, "0")
+    if not tz or tz == "Z":
+        tz = "+00:00"
+    return datetime.fromisoformat(f"{base}.{fraction}{tz}")
+
+
+@dataclass
+class ContainerInfo:
+    id: str
+    name: str
+    status: str
+    image: str
+    created: datetime
+    labels: dict[str, str] = field(default_factory=dict)
+    ports: list[PortMapping] = field(default_factory=list)
+    # healthy, unhealthy or starting, None without healthcheck
+    health: Optional[str] = None
+
+    @property
+    def service(self) -> Optional[str]:
+        return self.labels.get(COMPOSE_SERVICE_LABEL)
+
+    @property
+    def oneoff(self) -> bool:
+        # Containers created by compose run
+        return self.labels.get(COMPOSE_ONEOFF_LABEL) == "True"
+
+    @property
+    def slot(self) -> Optional[int]:
+        number = self.labels.get(COMPOSE_NUMBER_LABEL)
+        return int(number) if number and number.isdigit() else None
+
+    @staticmethod
+    def from_inspect(data: dict[str, Any]) -> "ContainerInfo":
+        # docker container inspect / GET /containers/{id}/json
+        config = data.get("Config") or {}
+        ports: list[PortMapping] = []
+        network_ports = (data.get("NetworkSettings") or {}).get("Ports") or {}
+        for container_port, host_ports in network_ports.items():
+            if host_ports:
+                mapping = (container_port.split("/")[0], host_ports[0]["HostPort"])
+                if mapping not in ports:
+                    ports.append(mapping)
+
+        state = data.get("State") or {}
+        return ContainerInfo(
+            id=data["Id"],
+            name=data["Name"].lstrip("/"),
+            status=state.get("Status") or "N/A",
+            image=config.get("Image") or "N/A",
+            created=parse_timestamp(data.get("Created")),
+            labels=config.get("Labels") or {},
+            ports=ports,
+            health=(state.get("Health") or {}).get("Status"),
+        )
+
+    @staticmethod
+    def from_list(data: dict[str, Any]) -> "ContainerInfo":
+        # GET /containers/json
+        ports: list[PortMapping] = []
+        for port in data.get("Ports") or []:
+            if port.get("PublicPort"):
+                mapping = (str(port["PrivatePort"]), str(port["PublicPort"]))
+                if mapping not in ports:
+                    ports.append(mapping)
+
+        health = HEALTH_REGEXP.search(data.get("Status") or "")
+        return ContainerInfo(
+            id=data["Id"],
+            name=data["Names"][0].lstrip("/"),
+            status=data.get("State") or "N/A",
+            image=data.get("Image") or "N/A",
+            created=parse_timestamp(data.get("Created")),
+            labels=data.get("Labels") or {},
+            ports=ports,
+            health=health.group(1).replace("health: ", "") if health else None,
+        )
+
+
+@dataclass
+class TaskInfo:
+    id: str
+    # None for services in global mode
+    slot: Optional[int]
+    node_id: str
+    state: str
+    service_id: str = ""
+    desired_state: str = ""
+    error: str = ""
+    timestamp: Optional[datetime] = None
+    created: Optional[datetime] = None
+    labels: dict[str, str] = field(default_factory=dict)
+
+    @staticmethod
+    def from_inspect(data: dict[str, Any]) -> "TaskInfo":
+        # docker inspect --type task / GET /tasks
+        status = data.get("Status") or {}
+        timestamp = status.get("Timestamp")
+        created = data.get("CreatedAt")
+        return TaskInfo(
+            id=data["ID"],
+            slot=data.get("Slot"),
+            node_id=data.get("NodeID") or "",
+            state=status.get("State") or "N/A",
+            service_id=data.get("ServiceID") or "",
+            desired_state=data.get("DesiredState") or "",
+            error=status.get("Err") or "",
+            timestamp=parse_timestamp(timestamp) if timestamp else None,
+            created=parse_timestamp(created) if created else None,
+            labels=data.get("Labels") or {},
+        )
+
+
+def get_label_filters(labels: Optional[dict[str, str]]) -> list[str]:
+    return [f"{key}={value}" for key, value in (labels or {}).items()]
+
+
+class Engine(ABC):
+    """
+    Queries needed by the Docker wrapper, implemented by each backend
+    """
+
+    name = ""
+
+    @abstractmethod
+    def list_containers(
+        self, all: bool = False, labels: Optional[dict[str, str]] = None
+    ) -> list[ContainerInfo]:
+        """
+        Containers (only the running ones, unless all) filtered by the engine
+        on the given labels
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_container(self, container: str) -> Optional[ContainerInfo]:
+        """
+        Container by name or id, None if not found
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_container_status(self, container: str) -> Optional[str]:
+        """
+        Status of the container, None if not found
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_tasks(self, service: str) -> list[TaskInfo]:
+        """
+        Tasks of the service (including the terminated ones), empty if not found
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_stack_tasks(self, stack: str) -> list[TaskInfo]:
+        """
+        Tasks of all the services of the stack with a single query,
+        empty if the stack is not deployed
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_node_address(self, node_id: str) -> str:
+        raise NotImplementedError
+
+    def image_exists(self, image: str) -> bool:
+        return self.get_image_creation(image) is not None
+
+    @abstractmethod
+    def get_image_creation(self, image: str) -> Optional[datetime]:
+        """
+        Creation date of the image, None if not found
+        """
+        raise NotImplementedError
+
+
+class CLIEngine(Engine):
+    name = CLI_BACKEND
+
+    def __init__(self, client: DockerClient) -> None:
+        self.client = client
+
+    def inspect(self, *args: str) -> list[dict[str, Any]]:
+        # A single docker inspect for all the objects
+        output = run([*self.client.client_config.docker_cmd, *args])
+        result: list[dict[str, Any]] = json.loads(str(output) or "[]")
+        return result
+
+    def list_containers(
+        self, all: bool = False, labels: Optional[dict[str, str]] = None
+    ) -> list[ContainerInfo]:
+        cmd = [*self.client.client_config.docker_cmd, "container", "list"]
+        cmd += ["--quiet", "--no-trunc"]
+        if all:
+            cmd.append("--all")
+        for label in get_label_filters(labels):
+            cmd += ["--filter", f"label={label}"]
+        for _ in range(LIST_RETRIES):
+            ids = str(run(cmd)).split()
+            if not ids:
+                return []
+            try:
+                containers = self.inspect("container", "inspect", *ids)
+                return [ContainerInfo.from_inspect(c) for c in containers]
+            except NoSuchContainer:  # pragma: no cover
+                # Removed in the meantime, listed again
+                log.debug("A listed container was removed, retrying")
+
+        # Still changing, the containers removed in the meantime are skipped
+        return [c for i in ids if (c := self.get_container(i))]  # pragma: no cover
+
+    def get_container(self, container: str) -> Optional[ContainerInfo]:
+        try:
+            containers = self.inspect("container", "inspect", container)
+        except NoSuchContainer:
+            return None
+        return ContainerInfo.from_inspect(containers[0]) if containers else None
+
+    def get_container_status(self, container: str) -> Optional[str]:
+        try:
+            return str(self.client.container.inspect(container).state.status)
+        except NoSuchContainer:
+            return None
+
+    def get_tasks(self, service: str) -> list[TaskInfo]:
+        cmd = [*self.client.client_config.docker_cmd, "service", "ps"]
+        cmd += ["--quiet", "--no-trunc", service]
+        try:
+            ids = str(run(cmd)).split()
+            if not ids:
+                return []
+            tasks = self.inspect("inspect", "--type", "task", *ids)
+        except (NoSuchService, NoSuchContainer):
+            return []
+        return [TaskInfo.from_inspect(t) for t in tasks]
+
+    def list_stack_tasks(self, stack: str) -> list[TaskInfo]:
+        cmd = [*self.client.client_config.docker_cmd, "stack", "ps"]
+        cmd += ["--quiet", "--no-trunc", stack]
+        try:
+            ids = str(run(cmd)).split()
+            if not ids:
+                return []
+            tasks = self.inspect("inspect", "--type", "task", *ids)
+        except DockerException:
+            # nothing found in stack
+            return []
+        return [TaskInfo.from_inspect(t) for t in tasks]
+
+    def get_node_address(self, node_id: str) -> str:
+        return str(self.client.node.inspect(node_id).status.addr)
+
+    def image_exists(self, image: str) -> bool:
+        return self.client.image.exists(image)
+
+    def get_image_creation(self, image: str) -> Optional[datetime]:
+        try:
+            return self.client.image.inspect(image).created
+        except NoSuchImage:
+            return None
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class APIEngine(Engine):
+    name = API_BACKEND
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        url = urlparse(host)
+        self.scheme = url.scheme
+        self.address = url.path if url.scheme == "unix" else url.netloc
+        self.idle_connections: list[http.client.HTTPConnection] = []
+        self.lock = threading.Lock()
+
+    def connect(self) -> http.client.HTTPConnection:
+        with self.lock:
+            if self.idle_connections:
+                return self.idle_connections.pop()
+
+        if self.scheme == "unix":
+            return UnixHTTPConnection(self.address, timeout=API_TIMEOUT)
+        return http.client.HTTPConnection(self.address, timeout=API_TIMEOUT)
+
+    def release(self, conn: http.client.HTTPConnection) -> None:
+        with self.lock:
+            if len(self.idle_connections) < MAX_IDLE_CONNECTIONS:
+                self.idle_connections.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self.lock:
+            while self.idle_connections:
+                self.idle_connections.pop().close()
+
+    def get(self, path: str, **params: Any) -> Any:
+        """
+        Send a GET request and return the decoded response, None if not found
+        """
+        url = path
+        if params:
+            url += f"?{urlencode(params)}"
+
+        status, body = self.request(url)
+
+        if status == 404:
+            return None
+
+        if status >= 400:
+            raise DockerException(["GET", url], status, stderr=body)
+
+        return json.loads(body) if body else None
+
+    def request(self, url: str) -> tuple[int, bytes]:
+        # An idle connection could have been closed by the engine: retry once
+        retry = True
+        while True:
+            conn = self.connect()
+            try:
+                with profiler.span(f"GET {self.host}{url}", profiler.HTTP):
+                    conn.request("GET", url)
+                    response = conn.getresponse()
+                    body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if retry:
+                    retry = False
+                    continue
+                raise DockerException(["GET", url], 1, stderr=str(e).encode())
+
+            self.release(conn)
+            return response.status, body
+
+    def list_containers(
+        self, all: bool = False, labels: Optional[dict[str, str]] = None
+    ) -> list[ContainerInfo]:
+        filters = json.dumps({"label": get_label_filters(labels)})
+        containers = self.get("/containers/json", all=int(all), filters=filters) or []
+        return [ContainerInfo.from_list(c) for c in containers]
+
+    def get_container(self, container: str) -> Optional[ContainerInfo]:
+        data = self.get(f"/containers/{quote(container, safe='')}/json")
+        if data is None:
+            return None
+        return ContainerInfo.from_inspect(data)
+
+    def get_container_status(self, container: str) -> Optional[str]:
+        data = self.get(f"/containers/{quote(container, safe='')}/json")
+        if data is None:
+            return None
+        return str(data["State"]["Status"])
+
+    def get_tasks(self, service: str) -> list[TaskInfo]:
+        # the service filter matches both names and ids
+        filters = json.dumps({"service": [service]})
+        tasks = self.get("/tasks", filters=filters) or []
+        return [TaskInfo.from_inspect(t) for t in tasks]
+
+    def list_stack_tasks(self, stack: str) -> list[TaskInfo]:
+        # Same filter used by docker stack ps
+        labels = get_label_filters({STACK_NAMESPACE_LABEL: stack})
+        tasks = self.get("/tasks", filters=json.dumps({"label": labels})) or []
+        return [TaskInfo.from_inspect(t) for t in tasks]
+
+    def get_node_address(self, node_id: str) -> str:
+        node = self.get(f"/nodes/{quote(node_id, safe='')}")
+        if node is None:
+            raise DockerException(["GET", f"/nodes/{node_id}"], 404)
+        return str(node["Status"]["Addr"])
+
+    def get_image_creation(self, image: str) -> Optional[datetime]:
+        data = self.get(f"/images/{quote(image, safe='/:@')}/json")
+        if data is None:
+            return None
+        return parse_timestamp(data.get("Created"))
+
+
+# API engines are shared by all the Docker wrappers, to reuse their connections
+API_ENGINES: dict[str, APIEngine] = {}
+
+
+def get_api_host(client: DockerClient) -> Optional[str]:
+    """
+    The Engine address, if reachable by the API backend
+    """
+    if os.getenv("DOCKER_CONTEXT") or os.getenv("DOCKER_TLS_VERIFY"):
+        return None
+
+    host = client.client_config.host or os.getenv("DOCKER_HOST") or DEFAULT_HOST
+    if not host.startswith(("unix://", "tcp://")):
+        return None
+    return host
+
+
+def create_engine(client: DockerClient) -> Engine:
+    if DOCKER_BACKEND not in BACKENDS:
+        print_and_exit(
+            "Invalid RAPYDO_DOCKER_BACKEND {}, expected one of: {}",
+            DOCKER_BACKEND,
+            ", ".join(BACKENDS),
+        )
+
+    if DOCKER_BACKEND == API_BACKEND:
+        host = get_api_host(client)
+        if host:
+            if host not in API_ENGINES:
+                API_ENGINES[host] = APIEngine(host)
+            return API_ENGINES[host]
+        log.debug(
+            "Docker API backend not available for {}, using the CLI",
+            client.client_config.host,
+        )
+    return CLIEngine(client)
@@ -0,0 +1,352 @@
+"""
+Wait for the services to converge, driven by the events of the Docker engine
+
+Instead of polling the engine at fixed intervals, the state of the services is
+verified again only when the engine reports a change of containers or services
+(docker events), with a single query for all the services. Tasks executed on other
+swarm nodes don't send events to the manager, so the state is also verified when
+no event is received for WAKE_UP_INTERVAL seconds.
+
+A service is converged when all its desired replicas are running and healthy:
+in swarm mode tasks are running only after passing the healthcheck, in compose mode
+the health of the containers is verified
+"""
+
+import json
+import queue
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any, Optional
+
+from python_on_whales.utils import DockerException
+
+from controller import log
+from controller.app import Configuration
+from controller.deploy.docker import Docker
+from controller.utilities.tables import print_table
+
+# Seconds between two verifications when no event is received
+WAKE_UP_INTERVAL = 5.0
+# Events received in a short time are collapsed in a single verification
+DEBOUNCE_INTERVAL = 0.2
+DEFAULT_TIMEOUT = 120
+
+EVENT_TYPES = ["container", "service"]
+# Consecutive restarts of docker events before falling back to polling
+MAX_RESTARTS = 3
+# Seconds waited before restarting docker events
+RESTART_DELAY = 1.0
+
+# Seconds between two checks for new events with --watch (the state is only verified
+# again when an event is received, except for tasks executed on other swarm nodes)
+WATCH_INTERVAL = 1.0
+# Seconds between two verifications of the swarm tasks with --watch
+SWARM_WATCH_INTERVAL = 30.0
+# Actions of the containers that change their status
+WATCHED_ACTIONS = {
+    "create",
+    "destroy",
+    "die",
+    "health_status",
+    "kill",
+    "oom",
+    "pause",
+    "rename",
+    "restart",
+    "start",
+    "stop",
+    "unpause",
+    "update",
+}
+
+
+@dataclass
+class ServiceState:
+    # None if the service does not exist (yet)
+    desired: Optional[int] = None
+    running: int = 0
+    # updates of swarm services are completed only when the new tasks are running
+    updating: bool = False
+
+    @property
+    def converged(self) -> bool:
+        if self.desired is None or self.updating:
+            return False
+        return self.running == self.desired
+
+    def __str__(self) -> str:
+        desired = "N/A" if self.desired is None else self.desired
+        return f"{self.running}/{desired}"
+
+
+class EventsStream:
+    """
+    Events of the engine, read in background from docker events.
+    If docker events exits it is restarted, replaying the events since the last
+    one received. After MAX_RESTARTS consecutive failures the stream is no longer
+    alive and the callers have to fall back to polling
+    """
+
+    def __init__(self, docker: Docker, types: Optional[list[str]] = None) -> None:
+        cmd = [*docker.client.client_config.docker_cmd, "events"]
+        cmd += ["--format", "{{json .}}"]
+        for event_type in types or EVENT_TYPES:
+            cmd += ["--filter", f"type={event_type}"]
+        self.cmd = [str(c) for c in cmd]
+
+        self.events: "queue.Queue[dict[str, Any]]" = queue.Queue()
+        self.process: Optional["subprocess.Popen[str]"] = None
+        self.closed = threading.Event()
+        # engine time of the last event received, as accepted by --since
+        self.since: Optional[str] = None
+
+        if self.start():
+            threading.Thread(target=self.read, daemon=True).start()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None
+
+    def start(self) -> bool:
+        cmd = self.cmd if not self.since else [*self.cmd, "--since", self.since]
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+        except OSError as e:  # pragma: no cover
+            log.warning("Can't read the events of the engine: {}", e)
+            self.process = None
+            return False
+        # Closed while restarting, close() could have missed the new process
+        if self.closed.is_set():  # pragma: no cover
+            self.process.terminate()
+        return True
+
+    def read(self) -> None:
+        restarts = 0
+        while (process := self.process) and process.stdout:
+            for line in process.stdout:
+                try:
+                    event = json.loads(line)
+                except ValueError:  # pragma: no cover
+                    log.debug("Invalid event: {}", line)
+                    continue
+                if isinstance(event, dict):
+                    nano = int(event.get("timeNano") or 0)
+                    since = f"{nano // 10**9}.{nano % 10**9:09d}"
+                    # the last event is received again once restarted
+                    if nano and since != self.since:
+                        self.since = since
+                        restarts = 0
+                    self.events.put(event)
+
+            # End of the stream, expected only when closed
+            if self.closed.is_set():
+                return
+
+            exit_code = process.wait()
+            if restarts >= MAX_RESTARTS:
+                log.warning(
+                    "docker events exited with code {}, falling back to polling",
+                    exit_code,
+                )
+                self.process = None
+                return
+
+            restarts += 1
+            log.warning("docker events exited with code {}, restarting", exit_code)
+            if self.closed.wait(RESTART_DELAY) or not self.start():
+                return
+
+    def wait(self, timeout: float) -> list[dict[str, Any]]:
+        """
+        Wait for the next events (at most timeout seconds), empty on timeout
+        """
+        try:
+            events = [self.events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        time.sleep(DEBOUNCE_INTERVAL)
+        while not self.events.empty():
+            events.append(self.events.get_nowait())
+
+        for event in events:
+            log.debug("Received event: {} {}", event.get("Type"), event.get("Action"))
+        return events
+
+    def close(self) -> None:
+        self.closed.set()
+        if process := self.process:
+            process.terminate()
+            process.wait()
+            self.process = None
+
+    def __enter__(self) -> "EventsStream":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def get_swarm_states(
+    docker: Docker, services: list[str], restarted: bool = False
+) -> dict[str, ServiceState]:
+    """
+    State of the swarm services. When restarted, only tasks created after the
+    last update of the service are counted: right after an update the service
+    could be not yet reported as updating, while the old tasks are still running
+    """
+    states = {service: ServiceState() for service in services}
+    stack_services, stack_tasks, _ = docker.swarm.get_stack_status()
+
+    prefix = f"{Configuration.project}_"
+    for stack_service in stack_services:
+        name = stack_service.spec.name or ""
+        # to be replaced with removeprefix
+        service = name[len(prefix) :]
+        if service not in states:
+            continue
+
+        tasks = [t for t in stack_tasks.get(name, []) if t.desired_state == "running"]
+        running = [t for t in tasks if t.state == "running"]
+        # Both timestamps are set by the swarm manager
+        if restarted and (updated_at := stack_service.updated_at):
+            running = [t for t in running if t.created and t.created >= updated_at]
+        mode = stack_service.spec.mode or {}
+        states[service] = ServiceState(
+            # Global services have a task for each eligible node
+            desired=(
+                len(tasks)
+                if "Global" in mode
+                else docker.swarm.get_replicas(stack_service)
+            ),
+            running=len(running),
+            updating=bool(
+                stack_service.update_status
+                and stack_service.update_status.state
+                in ("updating", "rollback_started")
+            ),
+        )
+    return states
+
+
+def get_compose_states(docker: Docker, services: list[str]) -> dict[str, ServiceState]:
+    # Containers are already created by compose, services without containers
+    # are scaled to zero
+    states = {service: ServiceState(desired=0) for service in services}
+
+    docker.invalidate_snapshots()
+    for container in docker.get_project_containers(all=True):
+        state = states.get(container.service or "")
+        if not state:
+            continue
+
+        state.desired = (state.desired or 0) + 1
+        if container.status == "running" and container.health in (None, "healthy"):
+            state.running += 1
+    return states
+
+
+def get_states(
+    docker: Docker, services: list[str], restarted: bool = False
+) -> dict[str, ServiceState]:
+    try:
+        if Configuration.swarm_mode:
+            return get_swarm_states(docker, services, restarted=restarted)
+        return get_compose_states(docker, services)
+    # Can happens when the stack is near to be deployed
+    except DockerException as e:  # pragma: no cover
+        log.debug("Can't verify the services: {}", e)
+        return {service: ServiceState() for service in services}
+
+
+def wait_convergence(
+    docker: Docker,
+    services: list[str],
+    timeout: int = DEFAULT_TIMEOUT,
+    restarted: bool = False,
+) -> tuple[dict[str, float], dict[str, ServiceState]]:
+    """
+    Wait for all the services to converge, at most timeout seconds.
+    Restarted services converge only once their new tasks are running.
+    Return the convergence time of the converged services and the last
+    state of all the services
+    """
+    start_time = time.monotonic()
+    convergence: dict[str, float] = {}
+
+    with EventsStream(docker) as events:
+        while True:
+            states = get_states(docker, services, restarted=restarted)
+            elapsed = time.monotonic() - start_time
+            for service, state in states.items():
+                if state.converged and service not in convergence:
+                    convergence[service] = elapsed
+                    log.info("{} converged in {:.1f}s", service, elapsed)
+
+            if len(convergence) == len(services):
+                break
+
+            if elapsed >= timeout:
+                break
+
+            events.wait(min(WAKE_UP_INTERVAL, timeout - elapsed))
+
+    return convergence, states
+
+
+def wait_services(
+    docker: Docker, services: list[str], timeout: int = DEFAULT_TIMEOUT
+) -> bool:
+    """
+    Wait for all the services to converge, at most timeout seconds.
+    The convergence time of each service is reported at the end
+    """
+    log.info("Waiting for services to converge (timeout {}s)...", timeout)
+    convergence, states = wait_convergence(docker, services, timeout)
+
+    rows: list[list[str]] = []
+    for service in services:
+        if service in convergence:
+            result = f"[green]{convergence[service]:.1f}s[/green]"
+        else:
+            result = "[red]not converged[/red]"
+        rows.append([service, str(states[service]), result])
+    print_table(["Service", "Replicas", "Converged in"], rows, table_title="Services")
+
+    return len(convergence) == len(services)
+
+
+def wait_stack_deploy(docker: Docker, timeout: int = 60) -> None:
+    """
+    Wait until the stack has at least a running service
+    """
+    start_time = time.monotonic()
+    with EventsStream(docker) as events:
+        while True:
+            try:
+                if docker.get_running_services():
+                    return
+            # Can happens when the stack is near to be deployed
+            except DockerException:  # pragma: no cover
+                pass
+
+            elapsed = time.monotonic() - start_time
+            if elapsed >= timeout:  # pragma: no cover
+                return
+
+            log.info("Stack is still starting, waiting... [{:.0f}s]", elapsed)
+            events.wait(min(WAKE_UP_INTERVAL, timeout - elapsed))
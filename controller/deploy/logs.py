@@ -0,0 +1,491 @@
+"""
+Logs of the services, read in background and filtered before being printed
+
+A reader thread for each stream (one per service in swarm mode, a single stream
+merged by docker compose in compose mode) sends the lines into a single bounded
+queue: when the output can't keep up with the services, the readers block and
+stop consuming their streams. Lines of different streams are printed in timestamp
+order, a line is held back until all the streams have a line to be compared with,
+or at most MERGE_DELAY seconds.
+
+Time windows are applied by the engine (--until is not supported by docker service
+logs and is applied here in swarm mode), --grep and --level are applied to the
+received lines. When following, the logs are closed once --until is passed. The output is buffered and written when no more lines are ready.
+
+In swarm mode replicas started by scaling or by updates are included by the engine
+in the logs of the service. When following, the logs of a service removed (or not
+yet created) are waited for and resumed from the last received line.
+"""
+
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from functools import partial
+from typing import Callable, Optional, Union
+
+from python_on_whales.exceptions import NoSuchService
+from python_on_whales.utils import DockerException
+
+from controller import colors, log, print_and_exit
+from controller.app import Configuration
+from controller.deploy.docker import Docker
+
+# Max number of lines received and not yet printed
+QUEUE_SIZE = 1000
+# Max seconds a line is held back, waiting for older lines of other services
+MERGE_DELAY = 0.5
+# Seconds between two attempts to follow a service removed or not yet created
+RECONNECT_INTERVAL = 2.0
+# Max number of characters buffered before being written
+BUFFER_SIZE = 65536
+
+PREFIX_COLORS = [
+    colors.CYAN,
+    colors.YELLOW,
+    colors.GREEN,
+    colors.MAGENTA,
+    colors.BLUE,
+    colors.LIGHTCYAN_EX,
+    colors.LIGHTYELLOW_EX,
+    colors.LIGHTGREEN_EX,
+    colors.LIGHTMAGENTA_EX,
+    colors.LIGHTBLUE_EX,
+]
+
+# 2024-01-02T03:04:05.123456789Z project_service.1@node    | message
+SWARM_LINE_REGEXP = re.compile(
+    r"^(?P<timestamp>\S+) (?P<task>[^|]*?)\s*\| ?(?P<message>.*)$"
+)
+# service-1  | 2024-01-02T03:04:05.123456789Z message
+COMPOSE_LINE_REGEXP = re.compile(
+    r"^(?P<task>[^|\s]+)\s*\| (?P<timestamp>\S+) ?(?P<message>.*)$"
+)
+# 2024-01-02 03:04:05,678 INFO     message
+# 2024-01-02 03:04:05,678 [INFO module:123] message
+LEVEL_REGEXP = re.compile(
+    r"^\S+ \S+ \[?(?P<level>TRACE|DEBUG|INFO|SUCCESS|WARNING|ERROR|CRITICAL)\b"
+)
+# 42m, 1h30m, 10s
+DURATION_REGEXP = re.compile(r"^(?:(?P<h>\d+)h)?(?:(?P<m>\d+)m)?(?:(?P<s>\d+)s)?$")
+
+
+class LogLevels(str, Enum):
+    TRACE = "TRACE"
+    DEBUG = "DEBUG"
+    INFO = "INFO"
+    SUCCESS = "SUCCESS"
+    WARNING = "WARNING"
+    ERROR = "ERROR"
+    CRITICAL = "CRITICAL"
+
+
+@dataclass
+class LogLine:
+    service: str
+    # service.slot (or service-index in compose mode)
+    task: str
+    timestamp: str
+    message: str
+    # monotonic time of reception
+    received: float = 0.0
+
+    @property
+    def key(self) -> str:
+        return get_timestamp_key(self.timestamp)
+
+
+def get_timestamp_key(timestamp: str) -> str:
+    """
+    Sortable representation of a RFC3339 timestamp in UTC, as given by the engine
+    (trailing zeros of the fractional seconds are omitted, e.g. .5Z and .25Z)
+    """
+    seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+    return f"{seconds}.{fraction.ljust(9, '0')}"
+
+
+def get_datetime(timestamp: str) -> datetime:
+    # seconds resolution, lines already received are skipped by timestamp key
+    return datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S").replace(
+        tzinfo=timezone.utc
+    )
+
+
+def format_datetime(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_local_datetime(value: datetime) -> datetime:
+    # naive datetimes are sent to the engine as local times
+    return value.astimezone().replace(tzinfo=None)
+
+
+def get_time_bound(value: str) -> Optional[datetime]:
+    """
+    Time of a --since/--until value, given as a timestamp (e.g. 2024-01-02T13:23:37,
+    in local time unless a timezone is given) or relative to now (e.g. 42m, 1h30m).
+    None if the value is not valid
+    """
+    if value and (m := DURATION_REGEXP.match(value)):
+        delta = timedelta(
+            hours=int(m.group("h") or 0),
+            minutes=int(m.group("m") or 0),
+            seconds=int(m.group("s") or 0),
+        )
+        return datetime.now(timezone.utc) - delta
+
+    try:
+        # fromisoformat only supports the Z suffix since python 3.11
+        bound = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+    # naive datetimes are in local time
+    return bound.astimezone(timezone.utc)
+
+
+def get_time_option(option: str, value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+
+    if not (bound := get_time_bound(value)):
+        print_and_exit(
+            "Invalid {} value: {}, expected a timestamp (e.g. 2024-01-02T13:23:37) "
+            "or a relative time (e.g. 42m)",
+            option,
+            value,
+        )
+    return bound
+
+
+def get_grep_pattern(value: Optional[str]) -> Optional["re.Pattern[str]"]:
+    if value is None:
+        return None
+
+    try:
+        return re.compile(value)
+    except re.error as e:
+        print_and_exit("Invalid --grep pattern {}: {}", value, str(e))
+
+
+def get_compose_task(prefix: str, project: str) -> str:
+    # service-1 or project-service-1, depending on the version of compose
+    # to be replaced with removeprefix
+    if prefix.startswith(f"{project}-"):
+        return prefix[len(project) + 1 :]
+    return prefix
+
+
+def parse_line(
+    service: str, line: Union[str, bytes], project: str
+) -> Optional[LogLine]:
+    """
+    Parse a line of docker service logs (with timestamps)
+    """
+    if isinstance(line, bytes):
+        line = line.decode("UTF-8", errors="replace")
+
+    if not (m := SWARM_LINE_REGEXP.match(line.rstrip("\r\n"))):
+        return None
+
+    # to be replaced with removeprefix
+    task = m.group("task").split("@")[0]
+    prefix = f"{project}_"
+    if task.startswith(prefix):
+        task = task[len(prefix) :]
+    return LogLine(
+        service=service,
+        task=task,
+        timestamp=m.group("timestamp"),
+        message=m.group("message"),
+    )
+
+
+def parse_compose_line(line: Union[str, bytes], project: str) -> LogLine:
+    """
+    Parse a line of docker compose logs (with timestamps and prefixes).
+    Unknown lines are returned as they are
+    """
+    if isinstance(line, bytes):
+        line = line.decode("UTF-8", errors="replace")
+    line = line.rstrip("\r\n")
+
+    if not (m := COMPOSE_LINE_REGEXP.match(line)):
+        return LogLine(service="", task="", timestamp="", message=line)
+
+    task = get_compose_task(m.group("task"), project)
+    return LogLine(
+        service=re.sub(r"-\d+$", "", task),
+        task=task,
+        timestamp=m.group("timestamp"),
+        message=m.group("message"),
+    )
+
+
+class LogsWriter:
+    """
+    Filter the log lines and write them to stdout, buffered
+    """
+
+    def __init__(
+        self,
+        services: list[str],
+        timestamps: list[str],
+        json_output: bool = False,
+        grep: Optional["re.Pattern[str]"] = None,
+        level: Optional[LogLevels] = None,
+    ) -> None:
+        # services with timestamps included in the printed lines
+        self.timestamps = timestamps
+        self.json_output = json_output
+        self.grep = grep
+        self.min_level = log.level(level.value).no if level else None
+
+        # lines are prefixed with the task only when showing multiple services
+        self.prefixed = len(services) > 1
+        # room for the slot of the replicas
+        self.width = max(len(s) for s in services) + 3 if services else 0
+        self.colors = {
+            s: PREFIX_COLORS[i % len(PREFIX_COLORS)] for i, s in enumerate(services)
+        }
+
+        # Lines without a level (e.g. tracebacks) inherit the level
+        # of the previous line of the same task
+        self.levels: dict[str, str] = {}
+        self.buffer: list[str] = []
+        self.size = 0
+
+    def get_level(self, line: LogLine) -> Optional[str]:
+        if m := LEVEL_REGEXP.match(line.message):
+            self.levels[line.task] = m.group("level")
+        return self.levels.get(line.task)
+
+    def format(self, line: LogLine, level: Optional[str]) -> str:
+        if self.json_output:
+            return json.dumps(
+                {
+                    "service": line.service,
+                    "task": line.task,
+                    "timestamp": line.timestamp,
+                    "level": level,
+                    "message": line.message,
+                }
+            )
+
+        output = ""
+        # unknown lines are written as they are
+        if self.prefixed and line.task:
+            prefix = line.task.ljust(self.width)
+            color = self.colors.get(line.service, "")
+            output = f"{color}{prefix}{colors.RESET if color else ''} | "
+        if line.service in self.timestamps and line.timestamp:
+            output += f"{line.timestamp} "
+        return f"{output}{line.message}"
+
+    def write(self, line: LogLine) -> None:
+        level = self.get_level(line)
+
+        if self.min_level is not None:
+            if not level or log.level(level).no < self.min_level:
+                return
+
+        if self.grep and not self.grep.search(line.message):
+            return
+
+        text = f"{self.format(line, level)}\n"
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            sys.stdout.write("".join(self.buffer))
+            sys.stdout.flush()
+            self.buffer.clear()
+            self.size = 0
+
+
+class LogsMultiplexer:
+    def __init__(
+        self,
+        docker: Docker,
+        writer: LogsWriter,
+        follow: bool,
+        tail: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> None:
+        self.docker = docker
+        self.writer = writer
+        self.follow = follow
+        self.tail = tail
+        self.since = since
+        self.until = until
+
+        # (stream, line), or (stream, None) when the stream has no more lines
+        self.queue: "queue.Queue[tuple[str, Optional[LogLine]]]" = queue.Queue(
+            QUEUE_SIZE
+        )
+        self.stopped = threading.Event()
+        # Services not found, when not following
+        self.missing: list[str] = []
+
+    def is_expired(self) -> bool:
+        """
+        True if following the logs and the --until time is passed, lines still
+        in transit are waited for MERGE_DELAY seconds
+        """
+        if not self.follow or not self.until:
+            return False
+        deadline = self.until + timedelta(seconds=MERGE_DELAY)
+        return datetime.now(timezone.utc) > deadline
+
+    def read_service(self, service: str) -> Iterator[LogLine]:
+        """
+        Lines of docker service logs, resumed when interrupted if following
+        """
+        service_name = self.docker.get_service(service)
+        until = get_timestamp_key(format_datetime(self.until)) if self.until else None
+        last: Optional[LogLine] = None
+        # True once the missing service is reported, to only log it once
+        waiting = False
+        while not self.stopped.is_set():
+            try:
+                # Iterable[tuple[str, bytes]] due to stream=True
+                since = get_datetime(last.timestamp) if last else self.since
+                lines = self.docker.client.service.logs(
+                    service_name,
+                    since=get_local_datetime(since) if since else None,
+                    tail=None if last else self.tail,
+                    timestamps=True,
+                    follow=self.follow,
+                    task_ids=False,
+                    stream=True,
+                )
+                for _, raw_line in lines:
+                    line = parse_line(service, raw_line, Configuration.project)
+                    # lines of the last second are received again when resumed
+                    if not line or (last and line.key <= last.key):
+                        continue
+                    # --until is not supported by docker service logs
+                    if until and line.key > until:
+                        if self.follow:
+                            return
+                        continue
+                    yield line
+                    last = line
+                    waiting = False
+            except NoSuchService:
+                if not self.follow:
+                    # reader threads can't exit, reported by swarm_logs
+                    self.missing.append(service)
+                    return
+                if not waiting:
+                    log.info("No such service {}, waiting for it to start", service)
+                waiting = True
+            except DockerException as e:
+                log.debug("Can't read the logs of {}: {}", service, e)
+
+            if not self.follow or self.is_expired():
+                return
+
+            log.debug("Logs of {} interrupted, waiting for the service", service)
+            self.stopped.wait(RECONNECT_INTERVAL)
+
+    def read_compose(self, services: list[str]) -> Iterator[LogLine]:
+        """
+        Lines of docker compose logs of all the services
+        """
+        # Iterable[tuple[str, bytes]] due to stream=True
+        lines = self.docker.client.compose.logs(
+            services,
+            follow=self.follow,
+            tail=str(self.tail),
+            timestamps=True,
+            since=format_datetime(self.since) if self.since else None,
+            until=format_datetime(self.until) if self.until else None,
+            stream=True,
+        )
+        for _, raw_line in lines:
+            yield parse_compose_line(raw_line, Configuration.project)
+
+    def read(self, stream: str, lines: Iterator[LogLine]) -> None:
+        try:
+            for line in lines:
+                # blocks when the queue is full
+                self.queue.put((stream, line))
+        except DockerException as e:
+            log.debug("Can't read the logs of {}: {}", stream, e)
+        finally:
+            self.queue.put((stream, None))
+
+    def flush(self, pending: dict[str, "deque[LogLine]"], active: set[str]) -> None:
+        """
+        Write the pending lines in timestamp order, as long as all the active
+        streams have a line to be compared with or the line waited long enough
+        """
+        while True:
+            heads = [(s, lines[0]) for s, lines in pending.items() if lines]
+            if not heads:
+                return
+
+            stream, line = min(heads, key=lambda h: h[1].key)
+            waiting = any(not pending[s] for s in active)
+            if waiting and time.monotonic() - line.received < MERGE_DELAY:
+                return
+
+            pending[stream].popleft()
+            self.writer.write(line)
+
+    def run(self, streams: dict[str, Callable[[], Iterator[LogLine]]]) -> None:
+        for stream, reader in streams.items():
+            threading.Thread(
+                target=self.read, args=(stream, reader()), daemon=True
+            ).start()
+
+        pending: dict[str, "deque[LogLine]"] = {s: deque() for s in streams}
+        active = set(streams)
+        try:
+            while active or any(pending.values()):
+                try:
+                    stream, line = self.queue.get(timeout=MERGE_DELAY)
+                except queue.Empty:
+                    stream, line = "", None
+
+                if stream and not line:
+                    active.discard(stream)
+                elif line:
+                    line.received = time.monotonic()
+                    pending[stream].append(line)
+
+                # Streams still open are no longer waited for
+                if active and self.is_expired():
+                    active.clear()
+
+                self.flush(pending, active)
+
+                # Nothing more to be written for now
+                if self.queue.empty():
+                    self.writer.flush()
+        finally:
+            self.stopped.set()
+            self.writer.flush()
+
+    def swarm_logs(self, services: list[str]) -> None:
+        self.run({s: partial(self.read_service, s) for s in services})
+        if self.missing:
+            print_and_exit(
+                "No such service {}, is the stack still starting up?",
+                ", ".join(self.missing),
+            )
+
+    def compose_logs(self, services: list[str]) -> None:
+        self.run({"compose": partial(self.read_compose, services)})
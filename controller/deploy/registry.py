@@ -1,5 +1,5 @@
 import socket
-from typing import cast
+from typing import Optional, cast
 
 import requests
 import urllib3
@@ -100,6 +100,23 @@ def verify_image(self, image: str) -> bool:
 
         return r.status_code == 200
 
+    def get_image_digest(self, image: str) -> Optional[str]:
+        """
+        Digest currently tagged in the registry, None if not found
+        """
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        registry = self.get_host()
+        repository = image.removeprefix(f"{registry}/")
+        tag = "latest"
+        if ":" in repository:
+            repository, tag = repository.rsplit(":", 1)
+        r = self.send_request(
+            f"https://{registry}/v2/{repository}/manifests/{tag}", check_status=False
+        )
+        if r.status_code != 200:
+            return None
+        return r.headers.get("Docker-Content-Digest")
+
     def login(self) -> None:
         registry = self.get_host()
         try:
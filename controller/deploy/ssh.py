@@ -0,0 +1,283 @@
+"""
+Multiplexed SSH connections to the remote engines (--remote and swarm nodes)
+
+Instead of connecting to ssh://host (a new SSH session for each docker command)
+a master connection is opened once per host and kept alive in background for
+RAPYDO_SSH_PERSIST seconds after the last use (ControlPersist). The master forwards
+a local socket to the docker socket of the remote host, used as a unix:// host by
+all the clients, the docker CLI and the Engine API backend, across the commands.
+The remote socket is the one of the current docker context of the remote host
+(e.g. of rootless engines), unless set with RAPYDO_SSH_DOCKER_SOCKET.
+
+The master is checked before being reused: a stale master (or a forwarded socket
+not reaching the engine, verified with a ping) is closed and opened again.
+Whenever the master can't be opened (ssh not installed, authentication requiring
+a prompt, engine not reachable, ...) the ssh:// host is used as before.
+Set RAPYDO_SSH_PERSIST=0 to disable the multiplexing
+"""
+
+import hashlib
+import http.client
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+from controller import SSH_DOCKER_SOCKET, SSH_PERSIST, log
+from controller.deploy.engine import UnixHTTPConnection
+from controller.utilities import system
+
+# Used when the docker context of the remote host can't be read
+DEFAULT_REMOTE_SOCKET = "/var/run/docker.sock"
+# Maximum time allowed to open the master connection
+CONNECT_TIMEOUT = 10
+
+# engine => local docker host, verified by this process
+FORWARDED_HOSTS: dict[str, str] = {}
+# Clients are also created by concurrent threads (e.g. broadcasted commands)
+LOCK = threading.Lock()
+
+
+def get_sockets_dir() -> Path:
+    # Paths of unix sockets are limited to ~100 chars, the data dir could be longer
+    if runtime_dir := os.environ.get("XDG_RUNTIME_DIR"):
+        path = Path(runtime_dir).joinpath("rapydo-ssh")
+    else:
+        path = Path(tempfile.gettempdir()).joinpath(
+            f"rapydo-ssh-{system.get_current_uid()}"
+        )
+    path.mkdir(mode=0o700, exist_ok=True)
+    return path
+
+
+def is_private_dir(path: Path) -> bool:
+    """
+    True if the directory is owned by the current user and only accessible by them.
+    A name in a shared tmp dir is predictable and could be created by others
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_ISDIR(st.st_mode)
+        and st.st_uid == system.get_current_uid()
+        and stat.S_IMODE(st.st_mode) == 0o700
+    )
+
+
+def get_socket_paths(engine: str) -> tuple[Path, Path]:
+    """
+    Control socket of the master and local socket forwarded to the remote engine
+    """
+    key = hashlib.sha1(engine.encode()).hexdigest()[:16]
+    sockets_dir = get_sockets_dir()
+    return sockets_dir.joinpath(f"{key}.ctl"), sockets_dir.joinpath(f"{key}.sock")
+
+
+def get_ssh_command(engine: str, control_path: Path) -> list[str]:
+    url = urlparse(f"ssh://{engine}")
+    cmd = ["ssh", "-S", str(control_path)]
+    if url.port:
+        cmd += ["-p", str(url.port)]
+    destination = f"{url.username}@{url.hostname}" if url.username else url.hostname
+    return [*cmd, "--", str(destination)]
+
+
+def control(engine: str, control_path: Path, operation: str, *args: str) -> bool:
+    """
+    Send a control command (check, forward, exit) to the master, True if succeeded
+    """
+    cmd = get_ssh_command(engine, control_path)
+    cmd[-2:-2] = ["-O", operation, *args]
+    try:
+        result = subprocess.run(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=CONNECT_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def get_forward_target(docker_host: str) -> Optional[str]:
+    """
+    Target of the forward for a docker host: path of unix sockets, host:port
+    for tcp hosts. None for other hosts
+    """
+    url = urlparse(docker_host)
+    if url.scheme == "unix" and url.path:
+        return url.path
+    if url.scheme == "tcp" and url.hostname and url.port:
+        return f"{url.hostname}:{url.port}"
+    return None
+
+
+def get_remote_socket(engine: str, control_path: Path) -> str:
+    """
+    Docker socket of the remote host, as reported by its current docker context
+    """
+    if SSH_DOCKER_SOCKET:
+        return SSH_DOCKER_SOCKET
+
+    cmd = get_ssh_command(engine, control_path)
+    cmd += ["docker", "context", "inspect", "--format", "{{.Endpoints.docker.Host}}"]
+    try:
+        result = subprocess.run(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=CONNECT_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        log.debug("Can't read the docker context of {}: {}", engine, e)
+        return DEFAULT_REMOTE_SOCKET
+
+    docker_host = result.stdout.decode(errors="replace").strip()
+    if target := get_forward_target(docker_host):
+        return target
+    log.debug("Unsupported docker host on {}: {}", engine, docker_host or "N/A")
+    return DEFAULT_REMOTE_SOCKET
+
+
+def is_reachable(socket_path: Path) -> bool:
+    """
+    True if the engine answers through the forwarded socket (the socket itself
+    is accepted by the master even if the remote endpoint is not reachable)
+    """
+    conn = UnixHTTPConnection(str(socket_path), timeout=CONNECT_TIMEOUT)
+    try:
+        conn.request("GET", "/_ping")
+        return conn.getresponse().status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+
+def close(engine: str) -> None:
+    control_path, socket_path = get_socket_paths(engine)
+    if control_path.exists():
+        control(engine, control_path, "exit")
+    control_path.unlink(missing_ok=True)
+    socket_path.unlink(missing_ok=True)
+    FORWARDED_HOSTS.pop(engine, None)
+
+
+def open_master(engine: str, control_path: Path, socket_path: Path) -> bool:
+    cmd = get_ssh_command(engine, control_path)
+    cmd[-2:-2] = [
+        "-o",
+        "ControlMaster=auto",
+        "-o",
+        f"ControlPersist={SSH_PERSIST}",
+        "-o",
+        "BatchMode=yes",
+        "-o",
+        f"ConnectTimeout={CONNECT_TIMEOUT}",
+        "-o",
+        "StreamLocalBindUnlink=yes",
+        "-o",
+        "StreamLocalBindMask=0177",
+        # Go to background after the authentication, without any remote command
+        "-f",
+        "-N",
+    ]
+    # Not a pipe: the master in background would keep it open
+    with tempfile.TemporaryFile() as errors:
+        try:
+            result = subprocess.run(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=errors,
+                timeout=CONNECT_TIMEOUT * 3,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            log.debug("Can't open a SSH connection to {}: {}", engine, e)
+            return False
+
+        if result.returncode != 0:
+            errors.seek(0)
+            log.debug(
+                "Can't open a SSH connection to {}: {}",
+                engine,
+                errors.read().decode(errors="replace").strip(),
+            )
+            return False
+
+    remote_socket = get_remote_socket(engine, control_path)
+    if not control(
+        engine, control_path, "forward", "-L", f"{socket_path}:{remote_socket}"
+    ):
+        log.debug("Can't forward {} of {}", remote_socket, engine)
+        return False
+    if not is_reachable(socket_path):
+        log.debug("Docker engine not reachable on {}:{}", engine, remote_socket)
+        return False
+    return True
+
+
+def get_docker_host(engine: str) -> str:
+    """
+    Docker host of the remote engine (user@host[:port]): a local socket forwarded
+    by a master connection or, if not available, the ssh:// host
+    """
+    ssh_host = f"ssh://{engine}"
+    if SSH_PERSIST <= 0 or not shutil.which("ssh"):
+        return ssh_host
+
+    sockets_dir = get_sockets_dir()
+    if not is_private_dir(sockets_dir):
+        log.warning(
+            "{} is not a private directory, can't be used for SSH connections",
+            sockets_dir,
+        )
+        return ssh_host
+
+    with LOCK:
+        return connect(engine, ssh_host)
+
+
+def connect(engine: str, ssh_host: str) -> str:
+    if engine in FORWARDED_HOSTS:
+        return FORWARDED_HOSTS[engine]
+
+    control_path, socket_path = get_socket_paths(engine)
+
+    # Health check of a master opened by a previous command
+    if control_path.exists():
+        if control(engine, control_path, "check") and is_reachable(socket_path):
+            log.debug("Reusing the SSH connection to {}", engine)
+            FORWARDED_HOSTS[engine] = f"unix://{socket_path}"
+            return FORWARDED_HOSTS[engine]
+        log.debug("Closing a stale SSH connection to {}", engine)
+        close(engine)
+
+    if not open_master(engine, control_path, socket_path):
+        log.debug("Using {} without connection multiplexing", ssh_host)
+        close(engine)
+        return ssh_host
+
+    log.debug("Opened a SSH connection to {}", engine)
+    FORWARDED_HOSTS[engine] = f"unix://{socket_path}"
+    return FORWARDED_HOSTS[engine]
+
+
+def get_engine(host: Optional[str]) -> Optional[str]:
+    """
+    Remote engine served by a forwarded docker host, to be shown in place of the
+    local socket. Other hosts are returned unchanged
+    """
+    for engine, forwarded_host in FORWARDED_HOSTS.items():
+        if forwarded_host == host:
+            return engine
+    return host
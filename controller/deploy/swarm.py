@@ -2,29 +2,82 @@
 Integration with Docker swarm
 """
 
-from typing import Optional, Union
-
+import hashlib
+import json
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Optional, Union
+
+import yaml
 from glom import glom
-from python_on_whales import Service
+from python_on_whales import Node, Service
 from python_on_whales.exceptions import NoSuchService, NotASwarmManager
+from rich.live import Live
+from rich.table import Table
 
 from controller import COMPOSE_FILE, RED, colors, log, print_and_exit
 from controller.app import Application, Configuration
 from controller.deploy.docker import Docker
+from controller.deploy.engine import STACK_NAMESPACE_LABEL, TaskInfo
+from controller.deploy.events import (
+    DEFAULT_TIMEOUT,
+    SWARM_WATCH_INTERVAL,
+    WAKE_UP_INTERVAL,
+    EventsStream,
+    wait_convergence,
+)
+from controller.deploy.logs import LogLevels, LogsMultiplexer, LogsWriter
+from controller.utilities import cache
+from controller.utilities import services as services_utils
 from controller.utilities import system
-from controller.utilities.tables import print_table
+from controller.utilities.tables import get_table, print_table
+
+# Services (with their tasks grouped by service name) and nodes of the stack
+StackStatus = tuple[list[Service], dict[str, list[TaskInfo]], list[Node]]
+
+WATCH_HEADERS = ["SERVICE", "REPLICAS", "TASKS", "IMAGE", "PORTS"]
+WATCHED_TYPES = ["container", "node", "service"]
+BATCHES_HEADERS = ["BATCH", "SERVICES", "REPLICAS", "STARTED", "RESTART TIME"]
+
+# Hash of the compose configuration of the deployed services
+CONFIG_HASH_LABEL = "com.rapydo.config-hash"
+# Hash of the compose file of the last deploy
+DEPLOY_CACHE = "swarm-deploy"
+
+# Actions of the deploy plan
+CREATED = "created"
+UPDATED = "updated"
+REMOVED = "removed"
+UNCHANGED = "unchanged"
+ACTIONS_COLORS = {
+    CREATED: "[green]{}[/green]",
+    UPDATED: "[yellow]{}[/yellow]",
+    REMOVED: "[red]{}[/red]",
+    UNCHANGED: "{}",
+}
 
 
 class Swarm:
+    # Engines already verified during a batch, not verified again by next commands
+    verified_engines: set[Optional[str]] = set()
+
     def __init__(self, docker: Docker, check_initialization: bool = True):
         self.docker_wrapper = docker
         self.docker = self.docker_wrapper.client
 
-        if check_initialization and not self.get_token():
-            print_and_exit(
-                "Swarm is not initialized, please execute {command}",
-                command=RED("rapydo init"),
-            )
+        if check_initialization:
+            engine = Configuration.remote_engine
+            if not Configuration.batch or engine not in Swarm.verified_engines:
+                if not self.get_token():
+                    print_and_exit(
+                        "Swarm is not initialized, please execute {command}",
+                        command=RED("rapydo init"),
+                    )
+                if Configuration.batch:
+                    Swarm.verified_engines.add(engine)
 
     def init(self) -> None:
         manager_address = str(
@@ -55,54 +108,342 @@ def stack_is_running(self) -> bool:
                 return True
         return False
 
+    def get_stack_status(self, nodes: bool = False) -> StackStatus:
+        """
+        Services, tasks and (optionally) nodes of the stack, fetched concurrently
+        with a query each, independently from the number of services
+        """
+        stack = Configuration.project
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="swarm") as pool:
+            services_list = pool.submit(
+                self.docker.service.list,
+                filters={"label": f"{STACK_NAMESPACE_LABEL}={stack}"},
+            )
+            tasks_list = pool.submit(self.docker_wrapper.engine.list_stack_tasks, stack)
+            nodes_list = pool.submit(self.docker.node.list) if nodes else None
+
+            services = services_list.result()
+            tasks = tasks_list.result()
+            nodes_info = nodes_list.result() if nodes_list else []
+
+        services_names = {s.id: s.spec.name for s in services if s.spec.name}
+        tasks_by_service: dict[str, list[TaskInfo]] = {
+            name: [] for name in services_names.values()
+        }
+        for task in tasks:
+            name = services_names.get(task.service_id)
+            # Tasks of services removed in the meantime
+            if name:
+                tasks_by_service[name].append(task)
+
+        return services, tasks_by_service, nodes_info
+
     def get_running_services(self) -> set[str]:
         prefix = f"{Configuration.project}_"
         containers = set()
-        for service in self.docker.service.list():
-            name = service.spec.name
-            if name is None:  # pragma: no cover
-                log.warning("Got null name for {}", service)
-                continue
-            if not name.startswith(prefix):
+        _, tasks, _ = self.get_stack_status()
+        for name, service_tasks in tasks.items():
+            if not name.startswith(prefix):  # pragma: no cover
                 continue
 
-            for task in self.docker.service.ps(name):
-                status = task.status.state
+            for task in service_tasks:
+                status = task.state
                 if status != "running" and status != "starting" and status != "ready":
                     continue
 
                 # to be replaced with removeprefix
-                name = name[len(prefix) :]
-                containers.add(name)
+                containers.add(name[len(prefix) :])
         return containers
 
     def get_services_status(self, prefix: str) -> dict[str, str]:
         prefix += "_"
         services_status: dict[str, str] = dict()
-        for service in self.docker.service.list():
-            name = service.spec.name
-            if name is None:  # pragma: no cover
-                log.warning("Got null name for {}", service)
-                continue
-            if not name.startswith(prefix):
+        _, tasks, _ = self.get_stack_status()
+        for name, service_tasks in tasks.items():
+            if not name.startswith(prefix):  # pragma: no cover
                 continue
 
-            for task in self.docker.service.ps(name):
-                status = task.status.state or "N/A"
-
+            for task in service_tasks:
                 # to be replaced with removeprefix
-                name = name[len(prefix) :]
-                services_status[name] = status
+                services_status[name[len(prefix) :]] = task.state
         return services_status
 
-    def deploy(self) -> None:
-        self.docker.stack.deploy(
-            name=Configuration.project,
-            compose_files=COMPOSE_FILE,
-            resolve_image="always",
-            prune=True,
-            with_registry_auth=True,
+    @staticmethod
+    def get_config_hash(config: dict[str, Any]) -> str:
+        serialized = json.dumps(config, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
+    @staticmethod
+    def is_scale_changed(config: dict[str, Any], mode: dict[str, Any]) -> bool:
+        """
+        True if the mode (or the replicas) of a deployed service, given its spec mode,
+        differs from the configuration, e.g. after a rapydo scale
+        """
+        deploy = config.get("deploy") or {}
+        if deploy.get("mode", "replicated") == "global":
+            return "Global" not in mode
+        if "Global" in mode:
+            return True
+        replicas = glom(mode, "Replicated.Replicas", default=0)
+        return bool(replicas != int(deploy.get("replicas", 1)))
+
+    @staticmethod
+    def get_deploy_plan(
+        hashes: dict[str, str],
+        deployed_hashes: dict[str, Optional[str]],
+        outdated: set[str],
+    ) -> dict[str, str]:
+        """
+        Action required by each service, given the hashes of the configurations
+        to be deployed, the ones of the deployed services and the services outdated
+        for other reasons (image moved to a different digest, scale changed)
+        """
+        plan: dict[str, str] = {}
+        for service, config_hash in hashes.items():
+            if service not in deployed_hashes:
+                plan[service] = CREATED
+            elif deployed_hashes[service] != config_hash or service in outdated:
+                plan[service] = UPDATED
+            else:
+                plan[service] = UNCHANGED
+
+        for service in deployed_hashes:
+            if service not in hashes:
+                plan[service] = REMOVED
+        return plan
+
+    @staticmethod
+    def get_deployed_image(service: Service) -> str:
+        """
+        Image of the service, as resolved by the deploy (image:tag@digest)
+        """
+        if (
+            service.spec.task_template
+            and service.spec.task_template.container_spec
+            and service.spec.task_template.container_spec.image
+        ):
+            return service.spec.task_template.container_spec.image
+        return ""
+
+    def is_image_moved(self, image: str, deployed_image: str) -> bool:
+        """
+        True if the tag is now pointing to a digest different from the deployed one
+        """
+        # Only images of the local registry are verified, as with the first deploy
+        if not image.startswith(f"{self.docker_wrapper.registry.get_host()}/"):
+            return False
+
+        # Images are resolved as image:tag@digest
+        if "@" not in deployed_image:
+            return True
+        deployed_digest = deployed_image.split("@")[1]
+        return self.docker_wrapper.registry.get_image_digest(image) != deployed_digest
+
+    @staticmethod
+    def invalidate_deploy() -> None:
+        # Images pushed to the registry are to be verified by the next deploy
+        cache.clear(DEPLOY_CACHE)
+
+    def deploy(self, compose_hash: Optional[str] = None) -> None:
+        """
+        Deploy the services changed with respect to the running stack, i.e. with a
+        different configuration (compared by hash), an image tag moved to a new
+        digest or a mode (or replicas) changed after the deploy, restored as with
+        a full stack deploy. Services no longer included in the configuration
+        are removed. Images are not verified when the compose file (given its hash)
+        is the same of the last deploy and no image was pushed in the meantime
+        """
+        with open(COMPOSE_FILE) as fh:
+            compose_config: dict[str, Any] = yaml.safe_load(fh)
+
+        compose_services: dict[str, dict[str, Any]] = compose_config["services"]
+        hashes = {s: self.get_config_hash(c) for s, c in compose_services.items()}
+
+        prefix = f"{Configuration.project}_"
+        deployed: dict[str, Service] = {}
+        for service in self.docker.service.list(
+            filters={"label": f"{STACK_NAMESPACE_LABEL}={Configuration.project}"}
+        ):
+            # to be replaced with removeprefix
+            deployed[(service.spec.name or "")[len(prefix) :]] = service
+
+        deployed_hashes = {
+            name: (service.spec.labels or {}).get(CONFIG_HASH_LABEL)
+            for name, service in deployed.items()
+        }
+
+        # Services with an unchanged configuration are still to be verified
+        unchanged = [
+            name
+            for name in compose_services
+            if name in deployed and deployed_hashes[name] == hashes[name]
+        ]
+
+        # Restored as with a full stack deploy
+        reasons = {
+            name: "scale changed"
+            for name in unchanged
+            if self.is_scale_changed(
+                compose_services[name], deployed[name].spec.mode or {}
+            )
+        }
+
+        fingerprint = cache.get_fingerprint(
+            Configuration.project, self.docker.client_config.host, compose_hash
+        )
+        verified = unchanged
+        if compose_hash and cache.load(DEPLOY_CACHE, fingerprint) is not None:
+            log.info("Compose configuration unchanged since the last deploy")
+            verified = []
+
+        # A registry request for each service, executed concurrently
+        with ThreadPoolExecutor(thread_name_prefix="registry") as pool:
+            moved_images = pool.map(
+                lambda name: self.is_image_moved(
+                    compose_services[name].get("image", ""),
+                    self.get_deployed_image(deployed[name]),
+                ),
+                verified,
+            )
+            for name, moved in zip(verified, moved_images):
+                if moved:
+                    reasons[name] = "image moved"
+
+        plan = self.get_deploy_plan(hashes, deployed_hashes, set(reasons))
+        rows = []
+        for name, action in sorted(plan.items()):
+            reason = reasons.get(name, "")
+            rows.append([name, ACTIONS_COLORS[action].format(action), reason])
+        print_table(["SERVICE", "ACTION", "REASON"], rows, table_title="Deploy plan")
+
+        removed: list[Union[str, Service]] = [
+            f"{prefix}{s}" for s, action in plan.items() if action == REMOVED
+        ]
+        if removed:
+            self.docker.service.remove(removed)
+
+        changed = [s for s, action in plan.items() if action in (CREATED, UPDATED)]
+        if not changed:
+            log.info("All services are up to date")
+            if compose_hash:
+                cache.save(DEPLOY_CACHE, fingerprint, {"hash": compose_hash})
+            return
+
+        for name in changed:
+            labels = (
+                compose_services[name].setdefault("deploy", {}).setdefault("labels", {})
+            )
+            labels[CONFIG_HASH_LABEL] = hashes[name]
+        compose_config["services"] = {s: compose_services[s] for s in changed}
+
+        # Digests are always resolved: a service deployed without the digest
+        # would be considered as moved (and restarted) by the next deploy
+        with tempfile.NamedTemporaryFile("w", suffix=".yml") as changes_file:
+            yaml.safe_dump(compose_config, changes_file, sort_keys=False)
+            changes_file.flush()
+
+            self.docker.stack.deploy(
+                name=Configuration.project,
+                compose_files=changes_file.name,
+                resolve_image="always",
+                # removed services are already removed, while unchanged services
+                # are not included in the compose file
+                prune=False,
+                with_registry_auth=True,
+            )
+
+        if compose_hash:
+            cache.save(DEPLOY_CACHE, fingerprint, {"hash": compose_hash})
+
+    @staticmethod
+    def get_restart_batches(waves: list[list[str]], batch_size: int) -> list[list[str]]:
+        """
+        Split the startup waves in batches of at most batch_size services, a batch
+        never includes services of different waves
+        """
+        return [
+            wave[i : i + batch_size]
+            for wave in waves
+            for i in range(0, len(wave), batch_size)
+        ]
+
+    def rolling_restart(
+        self,
+        services: list[str],
+        dependencies: dict[str, list[str]],
+        batch_size: int = 1,
+        timeout: int = DEFAULT_TIMEOUT,
+    ) -> None:
+        """
+        Force the restart of the services in batches, following their dependencies:
+        a batch is restarted once the new tasks of the previous batches are running
+        and healthy. Services scaled to zero are not restarted.
+        The timing of each batch is reported at the end
+        """
+        prefix = f"{Configuration.project}_"
+        replicas: dict[str, str] = {}
+        for stack_service in self.docker.service.list(
+            filters={"label": f"{STACK_NAMESPACE_LABEL}={Configuration.project}"}
+        ):
+            # to be replaced with removeprefix
+            name = (stack_service.spec.name or "")[len(prefix) :]
+            if "Global" in (stack_service.spec.mode or {}):
+                replicas[name] = "global"
+            elif scale := self.get_replicas(stack_service):
+                replicas[name] = str(scale)
+
+        skipped = [s for s in services if s not in replicas]
+        if skipped:
+            log.info("Services not running, not restarted: {}", ", ".join(skipped))
+
+        waves = services_utils.get_startup_waves(
+            [s for s in services if s in replicas], dependencies
         )
+        batches = self.get_restart_batches(waves, batch_size)
+
+        rows: list[list[str]] = []
+        start_time = time.monotonic()
+        for index, batch in enumerate(batches, start=1):
+            log.info(
+                "Restarting batch {}/{}: {}...", index, len(batches), ", ".join(batch)
+            )
+            started = time.monotonic() - start_time
+
+            for service in batch:
+                self.docker.service.update(
+                    f"{prefix}{service}", detach=True, force=True
+                )
+
+            convergence, _ = wait_convergence(
+                self.docker_wrapper, batch, timeout, restarted=True
+            )
+            elapsed = time.monotonic() - start_time - started
+
+            restarted = len(convergence) == len(batch)
+            rows.append(
+                [
+                    str(index),
+                    ", ".join(batch),
+                    ", ".join(replicas[s] for s in batch),
+                    f"{started:.1f}s",
+                    (
+                        f"[green]{elapsed:.1f}s[/green]"
+                        if restarted
+                        else "[red]not ready[/red]"
+                    ),
+                ]
+            )
+
+            if not restarted:
+                print_table(BATCHES_HEADERS, rows, table_title="Rolling restart")
+                print_and_exit(
+                    "Services not ready in {} seconds: {}",
+                    str(timeout),
+                    ", ".join(s for s in batch if s not in convergence),
+                )
+
+        print_table(BATCHES_HEADERS, rows, table_title="Rolling restart")
+        log.info("Services restarted: {}", ", ".join(sum(batches, [])))
 
     def restart(self, service: str) -> None:
         service_name = self.docker_wrapper.get_service(service)
@@ -120,7 +461,8 @@ def status(self, services: list[str]) -> None:
         nodes: dict[str, str] = {}
         nodes_table: list[list[str]] = []
         headers = ["Role", "State", "Name", "IP", "CPUs", "RAM", "LABELS", "Version"]
-        for node in self.docker.node.list():
+        stack_services, stack_tasks, stack_nodes = self.get_stack_status(nodes=True)
+        for node in stack_nodes:
             node_hostname = node.description.hostname or "N/A"
             node_addr = node.status.addr or "N/A"
             nodes[node.id] = node_hostname
@@ -166,7 +508,6 @@ def status(self, services: list[str]) -> None:
             )
 
         print_table(headers, nodes_table, table_title="Cluster status")
-        stack_services = self.docker.service.list()
 
         print("")
 
@@ -185,20 +526,18 @@ def status(self, services: list[str]) -> None:
             if tmp_service_name not in services:
                 continue
 
-            print(f"{colors.RESET}Inspecting {service_name}...", end="\r")
-
             tasks_lines: list[str] = []
 
             running_tasks = 0
-            for task in self.docker.service.ps(service_name):
-                if task.status.state == "shutdown" or task.status.state == "complete":
+            for task in stack_tasks.get(service_name, []):
+                if task.state == "shutdown" or task.state == "complete":
                     COLOR = colors.BLUE
-                elif task.status.state == "running":
+                elif task.state == "running":
                     COLOR = colors.GREEN
                     running_tasks += 1
-                elif task.status.state == "starting" or task.status.state == "ready":
+                elif task.state == "starting" or task.state == "ready":
                     COLOR = colors.YELLOW
-                elif task.status.state == "failed":
+                elif task.state == "failed":
                     COLOR = colors.RED
                 else:
                     COLOR = colors.RESET
@@ -211,12 +550,12 @@ def status(self, services: list[str]) -> None:
                     container_name = f"{service_name}.{task.node_id}.{task.id}"
 
                 node_name = nodes.get(task.node_id, "")
-                status = f"{COLOR}{task.status.state:8}{colors.RESET}"
-                errors = f"err={task.status.err}" if task.status.err else ""
+                status = f"{COLOR}{task.state:8}{colors.RESET}"
+                errors = f"err={task.error}" if task.error else ""
                 labels = ",".join(task.labels)
                 ts = "N/A"
-                if task.status.timestamp:
-                    ts = task.status.timestamp.strftime("%d-%m-%Y %H:%M:%S")
+                if task.timestamp:
+                    ts = task.timestamp.strftime("%d-%m-%Y %H:%M:%S")
 
                 tasks_lines.append(
                     "\t".join(
@@ -232,9 +571,6 @@ def status(self, services: list[str]) -> None:
                     )
                 )
 
-            # Very ugly, to reset the color with \r
-            print("                                                         ", end="\r")
-
             replicas = self.get_replicas(service)
 
             if replicas == 0:
@@ -244,22 +580,8 @@ def status(self, services: list[str]) -> None:
             else:
                 COLOR = colors.GREEN
 
-            if service.endpoint.ports:
-                ports_list = [
-                    f"{p.published_port}->{p.target_port}"
-                    for p in service.endpoint.ports
-                ]
-            else:
-                ports_list = []
-
-            image = "N/A"
-            if (
-                service.spec.task_template
-                and service.spec.task_template.container_spec
-                and service.spec.task_template.container_spec.image
-            ):
-                image = service.spec.task_template.container_spec.image.split("@")[0]
-            ports = ",".join(ports_list)
+            image = self.get_image(service)
+            ports = self.get_ports(service)
             print(
                 f"{COLOR}{service_name:23}{colors.RESET} [{replicas}] {image}\t{ports}"
             )
@@ -269,48 +591,112 @@ def status(self, services: list[str]) -> None:
 
             print("")
 
-    def remove(self) -> None:
-        self.docker.stack.remove(Configuration.project)
+    @staticmethod
+    def get_image(service: Service) -> str:
+        if (
+            service.spec.task_template
+            and service.spec.task_template.container_spec
+            and service.spec.task_template.container_spec.image
+        ):
+            return service.spec.task_template.container_spec.image.split("@")[0]
+        return "N/A"
 
-    def logs(self, service: str, follow: bool, tail: int, timestamps: bool) -> None:
-        if service not in Application.data.active_services:
-            print_and_exit("No such service: {}", service)
+    @staticmethod
+    def get_ports(service: Service) -> str:
+        if not service.endpoint.ports:
+            return ""
+        return ",".join(
+            f"{p.published_port}->{p.target_port}" for p in service.endpoint.ports
+        )
 
-        service_name = self.docker_wrapper.get_service(service)
+    def get_watch_rows(self, services: list[str]) -> list[list[str]]:
+        stack_services, stack_tasks, _ = self.get_stack_status()
 
-        try:
-            # lines: Iterable[tuple[str, bytes]] due to stream=True
-            # without stream=True the type would be :str
-            lines = self.docker.service.logs(
-                service_name,
-                task_ids=False,
-                resolve=True,
-                truncate=True,
-                # since=None,
-                tail=tail,
-                details=False,
-                timestamps=timestamps,
-                follow=follow,
-                stream=True,
-            )
+        rows: list[list[str]] = []
+        prefix = f"{Configuration.project}_"
+        for service in sorted(stack_services, key=lambda s: s.spec.name or ""):
+            service_name = service.spec.name or "N/A"
+            # to be replaced with removeprefix
+            if service_name[len(prefix) :] not in services:
+                continue
 
-        except NoSuchService:
-            print_and_exit(
-                "No such service {}, is the stack still starting up?", service
-            )
+            tasks = [
+                t
+                for t in stack_tasks.get(service_name, [])
+                if t.desired_state == "running"
+            ]
+            running_tasks = len([t for t in tasks if t.state == "running"])
+            replicas = self.get_replicas(service)
 
-        for log_line in lines:
-            # 'stdout' or 'stderr'
-            # Both out and err are collapsed in stdout
-            # Maybe in the future would be useful to keep them separated?
-            # stdstream = log_line[0]
+            if replicas == 0:
+                COLOR = "yellow"
+            elif replicas != running_tasks:
+                COLOR = "red"
+            else:
+                COLOR = "green"
 
-            line = log_line[1]
+            states: dict[str, int] = {}
+            for task in tasks:
+                states[task.state] = states.get(task.state, 0) + 1
+
+            rows.append(
+                [
+                    f"[bold {COLOR}]{service_name}[/bold {COLOR}]",
+                    f"{running_tasks}/{replicas}",
+                    ",".join(f"{k}={v}" for k, v in sorted(states.items())),
+                    self.get_image(service),
+                    self.get_ports(service),
+                ]
+            )
+        return rows
+
+    def watch(self, services: list[str]) -> None:
+        """
+        Status of the services updated in place by the events of the engine.
+        Tasks executed on other nodes don't send events to the manager,
+        so they are also verified every SWARM_WATCH_INTERVAL seconds, or every
+        WAKE_UP_INTERVAL seconds if the events are no longer received
+        """
+
+        def render() -> Table:
+            rows = self.get_watch_rows(services)
+            return get_table(WATCH_HEADERS, rows, table_title="List of services")
+
+        with EventsStream(self.docker_wrapper, WATCHED_TYPES) as events:
+            with Live(render(), auto_refresh=False) as live:
+                while True:
+                    events.wait(
+                        SWARM_WATCH_INTERVAL if events.alive else WAKE_UP_INTERVAL
+                    )
+                    live.update(render(), refresh=True)
 
-            if isinstance(line, bytes):
-                line = line.decode("UTF-8")
+    def remove(self) -> None:
+        self.docker.stack.remove(Configuration.project)
 
-            print(line.strip())
+    def logs(
+        self,
+        services: list[str],
+        follow: bool = False,
+        tail: int = 500,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        grep: Optional["re.Pattern[str]"] = None,
+        level: Optional[LogLevels] = None,
+        json_output: bool = False,
+    ) -> None:
+        """
+        Show the logs of the services merged by timestamp, followed concurrently
+        """
+        for service in services:
+            if service not in Application.data.active_services:
+                print_and_exit("No such service: {}", service)
+
+        # Frontend logs are always timestamped
+        writer = LogsWriter(services, ["frontend"], json_output, grep, level)
+
+        LogsMultiplexer(
+            self.docker_wrapper, writer, follow, tail, since=since, until=until
+        ).swarm_logs(services)
 
     def check_resources(self) -> None:
         total_cpus = 0.0
@@ -91,12 +91,15 @@ def check_program(
         min_version: Optional[str] = None,
         max_version: Optional[str] = None,
         min_recommended_version: Optional[str] = None,
+        found_version: Optional[str] = None,
     ) -> str:
         """
-        Verify if a binary exists and (optionally) its version
+        Verify if a binary exists and (optionally) its version.
+        The version can be provided, if already retrieved (e.g. by a probe)
         """
 
-        found_version = Packages.get_bin_version(program)
+        if found_version is None:
+            found_version = Packages.get_bin_version(program)
         if found_version is None:
             hints = ""
             if program == "docker":  # pragma: no cover
@@ -16,7 +16,7 @@
     log,
     print_and_exit,
 )
-from controller.utilities import git
+from controller.utilities import git, profiler
 
 NO_AUTHENTICATION = "NO_AUTHENTICATION"
 NO_FRONTEND = "nofrontend"
@@ -47,6 +47,7 @@ def __init__(self) -> None:
     def p_path(self, *args: str) -> Path:
         return PROJECT_DIR.joinpath(self.project, *args)
 
+    @profiler.timed
     def load_project_scaffold(
         self, project: str, auth: Optional[str], services: Optional[list[str]] = None
     ) -> bool:
@@ -151,6 +152,7 @@ def load_project_scaffold(
         self.obsolete_files.append(SUBMODULES_DIR.joinpath("build-templates"))
         return True
 
+    @profiler.timed
     def load_frontend_scaffold(self, frontend: Optional[str]) -> bool:
         self.frontend = frontend
 
@@ -324,6 +326,7 @@ def check_invalid_characters(project: str) -> None:
                 "Wrong project name, found invalid characters: {}", invalid_chars
             )
 
+    @profiler.timed
     def check_main_folder(self) -> Optional[str]:
         folder = Path.cwd()
         first_level_error = self.inspect_main_folder(folder)
@@ -376,6 +379,7 @@ def inspect_main_folder(self, folder: Path) -> Optional[str]:
 
         return None
 
+    @profiler.timed
     def inspect_project_folder(self) -> None:
         for fpath in self.expected_folders:
             if not fpath.is_dir():
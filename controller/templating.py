@@ -11,7 +11,6 @@
 
 from jinja2 import DebugUndefined, Environment, FileSystemLoader
 from jinja2.exceptions import TemplateNotFound, UndefinedError
-from zxcvbn import zxcvbn  # type: ignore
 
 from controller import TEMPLATE_DIR, log, print_and_exit
 
@@ -64,6 +63,9 @@ def password(param_not_used: str, length: int = 12, symbols: str = "") -> str:
 
 
 def get_strong_password() -> str:
+    # Slow to be imported, only loaded when needed
+    from zxcvbn import zxcvbn  # type: ignore
+
     p = password(length=16, param_not_used="", symbols="%*,-.=^_~")
     result = zxcvbn(p)
     score = result["score"]
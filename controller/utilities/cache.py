@@ -0,0 +1,213 @@
+"""
+Persistent cache of values that are expensive to compute, stored in the data folder
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from controller import CACHE_DIR, DATA_DIR, HOST_FACTS_TTL, ComposeServices, log
+
+T = TypeVar("T")
+
+HOST_FACTS_CACHE = "host-facts"
+
+# Docker CLI plugins search paths, as documented in docker/cli
+COMPOSE_PLUGIN_DIRS = [
+    "/usr/local/lib/docker/cli-plugins",
+    "/usr/local/libexec/docker/cli-plugins",
+    "/usr/lib/docker/cli-plugins",
+    "/usr/libexec/docker/cli-plugins",
+]
+
+VARIABLE_REGEXP = re.compile(r"\$\{?([A-Za-z_][A-Za-z0-9_]*)")
+
+
+def get_cache_file(name: str) -> Path:
+    return CACHE_DIR.joinpath(f"{name}.json")
+
+
+def get_fingerprint(*values: Any) -> str:
+    """
+    Compute a stable hash of a set of json-serializable values
+    """
+    h = hashlib.sha256()
+    for v in values:
+        h.update(json.dumps(v, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def load(name: str, fingerprint: str) -> Optional[dict[str, Any]]:
+    """
+    Return the cached data if saved with the same fingerprint, None otherwise
+    """
+    # Caches are only available inside a project folder
+    if not DATA_DIR.is_dir():
+        return None
+
+    cache_file = get_cache_file(name)
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        log.debug("Cache miss for {}: no cache found", name)
+        return None
+    except (OSError, ValueError) as e:
+        log.debug("Cache miss for {}: invalid cache file ({})", name, e)
+        return None
+
+    if not isinstance(cache, dict) or cache.get("fingerprint") != fingerprint:
+        log.debug("Cache miss for {}: fingerprint changed", name)
+        return None
+
+    log.debug("Cache hit for {} ({})", name, fingerprint[:12])
+    data: dict[str, Any] = cache.get("data", {})
+    return data
+
+
+def save(name: str, fingerprint: str, data: dict[str, Any]) -> None:
+    # Caches are only saved inside a project folder
+    if not DATA_DIR.is_dir():
+        return
+
+    cache_file = get_cache_file(name)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Write and rename, to never leave a partial cache behind
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump({"fingerprint": fingerprint, "data": data}, f, indent=2)
+        tmp_file.replace(cache_file)
+    except OSError as e:  # pragma: no cover
+        log.debug("Can't save {} cache: {}", name, e)
+
+
+def clear(name: str) -> None:
+    try:
+        get_cache_file(name).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def get_files_hashes(files: list[Path]) -> list[Optional[str]]:
+    """
+    Hash of the content of each file, None for missing files
+    """
+    hashes: list[Optional[str]] = []
+    for path in files:
+        try:
+            hashes.append(hashlib.sha256(path.read_bytes()).hexdigest())
+        except OSError:
+            hashes.append(None)
+    return hashes
+
+
+def get_compose_plugin() -> Optional[Path]:
+    docker_config = os.getenv("DOCKER_CONFIG") or str(Path.home().joinpath(".docker"))
+    for folder in [Path(docker_config, "cli-plugins"), *map(Path, COMPOSE_PLUGIN_DIRS)]:
+        plugin = folder.joinpath("docker-compose")
+        if plugin.exists():
+            return plugin
+    return None
+
+
+def get_compose_plugin_stats() -> list[Any]:
+    """
+    Use size and modification time of the compose plugin as a cheap proxy of its
+    version, to avoid to execute docker compose version at every run
+    """
+    plugin = get_compose_plugin()
+    if not plugin:
+        return []
+    stat = plugin.stat()
+    return [str(plugin), stat.st_size, stat.st_mtime_ns]
+
+
+def get_binaries_stats(binaries: list[str]) -> list[Any]:
+    """
+    Inode and modification time of the binaries (searched in PATH, unless
+    given as a path), that change when the programs are upgraded
+    """
+    stats: list[Any] = []
+    for binary in binaries:
+        path = shutil.which(binary)
+        if not path:
+            stats.append([binary, None])
+            continue
+        stat = os.stat(path)
+        stats.append([path, stat.st_ino, stat.st_mtime_ns, stat.st_size])
+    return stats
+
+
+def get_host_fact(
+    name: str,
+    binaries: list[str],
+    func: Callable[..., T],
+    *args: Any,
+    refresh: bool = False,
+    **kwargs: Any,
+) -> T:
+    """
+    Return a fact of the host (e.g. the version of a program) as computed by func.
+    The value is cached up to HOST_FACTS_TTL seconds and invalidated in advance
+    if any of the given binaries is changed. None values are never cached
+    """
+    cache_name = f"{HOST_FACTS_CACHE}-{name}"
+    fingerprint = get_fingerprint(args, kwargs, get_binaries_stats(binaries))
+
+    if not refresh and HOST_FACTS_TTL > 0:
+        cached = load(cache_name, fingerprint)
+        if cached and time.time() - cached["time"] < HOST_FACTS_TTL:
+            value: T = cached["value"]
+            return value
+
+    value = func(*args, **kwargs)
+    if value is not None and HOST_FACTS_TTL > 0:
+        save(cache_name, fingerprint, {"time": time.time(), "value": value})
+    return value
+
+
+def get_compose_fingerprint(files: list[Path], env_file: Path) -> str:
+    """
+    Fingerprint of all the inputs of docker compose config: the content of the
+    compose files and of the env file, any shell variable they reference, the
+    working directory (relative paths are resolved on it) and the compose version
+    """
+    contents: list[str] = []
+    variables: set[str] = set()
+    for path in [*files, env_file]:
+        try:
+            content = path.read_text()
+        except OSError:
+            content = ""
+        contents.append(content)
+        variables.update(VARIABLE_REGEXP.findall(content))
+
+    environ = {v: os.environ.get(v) for v in sorted(variables)}
+
+    return get_fingerprint(
+        [str(f) for f in files],
+        contents,
+        environ,
+        os.getcwd(),
+        get_compose_plugin_stats(),
+    )
+
+
+def dump_services(services: ComposeServices) -> dict[str, Any]:
+    return {
+        name: service.model_dump(mode="json", exclude_unset=True)
+        for name, service in services.items()
+    }
+
+
+def load_services(data: dict[str, Any]) -> ComposeServices:
+    # temporary added here to prevent loading the models when not needed
+    from python_on_whales.components.compose.models import ComposeConfigService
+
+    return {name: ComposeConfigService(**d) for name, d in data.items()}
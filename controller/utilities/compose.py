@@ -0,0 +1,516 @@
+"""
+Native implementation of docker compose config: merge of the compose files,
+variables interpolation and normalization of the services definitions.
+
+The output reproduces the json produced by docker compose config --format json,
+at least for the subset of the compose specification used by RAPyDo.
+Any unsupported syntax raises UnsupportedComposeSyntax, to let the caller
+fall back to the compose CLI.
+"""
+
+import os
+import re
+import shlex
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Optional
+
+import yaml
+
+# Top-level and service-level keys that are not implemented natively
+UNSUPPORTED_TOP_LEVEL_KEYS = ("include", "secrets", "configs")
+UNSUPPORTED_SERVICE_KEYS = ("extends", "profiles", "env_file", "secrets", "configs")
+
+# Lists merged by enforcing unicity of the elements
+UNIQUE_LISTS = ("cap_add", "cap_drop", "dns", "dns_search", "dns_opt", "expose")
+# Values replaced (and not merged) by override files
+OVERRIDDEN_KEYS = ("command", "entrypoint")
+
+INTERPOLATION_REGEXP = re.compile(
+    r"""
+    \$(?:
+        (?P<escaped>\$) |
+        (?P<named>[_a-zA-Z][_a-zA-Z0-9]*) |
+        {(?P<braced>[_a-zA-Z][_a-zA-Z0-9]*)(?P<modifier>:?[-?+])? |
+        (?P<invalid>)
+    )
+    """,
+    re.VERBOSE,
+)
+
+MEMORY_REGEXP = re.compile(r"^(\d+(?:\.\d+)*) ?([kKmMgGtTpP])?[iI]?[bB]?$")
+MEMORY_UNITS = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40, "p": 1 << 50}
+
+PORT_REGEXP = re.compile(
+    r"^(?:(?:(?P<host_ip>[^:]*):)?(?P<published>[\d-]*):)?(?P<target>[\d-]+)"
+    r"(?:/(?P<protocol>\w+))?$"
+)
+
+
+class UnsupportedComposeSyntax(Exception):
+    pass
+
+
+# libyaml bindings are much faster, but may be not available
+try:
+    from yaml import CSafeLoader as BaseLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as BaseLoader  # type: ignore[assignment]
+
+
+class ComposeLoader(BaseLoader):
+    """
+    Safe loader following the YAML 1.2 core schema, as the compose CLI does.
+    The default YAML 1.1 schema would convert yes/no/on/off to booleans
+    and port mappings like 7777:80 to (sexagesimal) integers
+    """
+
+
+ComposeLoader.yaml_implicit_resolvers = {
+    k: [r for r in v if r[0] not in ("tag:yaml.org,2002:bool", "tag:yaml.org,2002:int")]
+    for k, v in yaml.SafeLoader.yaml_implicit_resolvers.items()
+}
+ComposeLoader.add_implicit_resolver(  # type: ignore[no-untyped-call]
+    "tag:yaml.org,2002:bool",
+    re.compile(r"^(?:true|True|TRUE|false|False|FALSE)$"),
+    list("tTfF"),
+)
+ComposeLoader.add_implicit_resolver(  # type: ignore[no-untyped-call]
+    "tag:yaml.org,2002:int",
+    re.compile(r"^(?:[-+]?[0-9]+|0x[0-9a-fA-F]+)$"),
+    list("-+0123456789"),
+)
+
+
+def load_env_file(path: Optional[Path]) -> dict[str, str]:
+    """
+    Read the env file written by the controller, made of KEY=VALUE lines
+    and with values eventually enclosed by single quotes
+    """
+    env: dict[str, str] = {}
+    if not path or not path.exists():
+        return env
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "=" not in line:
+                raise UnsupportedComposeSyntax(f"Invalid line in env file: {line}")
+            key, value = line.split("=", 1)
+            if len(value) >= 2 and value[0] == value[-1] == "'":
+                value = value[1:-1]
+            elif "$" in value or '"' in value or "#" in value:
+                # compose would expand or unquote such values
+                raise UnsupportedComposeSyntax(f"Unsupported value for {key}")
+            env[key.strip()] = value
+    return env
+
+
+def get_environment(env_file: Optional[Path]) -> dict[str, str]:
+    """
+    Variables available for the interpolation: the env file,
+    overridden by the variables of the current shell
+    """
+    env = load_env_file(env_file)
+    env.update(os.environ)
+    return env
+
+
+def interpolate(value: str, environment: Mapping[str, str]) -> str:
+    """
+    Replace $VAR, ${VAR} and ${VAR[:]-|?|+...} with values from environment
+    """
+
+    if "$" not in value:
+        return value
+
+    output: list[str] = []
+    pos = 0
+    while True:
+        m = INTERPOLATION_REGEXP.search(value, pos)
+        if not m:
+            output.append(value[pos:])
+            break
+
+        output.append(value[pos : m.start()])
+
+        if m.group("escaped") is not None:
+            output.append("$")
+            pos = m.end()
+        elif m.group("named") is not None:
+            output.append(environment.get(m.group("named"), ""))
+            pos = m.end()
+        elif m.group("braced") is not None:
+            name = m.group("braced")
+            modifier = m.group("modifier")
+            if modifier is None:
+                if value[m.end() : m.end() + 1] != "}":
+                    raise UnsupportedComposeSyntax(f"Invalid interpolation: {value}")
+                output.append(environment.get(name, ""))
+                pos = m.end() + 1
+                continue
+
+            # The argument of the modifier can contain nested variables
+            end = find_closing_brace(value, m.end())
+            argument = interpolate(value[m.end() : end], environment)
+            pos = end + 1
+
+            current = environment.get(name)
+            # with the colon, empty values are considered as unset
+            is_set = current is not None and (modifier[0] != ":" or current != "")
+            operator = modifier[-1]
+            if operator == "-":
+                output.append(current if is_set and current is not None else argument)
+            elif operator == "+":
+                output.append(argument if is_set else "")
+            elif not is_set:
+                # ? => the variable is required
+                raise UnsupportedComposeSyntax(f"Required variable {name}: {argument}")
+            else:
+                output.append(current or "")
+        else:
+            raise UnsupportedComposeSyntax(f"Invalid interpolation: {value}")
+
+    return "".join(output)
+
+
+def find_closing_brace(value: str, start: int) -> int:
+    depth = 1
+    for idx in range(start, len(value)):
+        if value[idx] == "{":
+            depth += 1
+        elif value[idx] == "}":
+            depth -= 1
+            if depth == 0:
+                return idx
+    raise UnsupportedComposeSyntax(f"Invalid interpolation: {value}")
+
+
+def interpolate_recursive(data: Any, environment: Mapping[str, str]) -> Any:
+    if isinstance(data, str):
+        return interpolate(data, environment)
+    if isinstance(data, dict):
+        return {k: interpolate_recursive(v, environment) for k, v in data.items()}
+    if isinstance(data, list):
+        return [interpolate_recursive(v, environment) for v in data]
+    return data
+
+
+def to_str(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def to_mapping(
+    data: Any, environment: Optional[Mapping[str, str]] = None
+) -> dict[str, Optional[str]]:
+    """
+    Convert lists of KEY=VALUE or mappings to dictionaries of strings.
+    Keys without a value are resolved from environment, if provided
+    """
+    output: dict[str, Optional[str]] = {}
+    if data is None:
+        return output
+    if isinstance(data, list):
+        for item in data:
+            if "=" in item:
+                key, value = item.split("=", 1)
+                output[key] = value
+            else:
+                output[item] = None
+    elif isinstance(data, dict):
+        output = {str(k): to_str(v) for k, v in data.items()}
+    else:
+        raise UnsupportedComposeSyntax(f"Invalid mapping: {data}")
+
+    if environment is not None:
+        for key, value in output.items():
+            if value is None and key in environment:
+                output[key] = environment[key]
+
+    return output
+
+
+def memory_to_bytes(value: Any) -> int:
+    if isinstance(value, int):
+        return value
+    m = MEMORY_REGEXP.match(str(value))
+    if not m:
+        raise UnsupportedComposeSyntax(f"Invalid memory value: {value}")
+    size = float(m.group(1))
+    if m.group(2):
+        size *= MEMORY_UNITS[m.group(2).lower()]
+    return int(size)
+
+
+def resolve_path(path: str, working_dir: Path) -> str:
+    if path.startswith("~"):
+        path = os.path.expanduser(path)
+    return os.path.normpath(working_dir.joinpath(path))
+
+
+def is_file_path(source: str) -> bool:
+    return source.startswith((".", "/", "~"))
+
+
+def normalize_ports(ports: list[Any]) -> list[dict[str, Any]]:
+    output: list[dict[str, Any]] = []
+    for port in ports:
+        if isinstance(port, dict):
+            p: dict[str, Any] = {"mode": "ingress", "protocol": "tcp", **port}
+            p["target"] = int(p["target"])
+            if p.get("published") is not None:
+                p["published"] = str(p["published"])
+            output.append(p)
+            continue
+
+        m = PORT_REGEXP.match(str(port))
+        if not m or "-" in m.group("target") or "-" in (m.group("published") or ""):
+            # port ranges are not supported
+            raise UnsupportedComposeSyntax(f"Unsupported port syntax: {port}")
+
+        p = {"mode": "ingress", "target": int(m.group("target"))}
+        if m.group("published"):
+            p["published"] = m.group("published")
+        if m.group("host_ip"):
+            p["host_ip"] = m.group("host_ip")
+        p["protocol"] = m.group("protocol") or "tcp"
+        output.append(p)
+
+    return output
+
+
+def normalize_volumes(volumes: list[Any], working_dir: Path) -> list[dict[str, Any]]:
+    output: list[dict[str, Any]] = []
+    for volume in volumes:
+        if isinstance(volume, dict):
+            v: dict[str, Any] = dict(volume)
+            if v.get("type") == "bind" and v.get("source"):
+                v["source"] = resolve_path(v["source"], working_dir)
+            output.append(v)
+            continue
+
+        parts = str(volume).split(":")
+        if len(parts) == 1:
+            output.append({"type": "volume", "target": parts[0], "volume": {}})
+            continue
+        if len(parts) > 3:
+            raise UnsupportedComposeSyntax(f"Unsupported volume syntax: {volume}")
+
+        source, target = parts[0], parts[1]
+        options = parts[2].split(",") if len(parts) == 3 else []
+        if any(o not in ("ro", "rw") for o in options):
+            raise UnsupportedComposeSyntax(f"Unsupported volume options: {volume}")
+
+        if is_file_path(source):
+            v = {
+                "type": "bind",
+                "source": resolve_path(source, working_dir),
+                "target": target,
+                "bind": {"create_host_path": True},
+            }
+        else:
+            v = {"type": "volume", "source": source, "target": target, "volume": {}}
+
+        if "ro" in options:
+            v["read_only"] = True
+        output.append(v)
+
+    return output
+
+
+def normalize_build(build: Any, working_dir: Path) -> dict[str, Any]:
+    if isinstance(build, str):
+        build = {"context": build}
+    output: dict[str, Any] = dict(build)
+    context = str(output.get("context", "."))
+    if "://" not in context and not context.startswith("git@"):
+        output["context"] = resolve_path(context, working_dir)
+    output.setdefault("dockerfile", "Dockerfile")
+    if "args" in output:
+        output["args"] = to_mapping(output["args"])
+    if "labels" in output:
+        output["labels"] = to_mapping(output["labels"])
+    return output
+
+
+def normalize_deploy(deploy: dict[str, Any]) -> dict[str, Any]:
+    deploy = dict(deploy)
+    if deploy.get("replicas") is not None:
+        deploy["replicas"] = int(deploy["replicas"])
+    if "labels" in deploy:
+        deploy["labels"] = to_mapping(deploy["labels"])
+    resources = deploy.get("resources")
+    if isinstance(resources, dict):
+        resources = dict(resources)
+        for key in ("limits", "reservations"):
+            res = resources.get(key)
+            if not isinstance(res, dict):
+                continue
+            res = dict(res)
+            if res.get("cpus") is not None:
+                res["cpus"] = float(res["cpus"])
+            if res.get("memory") is not None:
+                res["memory"] = memory_to_bytes(res["memory"])
+            resources[key] = res
+        deploy["resources"] = resources
+    return deploy
+
+
+def normalize_service(
+    name: str, service: Any, working_dir: Path, environment: Mapping[str, str]
+) -> dict[str, Any]:
+    """
+    Convert all short syntaxes to the canonical (long) syntax
+    """
+    if not isinstance(service, dict):
+        raise UnsupportedComposeSyntax(f"Invalid definition of service {name}")
+
+    for key in UNSUPPORTED_SERVICE_KEYS:
+        if key in service:
+            raise UnsupportedComposeSyntax(f"{key} is not supported (service {name})")
+
+    output: dict[str, Any] = {}
+    for key, value in service.items():
+        if key.startswith("x-"):
+            continue
+        if key == "build":
+            value = normalize_build(value, working_dir)
+        elif key in ("command", "entrypoint") and isinstance(value, str):
+            value = shlex.split(value)
+        elif key == "environment":
+            value = to_mapping(value, environment)
+        elif key == "labels":
+            value = to_mapping(value)
+        elif key == "expose":
+            value = [str(v) for v in value]
+        elif key == "ports":
+            value = normalize_ports(value)
+        elif key == "volumes":
+            value = normalize_volumes(value, working_dir)
+        elif key == "deploy" and value is not None:
+            value = normalize_deploy(value)
+        elif key == "networks" and isinstance(value, list):
+            value = {n: None for n in value}
+        elif key == "depends_on":
+            if isinstance(value, list):
+                value = {d: {"condition": "service_started"} for d in value}
+            value = {
+                d: {"condition": "service_started", "required": True, **(c or {})}
+                for d, c in value.items()
+            }
+        elif key == "healthcheck" and isinstance(value, dict):
+            if isinstance(value.get("test"), str):
+                value = {**value, "test": ["CMD-SHELL", value["test"]]}
+        output[key] = value
+
+    return output
+
+
+def merge(base: Any, override: Any) -> Any:
+    """
+    Generic merge: mappings are merged recursively, lists are appended
+    and any other value is replaced
+    """
+    if isinstance(base, dict) and isinstance(override, dict):
+        output = dict(base)
+        for key, value in override.items():
+            output[key] = merge(base[key], value) if key in base else value
+        return output
+    if isinstance(base, list) and isinstance(override, list):
+        return base + override
+    return override
+
+
+def merge_services(base: dict[str, Any], override: dict[str, Any]) -> dict[str, Any]:
+    output = dict(base)
+    for key, value in override.items():
+        if key not in base or key in OVERRIDDEN_KEYS or value is None:
+            output[key] = value
+        elif key in UNIQUE_LISTS:
+            output[key] = list(dict.fromkeys(base[key] + value))
+        elif key == "ports":
+            output[key] = base[key] + [p for p in value if p not in base[key]]
+        elif key == "volumes":
+            # volumes are merged by target path
+            volumes = {v["target"]: v for v in base[key]}
+            volumes.update({v["target"]: v for v in value})
+            output[key] = list(volumes.values())
+        elif key == "healthcheck":
+            output[key] = {**base[key], **value}
+        elif key == "logging" and base[key].get("driver") != value.get("driver"):
+            output[key] = value
+        else:
+            output[key] = merge(base[key], value)
+    return output
+
+
+def load_compose_file(path: Path) -> dict[str, Any]:
+    with open(path) as f:
+        try:
+            # nosec: ComposeLoader is a SafeLoader
+            data = yaml.load(f, Loader=ComposeLoader)  # nosec
+        except yaml.YAMLError as e:
+            raise UnsupportedComposeSyntax(f"Invalid file {path}: {e}")
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise UnsupportedComposeSyntax(f"Invalid file {path}")
+    return data
+
+
+def get_config(
+    files: list[Path], environment: Mapping[str, str], project_name: Optional[str]
+) -> dict[str, Any]:
+    """
+    Merge and interpolate the compose files, with the same output of
+    docker compose config --format json
+    """
+
+    if not files:
+        raise UnsupportedComposeSyntax("No compose file provided")
+
+    # Relative paths are resolved against the folder of the first file
+    working_dir = Path(os.path.abspath(files[0])).parent
+    project_name = project_name or environment.get("COMPOSE_PROJECT_NAME")
+    project_name = project_name or working_dir.name
+
+    config: dict[str, Any] = {"services": {}, "networks": {}, "volumes": {}}
+
+    for path in files:
+        data = load_compose_file(path)
+        for key in UNSUPPORTED_TOP_LEVEL_KEYS:
+            if key in data:
+                raise UnsupportedComposeSyntax(f"{key} is not supported ({path})")
+
+        data = interpolate_recursive(data, environment)
+
+        for name, service in (data.get("services") or {}).items():
+            service = normalize_service(name, service, working_dir, environment)
+            if name in config["services"]:
+                service = merge_services(config["services"][name], service)
+            config["services"][name] = service
+
+        for section in ("networks", "volumes"):
+            for name, definition in (data.get(section) or {}).items():
+                config[section][name] = merge(
+                    config[section].get(name) or {}, definition or {}
+                )
+
+    for section in ("networks", "volumes"):
+        for name, definition in config[section].items():
+            if not definition.get("external"):
+                definition.setdefault("name", f"{project_name}_{name}")
+
+    config["name"] = project_name
+    config["services"] = dict(sorted(config["services"].items()))
+    for service in config["services"].values():
+        if "environment" in service:
+            service["environment"] = dict(sorted(service["environment"].items()))
+
+    return config
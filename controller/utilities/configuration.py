@@ -1,7 +1,7 @@
 from copy import deepcopy
 from enum import Enum, IntEnum
 from pathlib import Path
-from typing import Annotated, Optional, TypedDict, Union, cast
+from typing import Annotated, Any, Optional, TypedDict, Union, cast
 
 import yaml
 from glom import glom
@@ -15,6 +15,16 @@
     log,
     print_and_exit,
 )
+from controller.utilities import profiler
+
+# libyaml bindings are much faster, but may be not available
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as YamlLoader  # type: ignore[assignment]
+
+# Parsed YAML files, by path, modification time and size
+YAML_CACHE: dict[tuple[str, int, int], "Configuration"] = {}
 
 PROJECTS_DEFAULTS_FILE = Path("projects_defaults.yaml")
 PROJECTS_PROD_DEFAULTS_FILE = Path("projects_prod_defaults.yaml")
@@ -521,6 +531,7 @@ class CustomConfigurationModel(BaseModel):
     variables: CustomVariablesModel
 
 
+@profiler.timed
 def read_configuration(
     default_file_path: Path,
     base_project_path: Path,
@@ -659,23 +670,32 @@ def load_yaml_file(
 ) -> Configuration:
     """
     Import any data from a YAML file.
+    Parsed files are cached, a copy is returned to allow changes by the caller
     """
 
-    if not file.exists():
+    try:
+        stat = file.stat()
+    except FileNotFoundError:
         if not is_optional:
             print_and_exit("Failed to read {}: File does not exist", file)
         return {}
 
+    key = (str(file.resolve()), stat.st_mtime_ns, stat.st_size)
+    if key in YAML_CACHE:
+        return deepcopy(YAML_CACHE[key])
+
     with open(file) as fh:
         try:
-            docs = list(yaml.safe_load_all(fh))
+            # nosec: YamlLoader is a SafeLoader
+            docs = list(yaml.load_all(fh, Loader=YamlLoader))  # nosec
 
             if not docs:
                 print_and_exit("YAML file is empty: {}", file)
 
-            # Return value of yaml.safe_load_all is un-annotated and considered as Any
+            # Return value of yaml.load_all is un-annotated and considered as Any
             # But we known that it is a Dict Configuration-compliant
-            return cast(Configuration, docs[0])
+            YAML_CACHE[key] = cast(Configuration, docs[0])
+            return deepcopy(YAML_CACHE[key])
 
         except Exception as e:
             # # IF dealing with a strange exception string (escaped)
@@ -685,6 +705,24 @@ def load_yaml_file(
             print_and_exit("Failed to read [{}]: {}", file, str(e))
 
 
+def read_yaml_version(file: Path) -> Any:
+    """
+    Read the top-level version key of a YAML file, without parsing the whole file
+    """
+    with open(file) as fh:
+        for line in fh:
+            if not line.startswith("version:"):
+                continue
+            try:
+                # nosec: YamlLoader is a SafeLoader
+                header = yaml.load(line, Loader=YamlLoader)  # nosec
+            except yaml.YAMLError:  # pragma: no cover
+                return None
+            return header.get("version") if isinstance(header, dict) else None
+    return None
+
+
+@profiler.timed
 def read_composer_yamls(config_files: list[Path]) -> tuple[list[Path], list[Path]]:
     base_files: list[Path] = []
     all_files: list[Path] = []
@@ -692,14 +730,17 @@ def read_composer_yamls(config_files: list[Path]) -> tuple[list[Path], list[Path
     # YAML CHECK UP
     for path in config_files:
         try:
-            # This is to verify that mandatory files exist and yml syntax is valid
-            conf = load_yaml_file(file=path, is_optional=False)
+            # This is to verify that mandatory files exist, while the syntax is
+            # verified when merged by compose. Only the version is read here
+            if not path.exists():
+                print_and_exit("Failed to read {}: File does not exist", path)
 
-            if conf.get("version") != COMPOSE_FILE_VERSION:  # pragma: no cover
+            version = read_yaml_version(path)
+            if version != COMPOSE_FILE_VERSION:  # pragma: no cover
                 log.warning(
                     "Compose file version in {} is {}, expected {}",
                     path,
-                    conf.get("version"),
+                    version,
                     COMPOSE_FILE_VERSION,
                 )
 
@@ -716,6 +757,7 @@ def read_composer_yamls(config_files: list[Path]) -> tuple[list[Path], list[Path
     return all_files, base_files
 
 
+@profiler.timed
 def validate_configuration(conf: Configuration, core: bool) -> None:
     if conf:
 
@@ -736,6 +778,7 @@ def validate_configuration(conf: Configuration, core: bool) -> None:
             print_and_exit(str(e))
 
 
+@profiler.timed
 def validate_env(env: dict[str, EnvType]) -> None:
     try:
         BaseEnvModel(**env)
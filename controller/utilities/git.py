@@ -9,6 +9,7 @@
 from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
 
 from controller import RED, SUBMODULES_DIR, log, print_and_exit
+from controller.utilities import probes
 
 MAX_FETCHED_COMMITS = 20
 
@@ -88,17 +89,31 @@ def switch_branch(gitobj: Optional[Repo], branch_name: str) -> bool:
     return True
 
 
+def prefetch_clone(url: str, path: Path) -> None:
+    """
+    Start the clone of a missing repository in background, to be completed by clone
+    """
+    local_path = SUBMODULES_DIR.joinpath(path)
+    if not local_path.exists():
+        probes.submit(
+            f"clone {local_path}", Repo.clone_from, url=url, to_path=local_path
+        )
+
+
 def clone(
     url: str, path: Path, branch: str, do: bool = False, check: bool = True
 ) -> Repo:
     local_path = SUBMODULES_DIR.joinpath(path)
+    probe = f"clone {local_path}"
 
-    if local_path.exists():
+    # The path is created as soon as a clone is started in background
+    # by prefetch_clone, its completion is to be waited anyway
+    if probes.is_submitted(probe) or (do and not local_path.exists()):
+        gitobj = probes.get(probe, Repo.clone_from, url=url, to_path=local_path)
+        log.info("Cloned {}@{} as {}", url, branch, path)
+    elif local_path.exists():
         log.debug("Path {} already exists", local_path)
         gitobj = Repo(local_path)
-    elif do:
-        gitobj = Repo.clone_from(url=url, to_path=local_path)
-        log.info("Cloned {}@{} as {}", url, branch, path)
     else:
         print_and_exit(
             "Repo {} missing as {}. You should init your project",
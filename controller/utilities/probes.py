@@ -0,0 +1,94 @@
+"""
+Independent blocking checks (external programs, docker, network) started in
+background at the beginning of the controller initialization.
+
+A probe only computes a value: the consumer retrieves it with get, exactly where the
+check used to be executed, and reports any error from the main thread.
+This way the wall-clock time is bounded by the slowest probe rather than their sum,
+while errors are raised in the same order as with a serial execution.
+If a probe was not submitted (or already consumed), get simply executes it inline.
+"""
+
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from controller import log
+
+T = TypeVar("T")
+
+# Probes are I/O bound, a small pool is enough to execute all of them at once
+MAX_WORKERS = 8
+
+EXECUTOR: Optional[ThreadPoolExecutor] = None
+PROBES: dict[str, "Future[Any]"] = {}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global EXECUTOR
+    if EXECUTOR is None:
+        EXECUTOR = ThreadPoolExecutor(
+            max_workers=MAX_WORKERS, thread_name_prefix="probe"
+        )
+    return EXECUTOR
+
+
+def reset() -> None:
+    # Results of a previous initialization are no longer valid
+    PROBES.clear()
+
+
+def reset_executor() -> None:
+    """
+    Executed by processes forked by rapydo daemon: threads of the pool
+    are not inherited, as well as the pending probes
+    """
+    global EXECUTOR
+    EXECUTOR = None
+    PROBES.clear()
+
+
+def submit(
+    name: str,
+    func: Callable[..., Any],
+    *args: Any,
+    depends_on: Iterable[str] = (),
+    **kwargs: Any,
+) -> None:
+    """
+    Start a probe in background, after the completion of its dependencies.
+    If a dependency fails, the probe is not executed and fails with the same error
+    """
+    if name in PROBES:
+        return
+
+    # Dependencies are always submitted before, i.e. are started first by the pool
+    dependencies = [PROBES[d] for d in depends_on if d in PROBES]
+
+    def probe() -> Any:
+        for dependency in dependencies:
+            dependency.result()
+        return func(*args, **kwargs)
+
+    log.debug("Starting probe: {}", name)
+    PROBES[name] = get_executor().submit(probe)
+
+
+def is_submitted(name: str) -> bool:
+    """
+    True if the probe was submitted and its result not yet retrieved
+    """
+    return name in PROBES
+
+
+def get(name: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Return the result of a probe (waiting for its completion), or execute it now.
+    Exceptions raised by the probe are raised here
+    """
+    future = PROBES.pop(name, None)
+    if future is None:
+        return func(*args, **kwargs)
+
+    result: T = future.result()
+    return result
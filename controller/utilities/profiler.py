@@ -0,0 +1,221 @@
+"""
+Timing breakdown of the controller execution, enabled by rapydo --profile
+
+Phases are measured by the timed decorator (a no-op unless the profiler is enabled),
+while external processes and HTTP requests are intercepted at the subprocess and
+requests level, to include calls made by python_on_whales, plumbum and GitPython
+"""
+
+import functools
+import json
+import os
+import subprocess
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar, cast
+
+from controller import log
+from controller.utilities.tables import print_table
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+PHASE = "phase"
+PROCESS = "process"
+HTTP = "http"
+
+# Long command lines are truncated in the timing table
+MAX_NAME_LENGTH = 80
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    start: float
+    end: float
+    thread: int
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+ENABLED = False
+PATCHED = False
+STARTED_AT = 0.0
+OUTPUT: Optional[Path] = None
+SPANS: list[Span] = []
+
+
+def enable(output: Optional[Path] = None) -> None:
+    global ENABLED, PATCHED, STARTED_AT, OUTPUT
+
+    # Patches are kept when disabled, they only collect spans while enabled.
+    # Enabled more times during tests, where the controller is invoked more times
+    if not PATCHED:
+        patch_subprocess()
+        patch_requests()
+        PATCHED = True
+
+    ENABLED = True
+    STARTED_AT = time.perf_counter()
+    OUTPUT = output
+    SPANS.clear()
+
+
+def disable() -> None:
+    global ENABLED
+    ENABLED = False
+
+
+def add_span(name: str, category: str, start: float, end: float) -> None:
+    if ENABLED:
+        SPANS.append(Span(name, category, start, end, threading.get_ident()))
+
+
+@contextmanager
+def span(name: str, category: str = PHASE) -> Iterator[None]:
+    if not ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, category, start, time.perf_counter())
+
+
+def timed(func: F) -> F:
+    """
+    Measure the execution time of the decorated function, if profiling is enabled
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not ENABLED:
+            return func(*args, **kwargs)
+
+        with span(func.__qualname__):
+            return func(*args, **kwargs)
+
+    return cast(F, wrapper)
+
+
+def get_command_name(args: Any) -> str:
+    if isinstance(args, (str, bytes, os.PathLike)):
+        name = os.fsdecode(args)
+    else:
+        name = " ".join(os.fsdecode(a) for a in args)
+
+    if len(name) > MAX_NAME_LENGTH:
+        name = f"{name[: MAX_NAME_LENGTH - 3]}..."
+    return name
+
+
+def patch_subprocess() -> None:
+    """
+    A process is measured from its creation to the first time its exit code
+    is collected, by either wait (also used by run and communicate) or poll
+    """
+
+    original_init = subprocess.Popen.__init__
+    original_wait = subprocess.Popen.wait
+    original_poll = subprocess.Popen.poll
+
+    def collect(process: "subprocess.Popen[Any]") -> None:
+        info = process.__dict__.pop("_profiler_span", None)
+        if info:
+            name, start = info
+            add_span(name, PROCESS, start, time.perf_counter())
+
+    def __init__(
+        process: "subprocess.Popen[Any]", args: Any, *a: Any, **kw: Any
+    ) -> None:
+        start = time.perf_counter()
+        original_init(process, args, *a, **kw)
+        if ENABLED:
+            process.__dict__["_profiler_span"] = (get_command_name(args), start)
+
+    def wait(process: "subprocess.Popen[Any]", timeout: Optional[float] = None) -> int:
+        returncode = original_wait(process, timeout)
+        collect(process)
+        return returncode
+
+    def poll(process: "subprocess.Popen[Any]") -> Optional[int]:
+        returncode = original_poll(process)
+        if returncode is not None:
+            collect(process)
+        return returncode
+
+    subprocess.Popen.__init__ = __init__  # type: ignore[method-assign,assignment]
+    subprocess.Popen.wait = wait  # type: ignore[method-assign,assignment]
+    subprocess.Popen.poll = poll  # type: ignore[method-assign,assignment]
+
+
+def patch_requests() -> None:
+    # Imported here to not slow down the startup when profiling is not enabled
+    import requests
+
+    original_request = requests.Session.request
+
+    @functools.wraps(original_request)
+    def request(
+        session: requests.Session, method: str, url: str, *a: Any, **kw: Any
+    ) -> requests.Response:
+        with span(f"{method.upper()} {url}", HTTP):
+            return original_request(session, method, url, *a, **kw)
+
+    requests.Session.request = request  # type: ignore[method-assign,assignment]
+
+
+def get_trace() -> dict[str, Any]:
+    """
+    Spans in the Chrome trace event format, to be opened with chrome://tracing
+    or https://ui.perfetto.dev
+    """
+    pid = os.getpid()
+    events = [
+        {
+            "name": s.name,
+            "cat": s.category,
+            "ph": "X",
+            "ts": round((s.start - STARTED_AT) * 1_000_000),
+            "dur": round(s.duration * 1_000_000),
+            "pid": pid,
+            "tid": s.thread,
+        }
+        for s in SPANS
+    ]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def report() -> None:
+    if not ENABLED:
+        return
+
+    total = time.perf_counter() - STARTED_AT
+    disable()
+
+    rows: list[list[str]] = []
+    for s in sorted(SPANS, key=lambda s: s.duration, reverse=True):
+        rows.append(
+            [
+                s.name,
+                s.category,
+                f"{s.duration * 1000:.1f} ms",
+                f"{100 * s.duration / total:.1f}%" if total else "",
+            ]
+        )
+    rows.append(["Total", "", f"{total * 1000:.1f} ms", "100.0%"])
+
+    print_table(["Name", "Type", "Time", "Share"], rows, table_title="Profile")
+
+    if OUTPUT:
+        with open(OUTPUT, "w") as f:
+            json.dump(get_trace(), f)
+        log.info("Profile saved in {}", OUTPUT)
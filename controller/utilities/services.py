@@ -1,9 +1,17 @@
+import hashlib
+import secrets
 import warnings
 from collections.abc import Iterable
+from importlib.metadata import version
 from typing import Optional, Union
 
 from controller import ComposeServices, EnvType, log, print_and_exit
 from controller.project import ANGULAR
+from controller.utilities import cache
+
+PASSWORD_SCORES_CACHE = "password-scores"
+# scrypt cost factor of the password keys (about 16MB of memory)
+PASSWORD_KEY_COST = 2**14
 
 
 def get_services(
@@ -54,6 +62,35 @@ def walk_services(
     return walk_services(actives, dependecies, index)
 
 
+def get_startup_waves(
+    services: list[str], dependencies: dict[str, list[str]]
+) -> list[list[str]]:
+    """
+    Split the services in waves to be started in order: each service only
+    depends on services included in previous waves (dependencies on services
+    not to be started are ignored). Services in a dependency cycle, if any,
+    are started together in the last wave
+    """
+    pending = {
+        service: {d for d in dependencies.get(service, []) if d in services}
+        for service in services
+    }
+    waves: list[list[str]] = []
+    while pending:
+        wave = sorted(s for s, deps in pending.items() if not deps)
+        if not wave:
+            log.warning("Circular dependencies between {}", ", ".join(sorted(pending)))
+            wave = sorted(pending)
+
+        waves.append(wave)
+        for service in wave:
+            pending.pop(service)
+        for deps in pending.values():
+            deps.difference_update(wave)
+
+    return waves
+
+
 def find_active(services: ComposeServices) -> list[str]:
     """
     Check only services involved in current mode,
@@ -176,6 +213,57 @@ def check_redis_password(pwd: Optional[EnvType]) -> None:
             )
 
 
+def get_password_key(passwords: list[str], salt: str) -> str:
+    """
+    Key derived from the whole set of passwords, scrypt is deliberately slow
+    to make the cached keys expensive to be brute-forced
+    """
+    return hashlib.scrypt(
+        "\0".join(passwords).encode(),
+        salt=bytes.fromhex(salt),
+        n=PASSWORD_KEY_COST,
+        r=8,
+        p=1,
+    ).hex()
+
+
+def get_password_scores(
+    passwords: Iterable[str], refresh: bool = False
+) -> dict[str, int]:
+    """
+    zxcvbn scores of the given passwords. Scores are cached by a key derived
+    from all the passwords, that are never saved, so that a single key is
+    computed per execution. zxcvbn is only imported on cache misses
+    """
+    unique_passwords = sorted(set(passwords))
+    if not unique_passwords:
+        return {}
+
+    fingerprint = cache.get_fingerprint(version("zxcvbn"))
+    cached = None if refresh else cache.load(PASSWORD_SCORES_CACHE, fingerprint)
+
+    salt: str = cached["salt"] if cached else secrets.token_hex(16)
+    key = get_password_key(unique_passwords, salt)
+
+    if cached and cached.get("key") == key:
+        log.debug("Password scores: cache hit")
+        return dict(zip(unique_passwords, cached["scores"]))
+
+    log.debug("Password scores: cache miss")
+
+    # Slow to be imported, only needed on cache misses
+    from zxcvbn import zxcvbn  # type: ignore
+
+    scores = {p: int(zxcvbn(p)["score"]) for p in unique_passwords}
+    cache.save(
+        PASSWORD_SCORES_CACHE,
+        fingerprint,
+        {"salt": salt, "key": key, "scores": list(scores.values())},
+    )
+
+    return scores
+
+
 def get_default_user(service: str) -> Optional[str]:
     if service in ["backend", "celery", "flower", "celerybeat"]:
         return "developer"
@@ -2,7 +2,7 @@
 from rich.table import Table
 
 
-def print_table(headers: list[str], rows: list[list[str]], table_title: str) -> None:
+def get_table(headers: list[str], rows: list[list[str]], table_title: str) -> Table:
     table = Table(title=table_title)
 
     for header in headers:
@@ -11,5 +11,9 @@ def print_table(headers: list[str], rows: list[list[str]], table_title: str) ->
     for row in rows:
         table.add_row(*row)
 
+    return table
+
+
+def print_table(headers: list[str], rows: list[list[str]], table_title: str) -> None:
     console = Console()
-    console.print(table)
+    console.print(get_table(headers, rows, table_title))
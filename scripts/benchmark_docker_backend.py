@@ -0,0 +1,69 @@
+"""
+Compare the docker backends (RAPYDO_DOCKER_BACKEND) on the queries executed
+by the Docker wrapper, e.g. by rapydo status and verify_available_images
+
+Usage: python scripts/benchmark_docker_backend.py [image ...] [--repeat N]
+"""
+
+import sys
+import time
+from typing import Any, Callable
+
+from python_on_whales import DockerClient
+
+from controller import print_and_exit
+from controller.deploy.engine import DEFAULT_HOST, APIEngine, CLIEngine, Engine
+from controller.utilities.tables import print_table
+
+if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+    print(__doc__)
+    sys.exit(0)
+
+args = sys.argv[1:]
+repeat = 10
+if "--repeat" in args:
+    index = args.index("--repeat")
+    try:
+        repeat = int(args[index + 1])
+    except (IndexError, ValueError):
+        print_and_exit("Invalid --repeat value")
+    del args[index : index + 2]
+
+images = args or ["alpine:latest"]
+
+engines: list[Engine] = [CLIEngine(DockerClient()), APIEngine(DEFAULT_HOST)]
+
+containers = engines[0].list_containers(all=True)
+container = containers[0].name if containers else "missing"
+
+queries: dict[str, Callable[[Engine], Any]] = {
+    "list running containers": lambda e: e.list_containers(),
+    "list all containers": lambda e: e.list_containers(all=True),
+    f"container status ({container})": lambda e: e.get_container_status(container),
+    f"image exists (x{len(images)})": lambda e: [e.image_exists(i) for i in images],
+}
+
+rows: list[list[str]] = []
+for name, query in queries.items():
+    timings: list[float] = []
+    for engine in engines:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query(engine)
+        timings.append((time.perf_counter() - start) / repeat)
+
+    cli, api = timings
+    rows.append(
+        [
+            name,
+            f"{cli * 1000:.1f} ms",
+            f"{api * 1000:.1f} ms",
+            f"{cli / api:.1f}x" if api else "",
+        ]
+    )
+
+print_table(
+    ["Query", "cli", "api", "Speedup"],
+    rows,
+    table_title=f"Docker backends, mean of {repeat} executions",
+)
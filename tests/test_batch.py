@@ -0,0 +1,77 @@
+"""
+This module will test the batch command
+"""
+
+from faker import Faker
+
+from tests import (
+    Capture,
+    create_project,
+    exec_command,
+    execute_outside,
+    init_project,
+    random_project_name,
+)
+
+
+def test_batch(capfd: Capture, faker: Faker) -> None:
+    execute_outside(capfd, "batch version")
+    create_project(
+        capfd=capfd,
+        name=random_project_name(faker),
+        auth="postgres",
+        frontend="no",
+    )
+    init_project(capfd)
+
+    exec_command(
+        capfd,
+        "batch",
+        "No command to be executed",
+    )
+
+    exec_command(
+        capfd,
+        "batch 'list env' invalid",
+        "No such command 'invalid'",
+    )
+
+    exec_command(
+        capfd,
+        "batch 'create myproject'",
+        "Command create can't be executed in a batch",
+    )
+
+    exec_command(
+        capfd,
+        "batch -- '--prod status'",
+        "options of rapydo can only be set on the batch",
+    )
+
+    exec_command(
+        capfd,
+        "batch 'list env' 'rapydo list submodules' '# a comment' 'list services'",
+        "Executing: rapydo list env",
+        "List of env variables:",
+        "Executing: rapydo list submodules",
+        "List of submodules:",
+        "Executing: rapydo list services",
+        "List of active services:",
+        "Project already initialized",
+        "All commands executed",
+    )
+
+    # Password can change the configuration, the project is initialized again
+    exec_command(
+        capfd,
+        "batch password 'list env'",
+        "Configuration changed by password",
+        "List of env variables:",
+        "All commands executed",
+    )
+
+    exec_command(
+        capfd,
+        "batch --file missing.txt",
+        "File not found: missing.txt",
+    )
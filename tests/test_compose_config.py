@@ -0,0 +1,181 @@
+"""
+This module will test the native merge and interpolation of compose files
+"""
+
+import itertools
+from pathlib import Path
+
+import pytest
+from faker import Faker
+from python_on_whales.components.compose.models import ComposeConfig
+
+from controller import CONFS_DIR
+from controller.deploy.docker import Docker
+from controller.utilities import compose
+from controller.utilities.compose import UnsupportedComposeSyntax
+from tests import Capture, create_project, init_project, random_project_name
+
+
+def test_interpolation() -> None:
+    env = {"A": "a", "EMPTY": ""}
+
+    assert compose.interpolate("no variables", env) == "no variables"
+    assert compose.interpolate("$A", env) == "a"
+    assert compose.interpolate("${A}", env) == "a"
+    assert compose.interpolate("x${A}x$A", env) == "xaxa"
+    assert compose.interpolate("$$A", env) == "$A"
+    assert compose.interpolate("${MISSING}", env) == ""
+
+    assert compose.interpolate("${MISSING:-default}", env) == "default"
+    assert compose.interpolate("${EMPTY:-default}", env) == "default"
+    assert compose.interpolate("${EMPTY-default}", env) == ""
+    assert compose.interpolate("${A:-default}", env) == "a"
+    assert compose.interpolate("${MISSING:-${A}}", env) == "a"
+
+    assert compose.interpolate("${A:+alt}", env) == "alt"
+    assert compose.interpolate("${EMPTY:+alt}", env) == ""
+    assert compose.interpolate("${EMPTY+alt}", env) == "alt"
+    assert compose.interpolate("${MISSING+alt}", env) == ""
+
+    assert compose.interpolate("${A:?required}", env) == "a"
+    assert compose.interpolate("${EMPTY?required}", env) == ""
+    with pytest.raises(UnsupportedComposeSyntax):
+        compose.interpolate("${EMPTY:?required}", env)
+    with pytest.raises(UnsupportedComposeSyntax):
+        compose.interpolate("${MISSING?required}", env)
+    with pytest.raises(UnsupportedComposeSyntax):
+        compose.interpolate("${A", env)
+
+
+def test_normalization(tmp_path: Path) -> None:
+    assert compose.memory_to_bytes("512") == 512
+    assert compose.memory_to_bytes("1k") == 1024
+    assert compose.memory_to_bytes("512M") == 536870912
+    assert compose.memory_to_bytes("1.5GB") == 1610612736
+
+    assert compose.normalize_ports(["80", "8080:80", "127.0.0.1:8080:80/udp"]) == [
+        {"mode": "ingress", "target": 80, "protocol": "tcp"},
+        {"mode": "ingress", "target": 80, "published": "8080", "protocol": "tcp"},
+        {
+            "mode": "ingress",
+            "target": 80,
+            "published": "8080",
+            "host_ip": "127.0.0.1",
+            "protocol": "udp",
+        },
+    ]
+    with pytest.raises(UnsupportedComposeSyntax):
+        compose.normalize_ports(["8000-8010:8000-8010"])
+
+    assert compose.normalize_volumes(
+        ["vol:/data", "./x:/x:ro", "/anonymous"], tmp_path
+    ) == [
+        {"type": "volume", "source": "vol", "target": "/data", "volume": {}},
+        {
+            "type": "bind",
+            "source": str(tmp_path.joinpath("x")),
+            "target": "/x",
+            "bind": {"create_host_path": True},
+            "read_only": True,
+        },
+        {"type": "volume", "target": "/anonymous", "volume": {}},
+    ]
+
+    base = tmp_path.joinpath("base.yml")
+    base.write_text(
+        """
+services:
+  x:
+    image: ${IMAGE}
+    command: echo "hello world"
+    environment:
+      A: 1
+      B: yes
+      C:
+    ports:
+      - 7777:80
+    volumes:
+      - vol:/data
+    deploy:
+      replicas: ${REPLICAS}
+"""
+    )
+    override = tmp_path.joinpath("override.yml")
+    override.write_text(
+        """
+services:
+  x:
+    command: ["echo", "bye"]
+    environment:
+      - B=no
+      - D=2
+    volumes:
+      - ./data:/data
+    deploy:
+      resources:
+        reservations:
+          memory: 1G
+"""
+    )
+
+    env = {"IMAGE": "alpine", "REPLICAS": "2", "C": "c"}
+    config = compose.get_config([base, override], env, "test")
+    service = config["services"]["x"]
+    assert service["image"] == "alpine"
+    assert service["command"] == ["echo", "bye"]
+    assert service["environment"] == {"A": "1", "B": "no", "C": "c", "D": "2"}
+    assert service["ports"] == [
+        {"mode": "ingress", "target": 80, "published": "7777", "protocol": "tcp"}
+    ]
+    assert service["volumes"] == [
+        {
+            "type": "bind",
+            "source": str(tmp_path.joinpath("data")),
+            "target": "/data",
+            "bind": {"create_host_path": True},
+        }
+    ]
+    assert service["deploy"]["replicas"] == 2
+    assert service["deploy"]["resources"]["reservations"]["memory"] == 1073741824
+
+    override.write_text("services:\n  x:\n    extends: y\n")
+    with pytest.raises(UnsupportedComposeSyntax):
+        compose.get_config([base, override], env, "test")
+
+
+def test_compose_config(capfd: Capture, faker: Faker) -> None:
+    create_project(
+        capfd=capfd,
+        name=random_project_name(faker),
+        auth="postgres",
+        frontend="angular",
+    )
+    init_project(capfd)
+
+    # All combinations of files loaded by get_compose_configuration
+    for swarm, nfs, production in itertools.product([False, True], repeat=3):
+        files = [CONFS_DIR.joinpath("backend.yml"), CONFS_DIR.joinpath("angular.yml")]
+        if swarm and production:
+            files.append(CONFS_DIR.joinpath("swarm_angular_prod_options.yml"))
+        if swarm:
+            files.append(CONFS_DIR.joinpath("swarm_options.yml"))
+        files.append(
+            CONFS_DIR.joinpath("volumes_nfs.yml" if nfs else "volumes_local.yml")
+        )
+        if production:
+            files.append(CONFS_DIR.joinpath("production.yml"))
+        else:
+            files.append(CONFS_DIR.joinpath("development.yml"))
+            files.append(CONFS_DIR.joinpath("angular-development.yml"))
+
+        docker = Docker(compose_files=files, verify_swarm=False)
+
+        cli_config = docker.client.compose.config(return_json=False)
+        # get_config would silently fall back to the CLI on unsupported syntax
+        native_config = ComposeConfig(**docker.compose.get_native_config())
+
+        assert cli_config.services
+        assert native_config.services
+        assert list(native_config.services) == list(cli_config.services)
+        for name, service in cli_config.services.items():
+            assert native_config.services[name].model_dump() == service.model_dump()
@@ -2,6 +2,8 @@
 This module will test the dump command
 """
 
+from pathlib import Path
+
 from faker import Faker
 
 from tests import (
@@ -30,3 +32,17 @@ def test_dump(capfd: Capture, faker: Faker) -> None:
         "dump",
         "Config dump: docker-compose.yml",
     )
+
+    # The compose file is not rewritten when unchanged
+    compose_file = Path("docker-compose.yml")
+    content = compose_file.read_bytes()
+    mtime = compose_file.stat().st_mtime_ns
+
+    exec_command(
+        capfd,
+        "dump",
+        "Config dump: docker-compose.yml",
+    )
+
+    assert compose_file.read_bytes() == content
+    assert compose_file.stat().st_mtime_ns == mtime
@@ -3,27 +3,69 @@
 to verify cases not easly testable through cli commands
 """
 
+import json
 import os
 import re
+import socket
 import tempfile
-from datetime import datetime
+import threading
+import time
+from collections.abc import Iterator
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union, cast
 
 import pytest
 from faker import Faker
 from packaging.version import Version
+from python_on_whales.components.compose.models import ComposeConfigService
+from python_on_whales.exceptions import NoSuchService
+from python_on_whales.utils import DockerException
 
-from controller import __version__
+from controller import __version__, completion, daemon
 from controller.app import Application, Configuration
+from controller.commands import (
+    BACKUP_MODULES,
+    COMMANDS_FOLDER,
+    get_manifest,
+    load_commands,
+    parse_commands,
+)
 from controller.commands.backup import get_date_pattern
 from controller.commands.password import get_projectrc_variables_indentation
+from controller.deploy import events, ssh
 from controller.deploy.builds import get_image_creation
+from controller.deploy.compose_v2 import Compose
 from controller.deploy.docker import Docker
+from controller.deploy.engine import (
+    DEFAULT_HOST,
+    APIEngine,
+    CLIEngine,
+    ContainerInfo,
+    TaskInfo,
+    create_engine,
+    parse_timestamp,
+)
+from controller.deploy.events import ServiceState
+from controller.deploy.logs import (
+    LogLevels,
+    LogLine,
+    LogsMultiplexer,
+    LogsWriter,
+    get_time_bound,
+    get_timestamp_key,
+    parse_compose_line,
+    parse_line,
+)
+from controller.deploy.swarm import Swarm
 from controller.packages import ExecutionException, Packages
 from controller.templating import Templating
-from controller.utilities import git, services, system
-from controller.utilities.configuration import load_yaml_file, mix_configuration
+from controller.utilities import cache, git, probes, profiler, services, system
+from controller.utilities.configuration import (
+    load_yaml_file,
+    mix_configuration,
+    read_yaml_version,
+)
 from tests import Capture, create_project, init_project, random_project_name
 
 
@@ -203,6 +245,22 @@ def test_load_yaml_file() -> None:
         load_yaml_file(file=Path(f.name))
     f.close()
 
+    # Parsed files are cached, but changes of the returned values are not
+    f = tempfile.NamedTemporaryFile(suffix=".yaml")
+    path = Path(f.name)
+    path.write_text("version: '3.9'\nproject:\n  title: x\n")
+    y = load_yaml_file(file=path)
+    assert y == {"version": "3.9", "project": {"title": "x"}}
+    y["project"]["title"] = "changed"
+    assert load_yaml_file(file=path)["project"]["title"] == "x"
+
+    assert read_yaml_version(path) == "3.9"
+    path.write_text("services: {}\n")
+    assert read_yaml_version(path) is None
+    # The file is changed, the cache is invalidated
+    assert load_yaml_file(file=path) == {"services": {}}
+    f.close()
+
 
 def test_mix_configuration() -> None:
     y = mix_configuration(None, None)
@@ -279,6 +337,202 @@ def test_get_default_command() -> None:
     assert "redis-cli --pass" in services.get_default_command("redis")
 
 
+def test_get_startup_waves() -> None:
+    dependencies = {
+        "backend": ["postgres", "redis"],
+        "celery": ["backend", "rabbit"],
+        "proxy": ["backend", "frontend"],
+        "postgres": [],
+    }
+    assert services.get_startup_waves([], dependencies) == []
+    assert services.get_startup_waves(
+        ["backend", "celery", "postgres", "rabbit", "redis"], dependencies
+    ) == [["postgres", "rabbit", "redis"], ["backend"], ["celery"]]
+    # Dependencies on services not to be started are ignored
+    assert services.get_startup_waves(["proxy", "celery"], dependencies) == [
+        ["celery", "proxy"]
+    ]
+    # Dependencies are started too when included by walk_services
+    required = services.walk_services(["backend"], dependencies)
+    assert services.get_startup_waves(required, dependencies) == [
+        ["postgres", "redis"],
+        ["backend"],
+    ]
+    # Circular dependencies are started in the last wave
+    assert services.get_startup_waves(
+        ["a", "b", "c", "d"], {"a": ["b"], "b": ["a"], "c": ["d"]}
+    ) == [["d"], ["c"], ["a", "b"]]
+
+
+def test_get_deploy_plan() -> None:
+    config = {"image": "rapydo/backend:2.4", "environment": {"A": "1", "B": "2"}}
+    config_hash = Swarm.get_config_hash(config)
+    # The hash does not depend on the order of the keys
+    assert config_hash == Swarm.get_config_hash(
+        {"environment": {"B": "2", "A": "1"}, "image": "rapydo/backend:2.4"}
+    )
+    assert config_hash != Swarm.get_config_hash({**config, "image": "x"})
+
+    hashes = {"backend": config_hash, "proxy": "p1", "redis": "r1", "new": "n1"}
+    deployed = {"backend": config_hash, "proxy": "p0", "redis": "r1", "old": "o1"}
+    assert Swarm.get_deploy_plan(hashes, deployed, set()) == {
+        "backend": "unchanged",
+        "proxy": "updated",
+        "redis": "unchanged",
+        "new": "created",
+        "old": "removed",
+    }
+    assert Swarm.get_deploy_plan(hashes, deployed, {"redis"})["redis"] == "updated"
+    # Services deployed without the hash label are always updated
+    assert Swarm.get_deploy_plan(hashes, {"redis": None}, set())["redis"] == "updated"
+
+    replicated = {"Replicated": {"Replicas": 1}}
+    assert not Swarm.is_scale_changed({}, replicated)
+    assert not Swarm.is_scale_changed({"deploy": {"replicas": "1"}}, replicated)
+    assert Swarm.is_scale_changed({"deploy": {"replicas": 2}}, replicated)
+    assert Swarm.is_scale_changed({}, {"Replicated": {"Replicas": 3}})
+    assert Swarm.is_scale_changed({}, {"Global": {}})
+    assert not Swarm.is_scale_changed({"deploy": {"mode": "global"}}, {"Global": {}})
+    assert Swarm.is_scale_changed({"deploy": {"mode": "global"}}, replicated)
+
+
+def test_get_restart_batches() -> None:
+    assert Swarm.get_restart_batches([], 2) == []
+    waves = [["postgres", "rabbit", "redis"], ["backend"], ["celery", "proxy"]]
+    assert Swarm.get_restart_batches(waves, 1) == [
+        ["postgres"],
+        ["rabbit"],
+        ["redis"],
+        ["backend"],
+        ["celery"],
+        ["proxy"],
+    ]
+    # Batches never include services of different waves
+    assert Swarm.get_restart_batches(waves, 2) == [
+        ["postgres", "rabbit"],
+        ["redis"],
+        ["backend"],
+        ["celery", "proxy"],
+    ]
+    assert Swarm.get_restart_batches(waves, 5) == waves
+
+
+def test_logs_parsing() -> None:
+    assert (
+        get_timestamp_key("2024-01-02T03:04:05.5Z") == "2024-01-02T03:04:05.500000000"
+    )
+    assert get_timestamp_key("2024-01-02T03:04:05Z") == "2024-01-02T03:04:05.000000000"
+    # Trailing zeros are omitted by the engine
+    assert get_timestamp_key("2024-01-02T03:04:05.5Z") > get_timestamp_key(
+        "2024-01-02T03:04:05.25Z"
+    )
+
+    line = parse_line(
+        "backend", b"2024-01-02T03:04:05.5Z first_backend.2@node1    | a | b\n", "first"
+    )
+    assert line is not None
+    assert line.service == "backend"
+    assert line.task == "backend.2"
+    assert line.timestamp == "2024-01-02T03:04:05.5Z"
+    assert line.message == "a | b"
+
+    assert parse_line("backend", "invalid", "first") is None
+
+    line = parse_compose_line(
+        b"first-backend-1  | 2024-01-02T03:04:05.5Z a | b\n", "first"
+    )
+    assert line.service == "backend"
+    assert line.task == "backend-1"
+    assert line.timestamp == "2024-01-02T03:04:05.5Z"
+    assert line.message == "a | b"
+    assert parse_compose_line("invalid", "first").message == "invalid"
+
+
+def test_logs_filters(capfd: Capture) -> None:
+    now = datetime.now(timezone.utc)
+    since = get_time_bound("1h30m")
+    assert since is not None
+    assert 5399 <= (now - since).total_seconds() <= 5401
+    assert get_time_bound("2024-01-02T03:04:05Z") == datetime(
+        2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc
+    )
+    assert get_time_bound("2024-01-02T03:04:05") is not None
+    assert get_time_bound("") is None
+    assert get_time_bound("invalid") is None
+
+    writer = LogsWriter(["backend"], [], level=LogLevels.WARNING)
+    for message in (
+        "2024-01-02 03:04:05,000 INFO     skipped",
+        "2024-01-02 03:04:05,000 [ERROR restapi:12] shown",
+        "Traceback (most recent call last):",
+        "2024-01-02 03:04:05,000 WARNING  shown again",
+        "2024-01-02 03:04:05,000 DEBUG    skipped again",
+    ):
+        writer.write(LogLine("backend", "backend.1", "2024-01-02T03:04:05Z", message))
+    # Lines are buffered
+    assert not capfd.readouterr()[0]
+    writer.flush()
+    out = capfd.readouterr()[0].splitlines()
+    assert out == [
+        "2024-01-02 03:04:05,000 [ERROR restapi:12] shown",
+        "Traceback (most recent call last):",
+        "2024-01-02 03:04:05,000 WARNING  shown again",
+    ]
+
+    writer = LogsWriter(["backend"], [], json_output=True, grep=re.compile("b+c"))
+    writer.write(LogLine("backend", "backend.1", "2024-01-02T03:04:05Z", "abbc"))
+    writer.write(LogLine("backend", "backend.1", "2024-01-02T03:04:05Z", "ac"))
+    writer.flush()
+    out = capfd.readouterr()[0].splitlines()
+    assert len(out) == 1
+    assert json.loads(out[0]) == {
+        "service": "backend",
+        "task": "backend.1",
+        "timestamp": "2024-01-02T03:04:05Z",
+        "level": None,
+        "message": "abbc",
+    }
+
+    # Followed streams are closed once the --until time is passed
+    def read_forever() -> Iterator[LogLine]:
+        yield LogLine("backend", "backend.1", "2024-01-02T03:04:05Z", "last")
+        threading.Event().wait()
+
+    multiplexer = LogsMultiplexer(
+        cast(Docker, None),
+        LogsWriter(["backend"], []),
+        follow=True,
+        tail=0,
+        until=datetime.now(timezone.utc),
+    )
+    assert not LogsMultiplexer(
+        cast(Docker, None), writer, follow=False, tail=0, until=now
+    ).is_expired()
+    multiplexer.run({"backend": read_forever})
+    assert multiplexer.is_expired()
+    assert capfd.readouterr()[0].splitlines() == ["last"]
+
+    # Missing services are fatal, unless following the logs
+    class MissingService:
+        def __init__(self) -> None:
+            # stands for both docker.client and docker.client.service
+            self.client = self
+            self.service = self
+
+        def get_service(self, service: str) -> str:
+            return service
+
+        def logs(self, *args: str, **kwargs: str) -> None:
+            raise NoSuchService(["docker", "service", "logs"], 1)
+
+    multiplexer = LogsMultiplexer(
+        cast(Docker, MissingService()), writer, follow=False, tail=0
+    )
+    with pytest.raises(SystemExit):
+        multiplexer.swarm_logs(["backend"])
+    assert multiplexer.missing == ["backend"]
+
+
 def test_get_templating() -> None:
     templating = Templating()
 
@@ -537,3 +791,600 @@ def test_get_projectrc_variables_indentation() -> None:
     )
 
     assert get_projectrc_variables_indentation(projectrc) == 12
+
+
+def test_cache(faker: Faker) -> None:
+    name = faker.pystr()
+    data = {"key": faker.pystr(), "values": [1, 2, 3]}
+
+    assert cache.load(name, "fingerprint") is None
+
+    cache.save(name, "fingerprint", data)
+    assert cache.load(name, "fingerprint") == data
+    assert cache.load(name, "another-fingerprint") is None
+
+    cache.clear(name)
+    assert cache.load(name, "fingerprint") is None
+    # Clearing a missing cache is not an error
+    cache.clear(name)
+
+    f1 = cache.get_fingerprint("a", {"b": 1, "c": 2})
+    f2 = cache.get_fingerprint("a", {"c": 2, "b": 1})
+    f3 = cache.get_fingerprint("a", {"b": 1, "c": 3})
+    assert f1 == f2
+    assert f1 != f3
+
+    compose_file = Path(tempfile.NamedTemporaryFile(suffix=".yml").name)
+    compose_file.write_text("services:\n  x:\n    image: ${RAPYDO_TEST_VAR}\n")
+    env_file = Path(tempfile.NamedTemporaryFile().name)
+
+    f1 = cache.get_compose_fingerprint([compose_file], env_file)
+    assert f1 == cache.get_compose_fingerprint([compose_file], env_file)
+
+    # Variables from the shell environment are part of the fingerprint
+    os.environ["RAPYDO_TEST_VAR"] = faker.pystr()
+    f2 = cache.get_compose_fingerprint([compose_file], env_file)
+    assert f1 != f2
+    os.environ.pop("RAPYDO_TEST_VAR")
+
+    env_file.write_text("X=1\n")
+    f3 = cache.get_compose_fingerprint([compose_file], env_file)
+    assert f3 not in (f1, f2)
+
+    hashes = cache.get_files_hashes([compose_file, env_file])
+    assert len(hashes) == 2
+    assert hashes == cache.get_files_hashes([compose_file, env_file])
+    env_file.write_text("X=2\n")
+    assert hashes[0] == cache.get_files_hashes([compose_file, env_file])[0]
+    assert hashes[1] != cache.get_files_hashes([compose_file, env_file])[1]
+
+    compose_file.unlink()
+    env_file.unlink()
+    assert cache.get_files_hashes([compose_file]) == [None]
+
+    services = {
+        "x": ComposeConfigService(
+            image="alpine",
+            environment={"A": "1"},
+            ports=[{"mode": "ingress", "target": 80, "published": 8080}],
+        )
+    }
+    assert cache.load_services(cache.dump_services(services)) == services
+
+
+def test_commands_manifest() -> None:
+    load_commands(None)
+
+    manifest = get_manifest()
+    assert "status" in manifest
+    assert manifest["status"]["help"] == "Show current services status"
+    assert manifest["status"]["path"].endswith("status.py")
+    assert "scale" in manifest
+    assert "version" in manifest
+
+    commands = parse_commands(COMMANDS_FOLDER.joinpath("backup.py"))
+    assert list(commands) == ["backup"]
+    assert commands["backup"]["help"] == "Execute a backup of one service"
+    assert not commands["backup"]["dynamic"]
+    assert not commands["backup"]["interactive"]
+    assert manifest["shell"]["interactive"]
+    assert not manifest["status"]["interactive"]
+
+    params = {p["name"]: p for p in manifest["check"]["params"]}
+    assert params["ignore_submodules"] == {
+        "name": "ignore_submodules",
+        "kind": "option",
+        "multiple": True,
+        "flag": False,
+        "complete": "autocomplete_submodule",
+        "flags": ["--ignore-submodule", "-i"],
+    }
+    assert params["no_git"]["flag"]
+    assert manifest["logs"]["params"][0]["kind"] == "argument"
+    assert manifest["logs"]["params"][0]["complete"] == "autocomplete_service"
+
+    # Plugin modules are only loaded at the first access
+    assert BACKUP_MODULES.modules is None
+    assert "postgres" in BACKUP_MODULES
+    assert BACKUP_MODULES.modules is not None
+    load_commands(None)
+    assert BACKUP_MODULES.modules is None
+
+
+def test_profiler(capfd: Capture) -> None:
+    @profiler.timed
+    def phase() -> int:
+        return Packages.execute_command("echo", ["profiled"]).count("profiled")
+
+    # Disabled: nothing is collected
+    assert phase() == 1
+    assert not profiler.SPANS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp, "trace.json")
+        profiler.enable(output)
+
+        assert phase() == 1
+        names = [s.name for s in profiler.SPANS]
+        assert "test_profiler.<locals>.phase" in names
+        assert any(
+            s.category == profiler.PROCESS and "profiled" in s.name
+            for s in profiler.SPANS
+        )
+
+        profiler.report()
+        assert not profiler.ENABLED
+
+        trace = json.loads(output.read_text())
+        events = trace["traceEvents"]
+        assert len(events) == len(names)
+        assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+
+    out = capfd.readouterr()[0]
+    assert "Profile" in out
+    assert "test_profiler.<locals>.phase" in out
+    assert "Total" in out
+
+
+def test_probes() -> None:
+    probes.reset()
+
+    calls: list[str] = []
+
+    def probe(value: str) -> str:
+        calls.append(value)
+        return value
+
+    def failing_probe() -> None:
+        raise ExecutionException("failed")
+
+    # Not submitted: executed inline
+    assert probes.get("inline", probe, "x") == "x"
+    assert calls == ["x"]
+
+    assert not probes.is_submitted("first")
+    probes.submit("first", probe, "a")
+    probes.submit("second", probe, "b", depends_on=["first"])
+    assert probes.is_submitted("first")
+    # Already submitted, ignored
+    probes.submit("first", probe, "c")
+    assert probes.get("second", probe, "ignored") == "b"
+    assert probes.get("first", probe, "ignored") == "a"
+    assert not probes.is_submitted("first")
+    assert sorted(calls) == ["a", "b", "x"]
+
+    # Results are only consumed once, then executed again
+    assert probes.get("first", probe, "d") == "d"
+
+    probes.submit("failing", failing_probe)
+    probes.submit("dependent", probe, "e", depends_on=["failing"])
+    with pytest.raises(ExecutionException, match="failed"):
+        probes.get("dependent", probe, "ignored")
+    with pytest.raises(ExecutionException, match="failed"):
+        probes.get("failing", failing_probe)
+    assert "e" not in calls
+
+    probes.submit("reset", probe, "f")
+    probes.reset()
+    assert probes.get("reset", probe, "g") == "g"
+
+
+def test_host_facts(faker: Faker) -> None:
+    name = faker.pystr()
+    values = iter(["v1", "v2", "v3", "v4"])
+
+    def fact() -> str:
+        return next(values)
+
+    binary = Path(tempfile.NamedTemporaryFile().name)
+    binary.write_text("#!/bin/sh\n")
+    binary.chmod(0o755)
+
+    assert cache.get_host_fact(name, [str(binary)], fact) == "v1"
+    # Cached
+    assert cache.get_host_fact(name, [str(binary)], fact) == "v1"
+    # Refresh forced (i.e. --no-cache)
+    assert cache.get_host_fact(name, [str(binary)], fact, refresh=True) == "v2"
+    assert cache.get_host_fact(name, [str(binary)], fact) == "v2"
+
+    # The binary is changed
+    os.utime(binary, ns=(0, 0))
+    assert cache.get_host_fact(name, [str(binary)], fact) == "v3"
+
+    # The cache is expired
+    fingerprint = cache.get_fingerprint((), {}, cache.get_binaries_stats([str(binary)]))
+    cache_name = f"{cache.HOST_FACTS_CACHE}-{name}"
+    cache.save(cache_name, fingerprint, {"time": 0, "value": "v3"})
+    assert cache.get_host_fact(name, [str(binary)], fact) == "v4"
+
+    cache.clear(cache_name)
+    binary.unlink()
+
+
+def test_completion() -> None:
+    load_commands(None)
+    manifest = get_manifest()
+    datafile = {
+        "services": ["backend", "frontend"],
+        "allservices": ["backend", "frontend", "swaggerui"],
+        "submodules": ["do", "http-api"],
+        "commands": manifest,
+        "options": {"--project": True, "-p": True, "--prod": False},
+    }
+
+    def complete(*args: str) -> Optional[list[str]]:
+        completions = completion.get_completions(datafile, list(args[:-1]), args[-1])
+        if completions is None:
+            return None
+        return [value for value, _ in completions]
+
+    assert complete("sta") == ["start", "status"]
+    assert complete("-p", "x", "--prod", "sta") == ["start", "status"]
+    assert complete("logs", "") == ["backend", "frontend"]
+    assert complete("-p", "x", "logs", "--tail", "5", "b") == ["backend"]
+    assert complete("run", "") == ["backend", "frontend", "swaggerui"]
+    assert complete("check", "-i", "") == ["do", "http-api"]
+    assert "--follow" in (complete("logs", "--f") or [])
+    # status has a single argument
+    assert complete("status", "backend", "") == ["backend", "frontend"]
+    assert complete("shell", "backend", "cmd", "") == []
+
+    # Not available from the datafile, completed by the application
+    assert complete("-", "") is None
+    assert complete("--project", "") is None
+    assert complete("--unknown", "sta") is None
+    assert complete("invalid", "") is None
+    assert complete("logs", "--tail", "") is None
+    assert complete("shell", "backend", "") is None
+    assert completion.get_completions({}, [], "") is None
+
+    assert (
+        completion.format_completions("complete_bash", [("a", "A"), ("b", None)])
+        == "a\nb"
+    )
+    assert (
+        completion.format_completions("complete_zsh", [("a", "A"), ("b", None)])
+        == """_arguments '*: :(("a":"A"\n"b"))'"""
+    )
+    assert completion.format_completions("complete_zsh", []) == "_files"
+    assert completion.format_completions("complete_fish", [("a", "A")]) == "a\tA"
+
+
+def test_password_scores(faker: Faker) -> None:
+    weak = "password"
+    strong = faker.password(length=20)
+
+    scores = services.get_password_scores([weak, strong, weak], refresh=True)
+    assert scores == {weak: 0, strong: 4}
+    # Cached
+    assert services.get_password_scores([strong, weak]) == scores
+    assert services.get_password_scores([]) == {}
+
+    salt = "00" * 16
+    key = services.get_password_key([strong, weak], salt)
+    assert key == services.get_password_key([strong, weak], salt)
+    assert key != services.get_password_key([strong], salt)
+    assert key != services.get_password_key([strong, weak], "11" * 16)
+
+    # Passwords are never saved, only a key derived from all of them
+    cache_file = cache.get_cache_file(services.PASSWORD_SCORES_CACHE)
+    if cache_file.exists():
+        content = cache_file.read_text()
+        assert weak not in content
+        assert strong not in content
+
+
+def test_daemon(faker: Faker) -> None:
+    # No daemon running
+    assert not daemon.SOCKET_FILE.exists()
+    assert daemon.forward(["version"]) is None
+
+    # Stale socket, left behind by a killed daemon
+    daemon.SOCKET_FILE.parent.mkdir(parents=True, exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(daemon.SOCKET_FILE))
+    server.close()
+    try:
+        assert daemon.SOCKET_FILE.exists()
+        assert daemon.forward(["version"]) is None
+    finally:
+        daemon.SOCKET_FILE.unlink()
+
+    # Commands are found by the parser, skipping the global options
+    load_commands(None)
+    assert daemon.get_command(["--prod", "-p", "shell", "status", "shell"]) == "status"
+    assert daemon.get_command(["--prod"]) is None
+    assert daemon.is_forwardable(["status", "shell"])
+    assert daemon.is_forwardable(["-e", "A=B", "logs", "run"])
+    # Interactive commands and the daemon itself are never forwarded
+    assert not daemon.is_forwardable(["--prod", "shell", "backend"])
+    assert not daemon.is_forwardable(["run", "registry"])
+    assert not daemon.is_forwardable(["daemon"])
+
+    # Disabled
+    os.environ["RAPYDO_DAEMON"] = "0"
+    assert daemon.forward(["version"]) is None
+    os.environ.pop("RAPYDO_DAEMON")
+
+    path = Path(tempfile.gettempdir(), faker.pystr())
+    stats = daemon.get_files_stats([path])
+    assert stats == [[str(path), None]]
+    path.write_text("x")
+    stats = daemon.get_files_stats([path])
+    assert stats[0][2] == 1
+    path.write_text("xy")
+    assert daemon.get_files_stats([path]) != stats
+    path.unlink()
+
+    assert daemon.get_sources_stats() == daemon.get_sources_stats()
+
+
+def test_ssh() -> None:
+    control_path, socket_path = ssh.get_socket_paths("user@host:2222")
+    assert control_path.parent == socket_path.parent
+    assert control_path != socket_path
+    assert ssh.get_socket_paths("user@host:2222") == (control_path, socket_path)
+    assert ssh.get_socket_paths("user@host")[0] != control_path
+    # Short enough for a unix socket
+    assert len(str(socket_path)) < 100
+
+    assert ssh.get_ssh_command("user@host:2222", control_path) == [
+        "ssh",
+        "-S",
+        str(control_path),
+        "-p",
+        "2222",
+        "--",
+        "user@host",
+    ]
+    assert ssh.get_ssh_command("host", control_path)[-1] == "host"
+
+    assert ssh.get_forward_target("unix:///run/user/1000/docker.sock") == (
+        "/run/user/1000/docker.sock"
+    )
+    assert ssh.get_forward_target("tcp://127.0.0.1:2375") == "127.0.0.1:2375"
+    assert ssh.get_forward_target("ssh://user@host") is None
+    assert ssh.get_forward_target("") is None
+
+    # The engine is pinged through the forwarded socket
+    assert not ssh.is_reachable(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen()
+
+    def answer(response: bytes) -> None:
+        conn, _ = server.accept()
+        conn.recv(1024)
+        conn.sendall(response)
+        conn.close()
+
+    for response, reachable in (
+        (b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nOK", True),
+        # Accepted by the master, but the remote endpoint is not reachable
+        (b"", False),
+    ):
+        thread = threading.Thread(target=answer, args=(response,))
+        thread.start()
+        assert ssh.is_reachable(socket_path) == reachable
+        thread.join()
+    server.close()
+    socket_path.unlink()
+
+    sockets_dir = ssh.get_sockets_dir()
+    assert sockets_dir == control_path.parent
+    assert ssh.is_private_dir(sockets_dir)
+    private_dir = Path(tempfile.mkdtemp())
+    assert ssh.is_private_dir(private_dir)
+    private_dir.chmod(0o755)
+    assert not ssh.is_private_dir(private_dir)
+    link = private_dir.with_name(f"{private_dir.name}.link")
+    link.symlink_to(sockets_dir)
+    assert not ssh.is_private_dir(link)
+    link.unlink()
+    private_dir.rmdir()
+    assert not ssh.is_private_dir(private_dir)
+
+    # Not multiplexed if the master can't be opened
+    engine = "user@invalid.host.invalid"
+    assert ssh.get_docker_host(engine) == f"ssh://{engine}"
+    assert engine not in ssh.FORWARDED_HOSTS
+    assert not ssh.get_socket_paths(engine)[0].exists()
+    assert ssh.get_engine(f"ssh://{engine}") == f"ssh://{engine}"
+    assert ssh.get_engine(None) is None
+
+    ssh.FORWARDED_HOSTS[engine] = f"unix://{socket_path}"
+    assert ssh.get_docker_host(engine) == f"unix://{socket_path}"
+    assert ssh.get_engine(f"unix://{socket_path}") == engine
+    ssh.close(engine)
+    assert engine not in ssh.FORWARDED_HOSTS
+
+
+def test_docker_engine() -> None:
+    created = parse_timestamp("2024-01-02T03:04:05.123456789Z")
+    assert created.year == 2024
+    assert created.second == 5
+    assert created.microsecond == 123456
+    assert created.utcoffset() is not None
+    assert parse_timestamp("2024-01-02T03:04:05+02:00").hour == 3
+    assert parse_timestamp(0) == parse_timestamp("invalid")
+
+    labels = {
+        "com.docker.compose.project": "myproject",
+        "com.docker.compose.service": "backend",
+        "com.docker.compose.container-number": "1",
+    }
+    inspected = ContainerInfo.from_inspect(
+        {
+            "Id": "abc",
+            "Name": "/myproject-backend-1",
+            "Created": "2024-01-02T03:04:05.123456789Z",
+            "State": {"Status": "running"},
+            "Config": {"Image": "rapydo/backend:3.1", "Labels": labels},
+            "NetworkSettings": {
+                "Ports": {
+                    "8080/tcp": [
+                        {"HostIp": "0.0.0.0", "HostPort": "80"},
+                        {"HostIp": "::", "HostPort": "80"},
+                    ],
+                    "5555/tcp": None,
+                }
+            },
+        }
+    )
+    listed = ContainerInfo.from_list(
+        {
+            "Id": "abc",
+            "Names": ["/myproject-backend-1"],
+            "Created": int(created.timestamp()),
+            "State": "running",
+            "Image": "rapydo/backend:3.1",
+            "Labels": labels,
+            "Ports": [
+                {"PrivatePort": 8080, "PublicPort": 80, "Type": "tcp"},
+                {"PrivatePort": 8080, "PublicPort": 80, "Type": "tcp"},
+                {"PrivatePort": 5555, "Type": "tcp"},
+            ],
+        }
+    )
+    assert inspected.name == listed.name == "myproject-backend-1"
+    assert inspected.status == listed.status == "running"
+    assert inspected.image == listed.image
+    assert inspected.labels == listed.labels
+    assert inspected.ports == listed.ports == [("8080", "80")]
+    assert inspected.created.replace(microsecond=0) == listed.created
+    assert inspected.service == listed.service == "backend"
+    assert inspected.slot == listed.slot == 1
+    assert not inspected.oneoff
+    volatile = ContainerInfo(
+        id="def",
+        name="backend",
+        status="running",
+        image="rapydo/backend:3.1",
+        created=created,
+        labels={"com.docker.compose.oneoff": "True"},
+    )
+    assert volatile.oneoff
+    assert volatile.health is None
+
+    rows = Compose.get_status_rows([inspected, volatile], ["backend"])
+    assert len(rows) == 1
+    assert rows[0][0] == "abc"
+    assert rows[0][1] == "[bold green]myproject-backend-1[/bold green]"
+    assert rows[0][5] == "8080->80"
+    assert Compose.get_status_rows([inspected], ["frontend"]) == []
+    assert listed.health is None
+    listed = ContainerInfo.from_list(
+        {
+            "Id": "abc",
+            "Names": ["/myproject-backend-1"],
+            "State": "running",
+            "Status": "Up 3 seconds (health: starting)",
+        }
+    )
+    assert listed.health == "starting"
+    inspected = ContainerInfo.from_inspect(
+        {
+            "Id": "abc",
+            "Name": "/myproject-backend-1",
+            "State": {"Status": "running", "Health": {"Status": "healthy"}},
+        }
+    )
+    assert inspected.health == "healthy"
+    assert volatile.slot is None
+    assert volatile.service is None
+
+    exception = DockerException(["docker", "exec"], 127)
+    assert Docker.get_exit_code(exception) == 127
+    assert Docker.get_exit_motivation(127) == "command not found"
+    assert Docker.get_exit_motivation(137) == "SIGKILL"
+    assert Docker.get_exit_motivation(1) is None
+
+    task = TaskInfo.from_inspect(
+        {
+            "ID": "xyz",
+            "ServiceID": "svc",
+            "NodeID": "node",
+            "Slot": 2,
+            "Labels": {},
+            "CreatedAt": "2024-01-02T03:04:05.123456789Z",
+            "Status": {
+                "State": "failed",
+                "Err": "task: non-zero exit (1)",
+                "Timestamp": "2024-01-02T03:04:05.123456789Z",
+            },
+        }
+    )
+    assert task.service_id == "svc"
+    assert task.slot == 2
+    assert task.state == "failed"
+    assert task.error == "task: non-zero exit (1)"
+    assert task.timestamp == created
+    assert task.created == created
+    assert TaskInfo.from_inspect({"ID": "xyz"}).timestamp is None
+    assert TaskInfo.from_inspect({"ID": "xyz"}).created is None
+    assert (
+        TaskInfo.from_inspect({"ID": "xyz", "DesiredState": "running"}).desired_state
+        == "running"
+    )
+
+    assert not ServiceState().converged
+    assert str(ServiceState()) == "0/N/A"
+    assert ServiceState(desired=0).converged
+    assert ServiceState(desired=2, running=2).converged
+    assert not ServiceState(desired=2, running=1).converged
+    assert not ServiceState(desired=2, running=2, updating=True).converged
+    assert str(ServiceState(desired=2, running=1)) == "1/2"
+
+    # CLI is the default backend
+    docker = Docker()
+    assert isinstance(docker.engine, CLIEngine)
+    assert isinstance(create_engine(docker.client), CLIEngine)
+
+    # Both the backends return the same results
+    api = APIEngine(DEFAULT_HOST)
+    cli = docker.engine
+    names = sorted(c.name for c in cli.list_containers(all=True))
+    assert sorted(c.name for c in api.list_containers(all=True)) == names
+    filters = {"com.docker.compose.project": "invalid"}
+    assert cli.list_containers(all=True, labels=filters) == []
+    assert api.list_containers(all=True, labels=filters) == []
+    assert api.get_container_status("invalid") is None
+    assert cli.get_container_status("invalid") is None
+    assert api.get_container("invalid") is None
+    assert cli.get_container("invalid") is None
+    assert not api.image_exists("invalid/image:0.0")
+    assert not cli.image_exists("invalid/image:0.0")
+    assert api.get_image_creation("invalid/image:0.0") is None
+    # Connections are reused
+    assert len(api.idle_connections) == 1
+    api.close()
+    assert len(api.idle_connections) == 0
+
+
+def test_events_stream() -> None:
+    class EventsEngine:
+        def __init__(self) -> None:
+            # stands for both docker.client and docker.client.client_config
+            self.client = self
+            self.client_config = self
+            # the same event is printed by each execution, then exits
+            self.docker_cmd = ["sh", "-c", """echo '{"timeNano": 5000000001}'""", "sh"]
+
+    restart_delay = events.RESTART_DELAY
+    events.RESTART_DELAY = 0
+    try:
+        stream = events.EventsStream(cast(Docker, EventsEngine()))
+        for _ in range(50):
+            if not stream.alive:
+                break
+            time.sleep(0.1)
+    finally:
+        events.RESTART_DELAY = restart_delay
+
+    # Restarted MAX_RESTARTS times since the last event, then no longer alive
+    assert not stream.alive
+    assert stream.since == "5.000000001"
+    assert stream.events.qsize() == events.MAX_RESTARTS + 1
+    assert stream.wait(0.1)
+    assert not stream.wait(0.1)
+    stream.close()
@@ -107,6 +107,37 @@ def test_all(capfd: Capture) -> None:
         "Testing mode",
     )
 
+    exec_command(
+        capfd,
+        "logs --since invalid backend",
+        "Invalid --since value: invalid, expected a timestamp",
+    )
+
+    exec_command(
+        capfd,
+        "logs --grep ( backend",
+        "Invalid --grep pattern (: ",
+    )
+
+    exec_command(
+        capfd,
+        "logs --since 1h backend",
+        "REST API backend server is ready to be launched",
+    )
+
+    exec_command(
+        capfd,
+        "logs --tail 20 --grep Testing.mode backend",
+        "Testing mode",
+    )
+
+    exec_command(
+        capfd,
+        "logs --tail 100 --level INFO --json backend",
+        '"service": "backend"',
+        '"level": "INFO"',
+    )
+
     # Debug code... no logs in swarm mode for frontend, even after a wait 20...
     if Configuration.swarm_mode:
         exec_command(
@@ -123,17 +154,12 @@ def test_all(capfd: Capture) -> None:
             f"{timestamp}",
         )
 
-    # Follow flag is not supported in swarm mode with multiple services
-    if Configuration.swarm_mode:
-        # Multiple services are not supported in swarm mode
-        exec_command(
-            capfd,
-            "logs --follow",
-            "Follow flag is not supported on multiple services",
-        )
-
-        exec_command(
-            capfd,
-            "logs --follow backend frontend",
-            "Follow flag is not supported on multiple services",
-        )
+    # Multiple services are followed concurrently
+    signal.signal(signal.SIGALRM, mock_KeyboardInterrupt)
+    signal.alarm(5)
+    exec_command(
+        capfd,
+        "logs --tail 10 --follow backend postgres",
+        "REST API backend server is ready to be launched",
+    )
+    signal.alarm(0)
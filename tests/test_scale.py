@@ -87,7 +87,7 @@ def test_scale(capfd: Capture) -> None:
             capfd,
             "scale backend=2 --wait",
             "first_backend scaled to 2",
-            "Service converged",
+            "backend converged in",
         )
 
         assert count_running_containers() == BASE_SERVICE_NUM + 1
@@ -117,7 +117,7 @@ def test_scale(capfd: Capture) -> None:
             capfd,
             "-e DEFAULT_SCALE_BACKEND=3 scale backend --wait",
             "first_backend scaled to 3",
-            "Service converged",
+            "backend converged in",
         )
 
         assert count_running_containers() == BASE_SERVICE_NUM + 2
@@ -219,9 +219,10 @@ def test_scale(capfd: Capture) -> None:
 
         exec_command(
             capfd,
-            "scale redis=1",
+            "scale redis=1 --wait",
             "Scaling services: redis=1...",
             "Services scaled: redis=1",
+            "redis converged in",
         )
 
         assert count_running_containers() == BASE_SERVICE_NUM
@@ -210,6 +210,26 @@ def test_all(capfd: Capture, faker: Faker) -> None:
         string2,
     )
 
+    exec_command(
+        capfd,
+        f"shell {service} --parallel 2 'ls /tmp/'",
+        "--parallel and --continue-on-error options require --broadcast",
+    )
+
+    exec_command(
+        capfd,
+        f"shell {service} --broadcast --parallel 2 'ls /tmp/'",
+        string1,
+        string2,
+        "Summary",
+    )
+
+    exec_command(
+        capfd,
+        f"shell {service} --broadcast --continue-on-error 'ls /invalid'",
+        "The command failed on 2 of 2 replicas",
+    )
+
     exec_command(
         capfd,
         "remove",
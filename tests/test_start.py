@@ -43,6 +43,18 @@ def test_all(capfd: Capture) -> None:
 
         start_registry(capfd)
 
+        exec_command(
+            capfd,
+            "start --waves",
+            "--waves option is only supported in compose mode",
+        )
+
+        exec_command(
+            capfd,
+            "start --rolling",
+            "--rolling option requires --force",
+        )
+
     exec_command(
         capfd,
         "start backend invalid",
@@ -114,6 +126,14 @@ def test_all(capfd: Capture) -> None:
         assert docker.get_container("backend") is not None
         assert docker.get_container("neo4j") is not None
 
+        exec_command(
+            capfd,
+            "start --force --rolling --batch-size 2",
+            "Restarting batch 1/",
+            "Rolling restart",
+            "Stack started",
+        )
+
         # ############################
         # Verify bind volumes checks #
         # ############################
@@ -191,3 +211,17 @@ def test_all(capfd: Capture) -> None:
             "start",
             "Stack started",
         )
+
+        exec_command(
+            capfd,
+            "start --waves",
+            "Starting wave 1/",
+            "Startup timeline",
+            "Stack started",
+        )
+
+        exec_command(
+            capfd,
+            "start --force --rolling",
+            "--rolling option is only supported in swarm mode",
+        )